@@ -1,10 +1,14 @@
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
-from typing import List, Tuple
+from typing import Any, List, NamedTuple, Optional, Tuple
 import logging
-from models import TranscriptData, AlignmentResult, AlignmentItem
-from config import EMBEDDING_MODEL, settings
+import os
+import time
+from ann_index import VectorIndex, build_index, load_index, save_index, top_k
+from embedding_backend import embedding_model_id, load_embedding_model
+from resource_policy import inference_slot
+from models import TranscriptData, AlignmentResult, AlignmentItem, SectionCoverage, SectionMatch, SegmentMatch
+from config import settings
+from telemetry import record_model_load, annotate_stage
 
 logger = logging.getLogger(__name__)
 
@@ -12,16 +16,36 @@ logger = logging.getLogger(__name__)
 _embedding_model = None
 
 
-def get_embedding_model() -> SentenceTransformer:
-    """Get or create sentence transformer model (singleton pattern)"""
+def get_embedding_model() -> Any:
+    """
+    Get or create the sentence embedding model (singleton pattern)
+    
+    A SentenceTransformer, or an ONNX Runtime model with the same encode()
+    when EMBEDDING_BACKEND is "onnx" (see embedding_backend.py).
+    """
     global _embedding_model
     if _embedding_model is None:
-        logger.info(f"Loading embedding model: {EMBEDDING_MODEL}")
-        _embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+        model_id = embedding_model_id()
+        logger.info(f"Loading embedding model: {model_id}")
+        start = time.perf_counter()
+        _embedding_model = load_embedding_model(settings.EMBEDDING_BACKEND)
+        record_model_load(model_id, time.perf_counter() - start)
         logger.info("Embedding model loaded successfully")
     return _embedding_model
 
 
+def encode_texts(texts: List[str]) -> np.ndarray:
+    """
+    L2-normalized embeddings of texts (one row per text)
+    
+    Holds an inference slot while encoding, so concurrent requests do not
+    oversubscribe the CPU (see resource_policy.py).
+    """
+    model = get_embedding_model()
+    with inference_slot():
+        return np.asarray(model.encode(texts, normalize_embeddings=True))
+
+
 def split_outline_into_sections(outline_text: str) -> List[str]:
     """
     Split outline into meaningful sections
@@ -44,9 +68,258 @@ def split_outline_into_sections(outline_text: str) -> List[str]:
     return lines if lines else [outline_text]
 
 
+class OutlineEmbeddings(NamedTuple):
+    """Outline sections with their embeddings (one row per section)"""
+    sections: List[str]
+    embeddings: np.ndarray
+    index: Optional[VectorIndex] = None  # ANN index for long outlines (None = exact search)
+
+
+def deck_index_path(deck_hash: str) -> str:
+    """File holding a deck's section embeddings and index"""
+    return os.path.join(settings.ANN_INDEX_DIR, f"{deck_hash}.npz")
+
+
+def load_deck_sections(deck_hash: str) -> Optional[OutlineEmbeddings]:
+    """
+    A deck's stored sections and embeddings, if encoded before
+    
+    Args:
+        deck_hash: Content hash of the deck (or outline text)
+        
+    Returns:
+        OutlineEmbeddings, or None if not stored or encoded by another model
+    """
+    stored = load_index(deck_index_path(deck_hash))
+    if stored is None or stored.metadata.get("model") != embedding_model_id():
+        return None
+    index = stored.index if stored.index.kind != "exact" else None
+    return OutlineEmbeddings(stored.metadata["sections"], stored.index.vectors, index)
+
+
+def encode_outline(outline_text: str, deck_hash: Optional[str] = None) -> OutlineEmbeddings:
+    """
+    Split the outline into sections and encode them
+    
+    Does not need the transcript, so it can run while audio is still being
+    decoded and transcribed. Embeddings are L2-normalized, so cosine
+    similarity is a plain dot product. Outlines with ANN_MIN_ITEMS sections
+    or more get an ANN index; with a deck_hash, the embeddings and index are
+    stored in ANN_INDEX_DIR and loaded instead of re-encoded next time.
+    
+    Args:
+        outline_text: Presentation outline/script
+        deck_hash: Content hash of the deck, to store/reuse its encoding
+        
+    Returns:
+        OutlineEmbeddings for align_transcript_to_outline()
+    """
+    sections = split_outline_into_sections(outline_text)
+    persist = bool(deck_hash) and settings.ANN_ENABLED and bool(sections)
+    
+    if persist:
+        stored = load_deck_sections(deck_hash)
+        if stored is not None and stored.sections == sections:
+            logger.info(f"Loaded stored outline encoding for deck {deck_hash[:12]}")
+            return stored
+    
+    if not sections:
+        return OutlineEmbeddings(sections=sections, embeddings=np.zeros((0, 0)))
+    embeddings = encode_texts(sections)
+    if not settings.ANN_ENABLED:
+        return OutlineEmbeddings(sections=sections, embeddings=embeddings)
+    
+    index = build_index(embeddings)
+    if persist:
+        try:
+            save_index(deck_index_path(deck_hash), index, {"model": embedding_model_id(), "sections": sections})
+        except OSError as e:
+            logger.warning(f"Could not store outline encoding: {e}")
+    return OutlineEmbeddings(
+        sections=sections,
+        embeddings=index.vectors,
+        index=index if index.kind != "exact" else None
+    )
+
+
+class SegmentScores(NamedTuple):
+    """match_segments() result"""
+    items: List[AlignmentItem]
+    off_topic: List[AlignmentItem]
+    section_tops: List[List[Tuple[int, float]]]  # per section: closest (segment_idx, score), best first
+
+
+def match_segments(
+    segment_texts: List[str],
+    outline: OutlineEmbeddings,
+    first_idx: int = 0
+) -> SegmentScores:
+    """
+    Match transcript segments to their most similar outline sections
+    
+    Scores are one product of normalized embeddings; the per-segment and
+    per-section top-k and the off-topic flags are vectorized, leaving only
+    the response objects to build per segment. Outlines with an ANN index
+    are searched through it instead, so a section's closest segments are
+    only picked among the segments that have it in their top-k.
+    
+    Args:
+        segment_texts: Segment texts to encode and match
+        outline: encode_outline() result (must have at least one section)
+        first_idx: segment_idx of the first text
+        
+    Returns:
+        SegmentScores with one AlignmentItem per segment
+    """
+    n_sections = len(outline.sections)
+    k = settings.ALIGNMENT_TOP_K
+    if not segment_texts:
+        return SegmentScores([], [], [[] for _ in range(n_sections)])
+    
+    # Encode transcript segments (normalized, like the outline)
+    segment_embeddings = encode_texts(segment_texts)
+    
+    if outline.index is None:
+        # (segments, sections) cosine similarity
+        similarity_matrix = segment_embeddings @ outline.embeddings.T
+        seg_top_idx, seg_top_scores = top_k(similarity_matrix, max(1, k))
+        sec_top_idx, sec_top_scores = top_k(similarity_matrix.T, k)
+    else:
+        # Long outline: only the ANN candidates are scored
+        seg_top_idx, seg_top_scores = outline.index.search(segment_embeddings, max(1, k))
+        sec_top_idx, sec_top_scores = _section_tops_from_matches(seg_top_idx, seg_top_scores, n_sections, k)
+    
+    best_idx = seg_top_idx[:, 0]
+    best_scores = seg_top_scores[:, 0]
+    off_topic_mask = best_scores < settings.SIMILARITY_THRESHOLD
+    
+    # Truncate long section names once per section
+    labels = [sec if len(sec) <= 80 else sec[:77] + "..." for sec in outline.sections]
+    
+    alignment_items = []
+    off_topic_segments = []
+    rows = zip(
+        segment_texts, best_idx.tolist(), np.round(best_scores, 3).tolist(),
+        seg_top_idx[:, :k].tolist(), np.round(seg_top_scores[:, :k], 3).tolist(), off_topic_mask.tolist()
+    )
+    for offset, (text, best, score, top_idx, top_scores, off_topic) in enumerate(rows):
+        alignment_item = AlignmentItem(
+            segment_idx=first_idx + offset,
+            segment_text=text,
+            best_match=labels[best],
+            similarity_score=score,
+            section_idx=best,
+            top_matches=[SectionMatch(section_idx=i, score=v) for i, v in zip(top_idx, top_scores)]
+        )
+        alignment_items.append(alignment_item)
+        if off_topic:
+            off_topic_segments.append(alignment_item)
+    
+    section_tops = [
+        [(i, v) for i, v in zip(idx, scores) if i >= first_idx]
+        for idx, scores in zip((sec_top_idx + first_idx).tolist(), np.round(sec_top_scores, 3).tolist())
+    ]
+    return SegmentScores(alignment_items, off_topic_segments, section_tops)
+
+
+def _section_tops_from_matches(
+    seg_top_idx: np.ndarray,
+    seg_top_scores: np.ndarray,
+    n_sections: int,
+    k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-section closest segments among the segments' own top-k matches
+    
+    Without the full similarity matrix, a section's closest segments are
+    taken from the (segment, section) pairs the ANN search returned; rows
+    are padded with segment -1 when fewer than k pairs name a section.
+    """
+    segments = np.repeat(np.arange(len(seg_top_idx)), seg_top_idx.shape[1])
+    sections = seg_top_idx.ravel()
+    scores = seg_top_scores.ravel()
+    # Group by section, best score first within each section
+    order = np.lexsort((-scores, sections))
+    sections, segments, scores = sections[order], segments[order], scores[order]
+    starts = np.searchsorted(sections, np.arange(n_sections))
+    rank = np.arange(len(sections)) - starts[sections]
+    keep = rank < k
+    
+    idx = np.full((n_sections, k), -1, dtype=np.int64)
+    values = np.full((n_sections, k), -np.inf)
+    idx[sections[keep], rank[keep]] = segments[keep]
+    values[sections[keep], rank[keep]] = scores[keep]
+    return idx, values
+
+
+def section_coverage(
+    items: List[AlignmentItem],
+    off_topic: List[AlignmentItem],
+    sections: List[str],
+    section_tops: List[List[Tuple[int, float]]]
+) -> Tuple[List[SectionCoverage], float, List[int]]:
+    """
+    Which outline sections the talk covered
+    
+    A section is covered if it is the best match of at least one on-topic
+    segment.
+    
+    Args:
+        items: Alignment items of the whole transcript
+        off_topic: The off-topic ones among them
+        sections: Outline sections
+        section_tops: Per section, closest (segment_idx, score), best first
+        
+    Returns:
+        (per-section coverage, share of sections covered 0-100, indices of
+        uncovered sections)
+    """
+    n_sections = len(sections)
+    if n_sections == 0:
+        return [], 0.0, []
+    
+    best = np.array([item.section_idx for item in items], dtype=np.int64)
+    off_topic_mask = np.zeros(len(items), dtype=bool)
+    off_topic_mask[[item.segment_idx for item in off_topic]] = True
+    on_topic = best[~off_topic_mask & (best >= 0)]
+    hits = np.bincount(on_topic, minlength=n_sections)[:n_sections]
+    covered = hits > 0
+    
+    coverage = [
+        SectionCoverage(
+            section_idx=i,
+            section=sections[i],
+            covered=bool(covered[i]),
+            hit_count=int(hits[i]),
+            best_score=tops[0][1] if tops else 0.0,
+            top_segments=[SegmentMatch(segment_idx=j, score=v) for j, v in tops]
+        )
+        for i, tops in enumerate(section_tops)
+    ]
+    rate = round(float(covered.mean()) * 100, 1)
+    return coverage, rate, np.flatnonzero(~covered).tolist()
+
+
+def _alignment_result(
+    items: List[AlignmentItem],
+    off_topic: List[AlignmentItem],
+    sections: List[str],
+    section_tops: List[List[Tuple[int, float]]]
+) -> AlignmentResult:
+    coverage, rate, uncovered = section_coverage(items, off_topic, sections, section_tops)
+    return AlignmentResult(
+        items=items,
+        off_topic_segments=off_topic,
+        sections=coverage,
+        section_coverage=rate,
+        uncovered_sections=uncovered
+    )
+
+
 def align_transcript_to_outline(
     transcript: TranscriptData,
-    outline_text: str
+    outline_text: str,
+    outline: Optional[OutlineEmbeddings] = None
 ) -> AlignmentResult:
     """
     Align transcript segments to outline sections using semantic similarity
@@ -54,80 +327,124 @@ def align_transcript_to_outline(
     Args:
         transcript: TranscriptData with segments
         outline_text: Presentation outline/script
+        outline: Pre-computed encode_outline() result (encoded here if None)
         
     Returns:
-        AlignmentResult with matches and off-topic segments
+        AlignmentResult with matches, off-topic segments and section coverage
     """
     try:
-        model = get_embedding_model()
-        
         # Prepare outline sections
-        outline_sections = split_outline_into_sections(outline_text)
+        if outline is None:
+            outline = encode_outline(outline_text)
+        outline_sections = outline.sections
         
         if not outline_sections:
             logger.warning("Empty outline provided, skipping alignment")
             return AlignmentResult(items=[], off_topic_segments=[])
         
+        annotate_stage(section_count=len(outline_sections))
+        
         logger.info(
             f"Aligning {len(transcript.segments)} segments "
             f"to {len(outline_sections)} outline sections"
         )
         
-        # Encode outline sections
-        outline_embeddings = model.encode(outline_sections)
-        
-        # Encode transcript segments
-        segment_texts = [seg.text for seg in transcript.segments]
-        segment_embeddings = model.encode(segment_texts)
-        
-        # Calculate similarity matrix
-        similarity_matrix = cosine_similarity(segment_embeddings, outline_embeddings)
-        
-        # Find best match for each segment
-        alignment_items = []
-        off_topic_segments = []
-        
-        for idx, segment in enumerate(transcript.segments):
-            # Get similarity scores for this segment
-            scores = similarity_matrix[idx]
-            
-            # Find best matching outline section
-            best_idx = np.argmax(scores)
-            best_score = float(scores[best_idx])
-            best_match = outline_sections[best_idx]
-            
-            # Truncate long section names
-            if len(best_match) > 80:
-                best_match = best_match[:77] + "..."
-            
-            alignment_item = AlignmentItem(
-                segment_idx=idx,
-                segment_text=segment.text,
-                best_match=best_match,
-                similarity_score=round(best_score, 3)
-            )
-            
-            alignment_items.append(alignment_item)
-            
-            # Check if off-topic (below threshold)
-            if best_score < settings.SIMILARITY_THRESHOLD:
-                off_topic_segments.append(alignment_item)
+        scored = match_segments([seg.text for seg in transcript.segments], outline)
+        result = _alignment_result(scored.items, scored.off_topic, outline_sections, scored.section_tops)
         
         logger.info(
-            f"Alignment complete: {len(off_topic_segments)} "
-            f"off-topic segments detected"
+            f"Alignment complete: {len(result.off_topic_segments)} "
+            f"off-topic segments detected, {len(result.uncovered_sections)} sections uncovered"
         )
         
-        return AlignmentResult(
-            items=alignment_items,
-            off_topic_segments=off_topic_segments
-        )
+        return result
         
     except Exception as e:
         logger.error(f"Alignment failed: {str(e)}")
         raise RuntimeError(f"Failed to align transcript to outline: {str(e)}")
 
 
+def realign_window(
+    previous: AlignmentResult,
+    transcript: TranscriptData,
+    outline_text: str,
+    outline: Optional[OutlineEmbeddings],
+    first_idx: int,
+    removed_count: int,
+    inserted_count: int
+) -> AlignmentResult:
+    """
+    Update an alignment after a range of segments was replaced
+    
+    Only the inserted segments are encoded; items before the window are
+    kept and items after it are kept with their segment_idx shifted. Each
+    section's closest segments are merged from its previous list (minus
+    removed segments) and the new window, so a section may list fewer
+    than k when several of its closest segments were removed.
+    
+    Args:
+        previous: Alignment of the transcript before the change
+        transcript: Transcript after the change
+        outline_text: Presentation outline/script
+        outline: Pre-computed encode_outline() result (encoded here if None)
+        first_idx: Index of the first replaced segment
+        removed_count: Number of segments removed at first_idx
+        inserted_count: Number of segments inserted at first_idx
+        
+    Returns:
+        AlignmentResult for the new transcript
+    """
+    try:
+        if outline is None:
+            outline = encode_outline(outline_text)
+        if not outline.sections:
+            return AlignmentResult(items=[], off_topic_segments=[])
+        
+        # Without a complete previous alignment there is nothing to reuse
+        if (
+            len(previous.items) != len(transcript.segments) - inserted_count + removed_count
+            or len(previous.sections) != len(outline.sections)
+        ):
+            logger.warning("Previous alignment does not match the transcript, realigning fully")
+            return align_transcript_to_outline(transcript, outline_text, outline)
+        
+        annotate_stage(section_count=len(outline.sections), realigned_segments=inserted_count)
+        
+        window = transcript.segments[first_idx:first_idx + inserted_count]
+        scored = match_segments([seg.text for seg in window], outline, first_idx)
+        
+        # Items outside the window keep their off-topic flag
+        shift = inserted_count - removed_count
+        end = first_idx + removed_count
+        
+        def shifted(item: AlignmentItem) -> AlignmentItem:
+            return item.model_copy(update={"segment_idx": item.segment_idx + shift})
+        
+        items = previous.items[:first_idx] + scored.items + [shifted(i) for i in previous.items[end:]]
+        off_topic = (
+            [i for i in previous.off_topic_segments if i.segment_idx < first_idx]
+            + scored.off_topic
+            + [shifted(i) for i in previous.off_topic_segments if i.segment_idx >= end]
+        )
+        
+        # Merge each section's closest segments: kept old ones + the window's
+        section_tops = []
+        for coverage, window_tops in zip(previous.sections, scored.section_tops):
+            candidates = [
+                (m.segment_idx if m.segment_idx < first_idx else m.segment_idx + shift, m.score)
+                for m in coverage.top_segments
+                if not first_idx <= m.segment_idx < end
+            ] + window_tops
+            candidates.sort(key=lambda c: -c[1])
+            section_tops.append(candidates[:settings.ALIGNMENT_TOP_K])
+        
+        return _alignment_result(items, off_topic, outline.sections, section_tops)
+        
+    except Exception as e:
+        logger.error(f"Alignment update failed: {str(e)}")
+        raise RuntimeError(f"Failed to update alignment: {str(e)}")
+
+
 def get_coverage_summary(alignment: AlignmentResult) -> dict:
     """
     Get summary statistics about outline coverage
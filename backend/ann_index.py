@@ -0,0 +1,286 @@
+"""
+Approximate Nearest Neighbor Index Module
+
+Long scripts split into hundreds of outline sections, and a user's library
+of decks into thousands, so scoring every transcript segment against every
+section grows as segments x sections. Embeddings are L2-normalized, so the
+closest sections are the largest inner products; above ANN_MIN_ITEMS
+vectors an index answers those top-k queries while scoring only part of
+the vectors:
+
+- "ivf" (default, NumPy only): vectors are clustered by spherical k-means
+  into ~sqrt(n) lists; a query scores the centroids and then only the
+  vectors of its ANN_NPROBE closest lists
+- "hnsw": an hnswlib graph index, if the package is installed (falls back
+  to "ivf" otherwise)
+
+Smaller sets use ExactIndex (one matrix product), which is faster there.
+Indexes are saved together with their vectors (save_index/load_index), so
+a deck is encoded and clustered once; see alignment.encode_outline().
+"""
+
+import json
+import logging
+import os
+from typing import Any, Dict, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+from config import settings
+
+try:
+    import hnswlib  # optional: pip install hnswlib
+except ImportError:
+    hnswlib = None
+
+logger = logging.getLogger(__name__)
+
+
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Indices and values of the k largest entries of every row, best first
+
+    Uses argpartition, so only the k winners of each row are sorted.
+
+    Args:
+        scores: 2-D array
+        k: Entries per row (capped at the row length)
+
+    Returns:
+        (indices, values), both of shape (rows, k)
+    """
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        empty = np.zeros((scores.shape[0], 0))
+        return empty.astype(np.int64), empty
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    values = np.take_along_axis(scores, idx, axis=1)
+    order = np.argsort(-values, axis=1)
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(values, order, axis=1)
+
+
+class ExactIndex:
+    """Brute-force inner product search (the baseline for small sets)"""
+
+    kind = "exact"
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return top_k(queries @ self.vectors.T, k)
+
+
+class IVFIndex:
+    """
+    Inverted-file index: vectors grouped by their closest k-means centroid
+
+    A query scans its `nprobe` closest lists, plus further lists until
+    they hold at least k vectors, so every query gets k results.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, vectors: np.ndarray, centroids: np.ndarray, assignments: np.ndarray):
+        self.vectors = vectors
+        self.centroids = centroids
+        self.assignments = assignments
+        # Vector ids grouped by list; list l is order[offsets[l]:offsets[l + 1]]
+        self._order = np.argsort(assignments, kind="stable")
+        self._offsets = np.searchsorted(assignments[self._order], np.arange(len(centroids) + 1))
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, n_lists: Optional[int] = None, iterations: int = 10) -> "IVFIndex":
+        """Cluster `vectors` (normalized rows) by spherical k-means"""
+        n = len(vectors)
+        n_lists = min(n, n_lists or max(1, int(round(np.sqrt(n)))))
+        rng = np.random.default_rng(0)
+        centroids = vectors[rng.choice(n, n_lists, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, vectors)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Lists that lost all their vectors keep their old centroid
+            centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        return cls(vectors, centroids, assignments)
+
+    def search(self, queries: np.ndarray, k: int, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        n_lists = len(self.centroids)
+        k = min(k, len(self.vectors))
+        nprobe = min(nprobe or settings.ANN_NPROBE, n_lists)
+        if k <= 0 or len(queries) == 0:
+            empty = np.zeros((len(queries), 0))
+            return empty.astype(np.int64), empty
+
+        # Lists to scan per query: the nprobe closest, more if they hold < k vectors
+        ranked = np.argsort(-(queries @ self.centroids.T), axis=1)
+        ranked_sizes = np.diff(self._offsets)[ranked]
+        enough = np.argmax(np.cumsum(ranked_sizes, axis=1) >= k, axis=1) + 1
+        needed = np.maximum(nprobe, enough)
+        probe = np.zeros((len(queries), n_lists), dtype=bool)
+        np.put_along_axis(probe, ranked, np.arange(n_lists) < needed[:, None], axis=1)
+
+        best_idx = np.full((len(queries), k), -1, dtype=np.int64)
+        best_scores = np.full((len(queries), k), -np.inf)
+        # One matrix product per list for all queries probing it
+        for lst in range(n_lists):
+            rows = np.flatnonzero(probe[:, lst])
+            members = self._order[self._offsets[lst]:self._offsets[lst + 1]]
+            if len(rows) == 0 or len(members) == 0:
+                continue
+            scores = np.hstack([best_scores[rows], queries[rows] @ self.vectors[members].T])
+            ids = np.hstack([best_idx[rows], np.broadcast_to(members, (len(rows), len(members)))])
+            winners, best_scores[rows] = top_k(scores, k)
+            best_idx[rows] = np.take_along_axis(ids, winners, axis=1)
+        return best_idx, best_scores
+
+
+class HNSWIndex:
+    """hnswlib graph index over inner product"""
+
+    kind = "hnsw"
+
+    def __init__(self, vectors: np.ndarray, graph: Any):
+        self.vectors = vectors
+        self.graph = graph
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray) -> "HNSWIndex":
+        graph = hnswlib.Index(space="ip", dim=vectors.shape[1])
+        graph.init_index(max_elements=len(vectors), ef_construction=200, M=16)
+        graph.add_items(vectors.astype(np.float32), np.arange(len(vectors)))
+        return cls(vectors, graph)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        k = min(k, len(self.vectors))
+        self.graph.set_ef(max(settings.ANN_HNSW_EF, k))
+        labels, distances = self.graph.knn_query(queries.astype(np.float32), k=k)
+        # hnswlib's "ip" distance is 1 - inner product
+        return labels.astype(np.int64), 1.0 - distances
+
+
+VectorIndex = Union[ExactIndex, IVFIndex, HNSWIndex]
+
+
+def index_kind(n_items: int) -> str:
+    """Index type used for a set of n_items vectors under the current settings"""
+    if n_items < settings.ANN_MIN_ITEMS:
+        return "exact"
+    if settings.ANN_BACKEND == "hnsw":
+        if hnswlib is not None:
+            return "hnsw"
+        logger.warning("ANN_BACKEND=hnsw but hnswlib is not installed, using ivf")
+    return "ivf"
+
+
+def build_index(vectors: np.ndarray) -> VectorIndex:
+    """
+    Build the index type that suits the number of vectors
+
+    Args:
+        vectors: (n, dim) L2-normalized vectors
+
+    Returns:
+        ExactIndex, IVFIndex or HNSWIndex (see index_kind())
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    kind = index_kind(len(vectors))
+    if kind == "hnsw":
+        index: VectorIndex = HNSWIndex.build(vectors)
+    elif kind == "ivf":
+        index = IVFIndex.build(vectors)
+    else:
+        index = ExactIndex(vectors)
+    if kind != "exact":
+        logger.info(f"Built {kind} index over {len(vectors)} vectors")
+    return index
+
+
+class StoredIndex(NamedTuple):
+    """load_index() result"""
+    index: VectorIndex
+    metadata: Dict[str, Any]
+
+
+def save_index(path: str, index: VectorIndex, metadata: Dict[str, Any]) -> None:
+    """
+    Write an index, its vectors and JSON metadata to `path` (.npz)
+
+    HNSW graphs go to a "<path>.hnsw" file next to it. Files are replaced
+    atomically, so concurrent readers see the old or the new index.
+
+    Args:
+        path: Target file
+        index: build_index() result
+        metadata: JSON-serializable details to keep with it
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    arrays = {
+        "vectors": index.vectors,
+        "kind": np.array(index.kind),
+        "metadata": np.array(json.dumps(metadata)),
+    }
+    if isinstance(index, IVFIndex):
+        arrays["centroids"] = index.centroids
+        arrays["assignments"] = index.assignments
+    elif isinstance(index, HNSWIndex):
+        graph_tmp = f"{path}.hnsw.{os.getpid()}.tmp"
+        index.graph.save_index(graph_tmp)
+        os.replace(graph_tmp, f"{path}.hnsw")
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp, path)
+
+
+def load_index(path: str) -> Optional[StoredIndex]:
+    """
+    Read a save_index() file
+
+    If the stored index type no longer matches the settings (or hnswlib is
+    missing), the index is rebuilt from the stored vectors.
+
+    Returns:
+        StoredIndex, or None if the file is missing or unreadable
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            vectors = data["vectors"]
+            kind = str(data["kind"])
+            metadata = json.loads(str(data["metadata"]))
+            centroids = data["centroids"] if "centroids" in data else None
+            assignments = data["assignments"] if "assignments" in data else None
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring unreadable index {path}: {e}")
+        return None
+
+    wanted = index_kind(len(vectors))
+    if kind != wanted:
+        return StoredIndex(build_index(vectors), metadata)
+    if kind == "ivf":
+        return StoredIndex(IVFIndex(vectors, centroids, assignments), metadata)
+    if kind == "hnsw":
+        graph = hnswlib.Index(space="ip", dim=vectors.shape[1])
+        try:
+            graph.load_index(f"{path}.hnsw", max_elements=len(vectors))
+        except RuntimeError as e:
+            logger.warning(f"Rebuilding HNSW graph for {path}: {e}")
+            return StoredIndex(build_index(vectors), metadata)
+        return StoredIndex(HNSWIndex(vectors, graph), metadata)
+    return StoredIndex(ExactIndex(vectors), metadata)
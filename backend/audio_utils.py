@@ -1,7 +1,13 @@
 import os
+import struct
+import subprocess
 import tempfile
+import wave
 from pathlib import Path
+from typing import Optional
+import numpy as np
 from pydub import AudioSegment
+from pydub.utils import get_encoder_name, get_prober_name
 import logging
 
 logger = logging.getLogger(__name__)
@@ -24,8 +30,8 @@ def convert_webm_to_wav(input_path: str, output_path: str = None) -> str:
     try:
         # Create output path if not provided
         if output_path is None:
-            temp_dir = tempfile.gettempdir()
-            output_path = os.path.join(temp_dir, f"audio_{os.getpid()}.wav")
+            fd, output_path = tempfile.mkstemp(prefix="audio_", suffix=".wav")
+            os.close(fd)
         
         logger.info(f"Converting {input_path} to WAV format...")
         
@@ -54,6 +60,255 @@ def convert_webm_to_wav(input_path: str, output_path: str = None) -> str:
         raise RuntimeError(f"Audio conversion failed: {str(e)}")
 
 
+class AudioProbeError(RuntimeError):
+    """Raised when the duration of an audio file cannot be determined"""
+
+
+# EBML / Matroska element IDs (WebM is a Matroska subset)
+_EBML_HEADER_ID = 0x1A45DFA3
+_SEGMENT_ID = 0x18538067
+_INFO_ID = 0x1549A966
+_CLUSTER_ID = 0x1F43B675
+_TIMECODE_SCALE_ID = 0x2AD7B1
+_DURATION_ID = 0x4489
+
+# Bytes of container header read when looking for the Duration element
+_WEBM_PROBE_BYTES = 256 * 1024
+
+# PCM format used by the streaming decode fallback (16 kHz mono s16le)
+_PCM_BYTES_PER_SECOND = 16000 * 2
+
+
+def _read_ebml_vint(data: bytes, pos: int, keep_marker: bool):
+    """Read an EBML variable-length integer, returning (value, new_pos, is_unknown)"""
+    if pos >= len(data):
+        raise ValueError("Truncated EBML data")
+    first = data[pos]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not (first & mask):
+        length += 1
+        mask >>= 1
+    if length > 8 or pos + length > len(data):
+        raise ValueError("Invalid EBML vint")
+
+    value = first if keep_marker else first & (mask - 1)
+    all_ones = (first & (mask - 1)) == (mask - 1)
+    for b in data[pos + 1:pos + length]:
+        value = (value << 8) | b
+        all_ones = all_ones and b == 0xFF
+    return value, pos + length, all_ones
+
+
+def _probe_webm_duration_ms(file_path: str) -> Optional[int]:
+    """
+    Read the Segment/Info/Duration element from a WebM/Matroska header
+
+    Browser MediaRecorder output usually omits Duration, in which case
+    None is returned and the caller falls back to another strategy.
+    """
+    with open(file_path, "rb") as f:
+        data = f.read(_WEBM_PROBE_BYTES)
+
+    try:
+        element_id, pos, _ = _read_ebml_vint(data, 0, keep_marker=True)
+        if element_id != _EBML_HEADER_ID:
+            return None
+        size, pos, _ = _read_ebml_vint(data, pos, keep_marker=False)
+        pos += size
+
+        element_id, pos, _ = _read_ebml_vint(data, pos, keep_marker=True)
+        if element_id != _SEGMENT_ID:
+            return None
+        _, pos, _ = _read_ebml_vint(data, pos, keep_marker=False)
+
+        # Walk Segment children until Info (Clusters mean we went too far)
+        while pos < len(data):
+            element_id, pos, _ = _read_ebml_vint(data, pos, keep_marker=True)
+            size, pos, unknown = _read_ebml_vint(data, pos, keep_marker=False)
+            if element_id == _CLUSTER_ID or unknown:
+                return None
+            if element_id != _INFO_ID:
+                pos += size
+                continue
+
+            end = min(pos + size, len(data))
+            timecode_scale = 1_000_000  # ns, Matroska default
+            duration = None
+            while pos < end:
+                child_id, pos, _ = _read_ebml_vint(data, pos, keep_marker=True)
+                child_size, pos, _ = _read_ebml_vint(data, pos, keep_marker=False)
+                payload = data[pos:pos + child_size]
+                if child_id == _TIMECODE_SCALE_ID:
+                    timecode_scale = int.from_bytes(payload, "big")
+                elif child_id == _DURATION_ID and child_size in (4, 8):
+                    duration = struct.unpack(">f" if child_size == 4 else ">d", payload)[0]
+                pos += child_size
+
+            if duration is None or duration <= 0:
+                return None
+            return int(round(duration * timecode_scale / 1_000_000))
+    except (ValueError, struct.error):
+        return None
+
+    return None
+
+
+def _probe_wav_duration_ms(file_path: str) -> Optional[int]:
+    """Read duration from a RIFF/WAVE header"""
+    try:
+        with wave.open(file_path, "rb") as wav:
+            rate = wav.getframerate()
+            if rate <= 0:
+                return None
+            return int(round(wav.getnframes() * 1000 / rate))
+    except (wave.Error, EOFError):
+        return None
+
+
+def _probe_ffprobe_duration_ms(file_path: str) -> Optional[int]:
+    """Ask ffprobe for the container-level duration (no decoding)"""
+    try:
+        result = subprocess.run(
+            [
+                get_prober_name(), "-v", "error",
+                "-show_entries", "format=duration",
+                "-of", "default=noprint_wrappers=1:nokey=1",
+                file_path,
+            ],
+            capture_output=True,
+            text=True,
+            timeout=10,
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.debug(f"ffprobe unavailable: {e}")
+        return None
+
+    value = result.stdout.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        return None  # "N/A" when the container carries no duration
+    return int(round(seconds * 1000)) if seconds > 0 else None
+
+
+def _count_decoded_duration_ms(file_path: str, stop_after_ms: Optional[int] = None) -> int:
+    """
+    Measure duration by streaming decoded PCM from ffmpeg and counting bytes
+
+    Nothing is buffered; when stop_after_ms is given the decoder is killed
+    as soon as the count passes it, so over-long files are not fully decoded.
+    """
+    stop_after_bytes = (
+        stop_after_ms * _PCM_BYTES_PER_SECOND // 1000 if stop_after_ms is not None else None
+    )
+    try:
+        proc = subprocess.Popen(
+            [
+                get_encoder_name(), "-v", "error", "-nostdin",
+                "-i", file_path,
+                "-f", "s16le", "-ac", "1", "-ar", "16000", "-",
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+    except OSError as e:
+        raise AudioProbeError(f"FFmpeg not available for duration probe: {e}")
+
+    total = 0
+    try:
+        while True:
+            chunk = proc.stdout.read(64 * 1024)
+            if not chunk:
+                break
+            total += len(chunk)
+            if stop_after_bytes is not None and total > stop_after_bytes:
+                break
+    finally:
+        proc.kill()
+        proc.wait()
+
+    if total == 0:
+        raise AudioProbeError("No audio could be decoded from file")
+    return total * 1000 // _PCM_BYTES_PER_SECOND
+
+
+def decode_audio_pcm(file_path: str, sample_rate: int = 16000) -> np.ndarray:
+    """
+    Decode an audio file to mono float32 PCM in [-1, 1]
+
+    16-bit mono WAV at the target rate (our converted uploads) is read
+    directly; anything else is decoded by ffmpeg.
+
+    Args:
+        file_path: Path to audio file
+        sample_rate: Output sample rate
+
+    Returns:
+        1-D float32 array (the input format Whisper accepts)
+
+    Raises:
+        RuntimeError: If the file cannot be decoded
+    """
+    try:
+        with wave.open(file_path, "rb") as wav:
+            if (wav.getnchannels(), wav.getsampwidth(), wav.getframerate()) == (1, 2, sample_rate):
+                frames = wav.readframes(wav.getnframes())
+                return np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+    except (wave.Error, EOFError):
+        pass
+    except OSError as e:
+        raise RuntimeError(f"Cannot read audio file: {e}")
+
+    try:
+        result = subprocess.run(
+            [
+                get_encoder_name(), "-v", "error", "-nostdin",
+                "-i", file_path,
+                "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "-",
+            ],
+            capture_output=True,
+            check=True,
+        )
+    except OSError as e:
+        raise RuntimeError(f"FFmpeg not available for decoding: {e}")
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Audio decoding failed: {e.stderr.decode(errors='replace').strip()}")
+    return np.frombuffer(result.stdout, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def probe_audio_duration_ms(file_path: str, limit_ms: Optional[int] = None) -> int:
+    """
+    Get audio duration in milliseconds as cheaply as possible
+
+    Tries container metadata first (WAV header, WebM Duration element,
+    ffprobe) and only falls back to a streaming decode when none of them
+    carries a duration.
+
+    Args:
+        file_path: Path to audio file
+        limit_ms: Optional limit; the decode fallback stops once it is
+            exceeded, returning a value just above it
+
+    Returns:
+        Duration in milliseconds
+
+    Raises:
+        AudioProbeError: If no strategy can determine the duration
+    """
+    for probe in (_probe_wav_duration_ms, _probe_webm_duration_ms, _probe_ffprobe_duration_ms):
+        try:
+            duration_ms = probe(file_path)
+        except OSError as e:
+            raise AudioProbeError(f"Cannot read audio file: {e}")
+        if duration_ms:
+            logger.debug(f"Duration probe ({probe.__name__}): {duration_ms} ms")
+            return duration_ms
+
+    logger.info("No container duration found, counting decoded audio")
+    return _count_decoded_duration_ms(file_path, stop_after_ms=limit_ms)
+
+
 def get_audio_duration(file_path: str) -> float:
     """
     Get audio file duration in seconds
@@ -63,13 +318,11 @@ def get_audio_duration(file_path: str) -> float:
         
     Returns:
         Duration in seconds
+        
+    Raises:
+        AudioProbeError: If the duration cannot be determined
     """
-    try:
-        audio = AudioSegment.from_file(file_path)
-        return len(audio) / 1000.0  # Convert milliseconds to seconds
-    except Exception as e:
-        logger.error(f"Failed to get audio duration: {str(e)}")
-        return 0.0
+    return probe_audio_duration_ms(file_path) / 1000.0
 
 
 def cleanup_temp_file(file_path: str) -> None:
@@ -0,0 +1,7 @@
+"""
+Benchmarks for the ConfidenceMirror backend
+
+Run from the backend directory so the flat module imports resolve, e.g.:
+
+    python -m benchmarks.run_stages --output results.json
+"""
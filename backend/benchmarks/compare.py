@@ -0,0 +1,61 @@
+"""
+Compare two benchmark result files
+
+Usage (from backend/):
+    python -m benchmarks.compare before.json after.json [--threshold 0.10]
+
+Exits with status 1 if any stage/scale got slower than the threshold.
+"""
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, Tuple
+
+
+def _index(report: Dict[str, Any]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    return {
+        (r["stage"], json.dumps(r["scale"], sort_keys=True)): r
+        for r in report.get("results", [])
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare two benchmark runs")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative wall-time slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    base_index = _index(baseline)
+    regressions = 0
+
+    print(f"{'stage':<15} {'scale':<32} {'base ms':>10} {'new ms':>10} {'change':>8} {'peak KiB':>10}")
+    for key, new in _index(candidate).items():
+        old = base_index.get(key)
+        if old is None:
+            continue
+        old_t = old["wall_s_median"]
+        new_t = new["wall_s_median"]
+        change = (new_t - old_t) / old_t if old_t > 0 else 0.0
+        flag = ""
+        if change > args.threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(
+            f"{key[0]:<15} {key[1]:<32} {old_t * 1000:10.2f} {new_t * 1000:10.2f} "
+            f"{change * 100:7.1f}% {new['peak_bytes'] / 1024:10.1f}{flag}"
+        )
+
+    print(f"\n{baseline.get('commit')} -> {candidate.get('commit')}: {regressions} regression(s)")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Inference throughput against concurrency under different CPU policies
+
+Thread mode (default) mirrors the API process: for every torch intra-op
+thread count in --threads, a fresh process runs the workload from 1, 2,
+4, ... concurrent threads, with at most cores / threads calls running at
+once (resource_policy.inference_slot()). Thread count 0 is the unmanaged
+baseline: torch's default threads per call and no limit on concurrent
+calls. Torch thread settings are process-wide, hence one process per
+setting.
+
+Process mode mirrors the STT pool: P worker processes with cores / P
+threads each, optionally pinned to disjoint cores (--pin also runs the
+unpinned variant for comparison).
+
+Workloads:
+- embed: encode --batch benchmark transcript segments (embedding model)
+- stt: transcribe --audio with Whisper
+- matmul: torch matrix products (no model download; quick tuning)
+
+Usage (from backend/):
+    python -m benchmarks.concurrency --workload embed --threads 0,1,2,4 --concurrency 1,2,4,8,16
+    python -m benchmarks.concurrency --mode processes --processes 1,2,4,8 --pin --workload stt --audio talk.wav
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+_workload: Optional[Callable[[], Any]] = None
+
+
+def _make_workload(name: str, batch: int, audio: Optional[str]) -> Callable[[], Any]:
+    """Load what the workload needs and return one job (models load here, untimed)"""
+    if name == "embed":
+        from alignment import get_embedding_model
+        from benchmarks.fixtures import make_segments
+
+        model = get_embedding_model()
+        texts = [s.text for s in make_segments(batch * 5 / 60)][:batch]
+        return lambda: model.encode(texts, normalize_embeddings=True)
+
+    if name == "stt":
+        if not audio:
+            raise SystemExit("--workload stt needs --audio (a 16 kHz mono WAV)")
+        from stt import get_whisper_model, transcribe_audio
+
+        get_whisper_model()
+        return lambda: transcribe_audio(audio)
+
+    if name == "matmul":
+        import torch
+
+        a = torch.randn(768, 768)
+
+        def matmul() -> Any:
+            out = a
+            for _ in range(20):
+                out = torch.tanh(out @ a)
+            return out
+        return matmul
+
+    raise SystemExit(f"Unknown workload: {name}")
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _summary(latencies: List[float], wall: float) -> Dict[str, float]:
+    return {
+        "jobs": len(latencies),
+        "throughput_per_s": len(latencies) / wall,
+        "latency_p50_s": statistics.median(latencies),
+        "latency_p95_s": _percentile(latencies, 0.95),
+    }
+
+
+# ============================================================================
+# THREAD MODE (one process per thread setting)
+# ============================================================================
+
+def _thread_mode(threads: int, levels: List[int], jobs_per_level: int, workload: str, batch: int,
+                 audio: Optional[str]) -> List[Dict[str, Any]]:
+    """Runs in a fresh process: apply the thread setting, then sweep concurrency"""
+    from resource_policy import set_torch_threads, usable_cpus
+
+    cores = len(usable_cpus())
+    if threads:
+        for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+            os.environ[var] = str(threads)
+        set_torch_threads(threads, 1)
+        slots = max(1, cores // threads)
+    else:
+        slots = 0  # unmanaged: every caller runs at once with the default threads
+
+    job = _make_workload(workload, batch, audio)
+    job()  # warm-up
+
+    results = []
+    for concurrency in levels:
+        gate = threading.BoundedSemaphore(slots) if slots else None
+
+        def timed_job() -> float:
+            start = time.perf_counter()
+            if gate is None:
+                job()
+            else:
+                with gate:
+                    job()
+            return time.perf_counter() - start
+
+        n_jobs = max(jobs_per_level, concurrency * 2)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(lambda _: timed_job(), range(n_jobs)))
+        wall = time.perf_counter() - start
+        results.append({
+            "mode": "threads",
+            "threads": threads,
+            "slots": slots,
+            "concurrency": concurrency,
+            **_summary(latencies, wall),
+        })
+    return results
+
+
+# ============================================================================
+# PROCESS MODE (a pool per process count)
+# ============================================================================
+
+def _init_process_worker(threads: int, cpu_queue: Any, workload: str, batch: int, audio: Optional[str]) -> None:
+    global _workload
+    from resource_policy import init_worker_resources
+
+    init_worker_resources(threads, cpu_queue)
+    _workload = _make_workload(workload, batch, audio)
+    _workload()  # warm-up
+
+
+def _process_job(_: int) -> float:
+    start = time.perf_counter()
+    _workload()
+    return time.perf_counter() - start
+
+
+def _process_mode(processes: int, pinned: bool, jobs: int, workload: str, batch: int,
+                  audio: Optional[str]) -> Dict[str, Any]:
+    from resource_policy import cpu_sets, threads_per_process
+
+    context = multiprocessing.get_context("spawn")
+    threads = threads_per_process(processes)
+    cpu_queue = None
+    if pinned:
+        cpu_queue = context.Queue()
+        for cpus in cpu_sets(processes):
+            cpu_queue.put(cpus)
+
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=context,
+        initializer=_init_process_worker,
+        initargs=(threads, cpu_queue, workload, batch, audio),
+    ) as pool:
+        # Start every worker (and load its model) before timing
+        list(pool.map(_process_job, range(processes)))
+        n_jobs = max(jobs, processes * 2)
+        start = time.perf_counter()
+        latencies = list(pool.map(_process_job, range(n_jobs)))
+        wall = time.perf_counter() - start
+
+    return {
+        "mode": "processes",
+        "processes": processes,
+        "threads": threads,
+        "pinned": pinned,
+        "concurrency": processes,
+        **_summary(latencies, wall),
+    }
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inference throughput vs concurrency under CPU policies")
+    parser.add_argument("--mode", choices=("threads", "processes"), default="threads")
+    parser.add_argument("--workload", choices=("embed", "stt", "matmul"), default="embed")
+    parser.add_argument("--audio", help="WAV file for --workload stt")
+    parser.add_argument("--batch", type=int, default=64, help="Sentences per embed job")
+    parser.add_argument("--threads", default="0,1,2,4", help="Thread mode: intra-op threads per call (0 = unmanaged)")
+    parser.add_argument("--concurrency", default="1,2,4,8,16", help="Thread mode: concurrent callers")
+    parser.add_argument("--processes", default="1,2,4", help="Process mode: worker process counts")
+    parser.add_argument("--pin", action="store_true", help="Process mode: also run with CPU pinning")
+    parser.add_argument("--jobs", type=int, default=32, help="Jobs per measurement (at least 2 x concurrency)")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    from resource_policy import usable_cpus
+    cores = len(usable_cpus())
+    print(f"{cores} usable cores, workload={args.workload}, mode={args.mode}")
+
+    results: List[Dict[str, Any]] = []
+    if args.mode == "threads":
+        spawn = multiprocessing.get_context("spawn")
+        print(f"{'threads':>7} {'slots':>5} {'callers':>7} {'jobs/s':>9} {'p50 s':>8} {'p95 s':>8}")
+        for threads in _int_list(args.threads):
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                rows = pool.submit(
+                    _thread_mode, threads, _int_list(args.concurrency), args.jobs,
+                    args.workload, args.batch, args.audio
+                ).result()
+            for row in rows:
+                print(
+                    f"{row['threads'] or 'default':>7} {row['slots'] or '-':>5} {row['concurrency']:>7} "
+                    f"{row['throughput_per_s']:9.2f} {row['latency_p50_s']:8.3f} {row['latency_p95_s']:8.3f}"
+                )
+            results.extend(rows)
+    else:
+        print(f"{'procs':>5} {'threads':>7} {'pinned':>6} {'jobs/s':>9} {'p50 s':>8} {'p95 s':>8}")
+        for processes in _int_list(args.processes):
+            for pinned in ((False, True) if args.pin else (False,)):
+                row = _process_mode(processes, pinned, args.jobs, args.workload, args.batch, args.audio)
+                print(
+                    f"{row['processes']:>5} {row['threads']:>7} {str(row['pinned']):>6} "
+                    f"{row['throughput_per_s']:9.2f} {row['latency_p50_s']:8.3f} {row['latency_p95_s']:8.3f}"
+                )
+                results.append(row)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"cpu_count": cores, "workload": args.workload, "results": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Embedding backend comparison: accuracy and speed
+
+Encodes the benchmark outline and transcript with the PyTorch
+sentence-transformers model and with the exported ONNX model(s), then
+reports how close the vectors are and what that does to alignment:
+
+- cosine between the two backends' vectors of every sentence
+- share of segments whose best outline section is the same
+- share of segments whose off-topic flag (SIMILARITY_THRESHOLD) is the same
+- throughput (sentences per second, median of --repeat runs) and load time
+
+Usage (from backend/, after `python -m embedding_backend export`):
+    python -m benchmarks.embedding_compare
+    python -m benchmarks.embedding_compare --minutes 20 --slides 60 --output emb.json
+
+Exits with status 1 if a candidate falls below --min-cosine or
+--min-agreement.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from alignment import split_outline_into_sections
+from benchmarks.fixtures import make_outline_text, make_segments
+from config import settings
+from embedding_backend import OnnxEmbeddingModel, load_embedding_model
+
+
+def _throughput(model: Any, texts: List[str], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        model.encode(texts, normalize_embeddings=True)
+        timings.append(time.perf_counter() - start)
+    return len(texts) / statistics.median(timings)
+
+
+def _compare(
+    reference: np.ndarray,
+    candidate: np.ndarray,
+    n_sections: int
+) -> Dict[str, float]:
+    cosine = np.sum(reference * candidate, axis=1)
+    ref_sim = reference[n_sections:] @ reference[:n_sections].T
+    cand_sim = candidate[n_sections:] @ candidate[:n_sections].T
+    threshold = settings.SIMILARITY_THRESHOLD
+    return {
+        "cosine_min": float(cosine.min()),
+        "cosine_mean": float(cosine.mean()),
+        "best_section_agreement": float(np.mean(ref_sim.argmax(1) == cand_sim.argmax(1))),
+        "off_topic_agreement": float(np.mean((ref_sim.max(1) < threshold) == (cand_sim.max(1) < threshold))),
+        "score_max_abs_diff": float(np.abs(ref_sim - cand_sim).max()),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare embedding backends (accuracy and speed)")
+    parser.add_argument("--onnx-dir", default=settings.EMBEDDING_ONNX_DIR, help="Exported ONNX model directory")
+    parser.add_argument("--minutes", type=float, default=5, help="Transcript length")
+    parser.add_argument("--slides", type=int, default=30, help="Outline size")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per backend")
+    parser.add_argument("--min-cosine", type=float, default=0.98, help="Fail if any sentence is below this")
+    parser.add_argument("--min-agreement", type=float, default=0.95, help="Fail if best-section agreement is below this")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    sections = split_outline_into_sections(make_outline_text(args.slides))
+    segments = [s.text for s in make_segments(args.minutes)]
+    texts = sections + segments
+    print(f"{len(sections)} outline sections, {len(segments)} segments")
+
+    candidates: Dict[str, Any] = {}
+    load_seconds: Dict[str, float] = {}
+
+    start = time.perf_counter()
+    candidates["torch"] = load_embedding_model("torch")
+    load_seconds["torch"] = time.perf_counter() - start
+    with open(os.path.join(args.onnx_dir, "embedding_config.json"), encoding="utf-8") as f:
+        exported = json.load(f)
+    for name, quantized in (("onnx-fp32", False), ("onnx-int8", True)):
+        if quantized and not exported["quantized"]:
+            continue
+        start = time.perf_counter()
+        candidates[name] = OnnxEmbeddingModel(args.onnx_dir, quantized=quantized)
+        load_seconds[name] = time.perf_counter() - start
+
+    vectors = {name: np.asarray(model.encode(texts, normalize_embeddings=True)) for name, model in candidates.items()}
+
+    results = []
+    failed = False
+    print(f"\n{'backend':<10} {'load s':>7} {'sent/s':>9} {'cos min':>8} {'cos mean':>9} {'best=':>7} {'off=':>7}")
+    for name, model in candidates.items():
+        row: Dict[str, Any] = {
+            "backend": name,
+            "load_s": load_seconds[name],
+            "sentences_per_s": _throughput(model, texts, args.repeat),
+        }
+        if name != "torch":
+            row.update(_compare(vectors["torch"], vectors[name], len(sections)))
+            if row["cosine_min"] < args.min_cosine or row["best_section_agreement"] < args.min_agreement:
+                row["failed"] = True
+                failed = True
+        results.append(row)
+        print(
+            f"{name:<10} {row['load_s']:7.2f} {row['sentences_per_s']:9.1f} "
+            f"{row.get('cosine_min', 1.0):8.4f} {row.get('cosine_mean', 1.0):9.4f} "
+            f"{row.get('best_section_agreement', 1.0):7.1%} {row.get('off_topic_agreement', 1.0):7.1%}"
+            f"{'  FAIL' if row.get('failed') else ''}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "cpu_count": os.cpu_count(),
+                "sections": len(sections),
+                "segments": len(segments),
+                "results": results,
+            }, f, indent=2)
+        print(f"Results written to {args.output}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Local HTTP stand-in for the Gemini REST API
+
+Serves POST /v1beta/models/<model>:generateContent with deterministic answers
+(see benchmarks.llm_stub), configurable latency, and optional injection of
+429 RESOURCE_EXHAUSTED errors and malformed JSON bodies. Point the backend at
+it with:
+
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8765 GEMINI_API_KEY=fake uvicorn main:app
+
+Usage (from backend/):
+    python -m benchmarks.fake_gemini_server --port 8765 --latency 0.8 --jitter 0.4 --rate-429 0.05
+"""
+
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+from benchmarks.llm_stub import stub_answer
+
+logger = logging.getLogger(__name__)
+
+
+class FakeGeminiConfig:
+    """Behaviour knobs shared by all handler threads"""
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        jitter: float = 0.0,
+        rate_429: float = 0.0,
+        rate_malformed: float = 0.0,
+        retry_after: float = 1.0,
+        seed: int = 0
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.rate_malformed = rate_malformed
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "ok": 0, "429": 0, "malformed": 0}
+
+    def roll(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+    def count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+
+def _extract_prompt(body: Dict[str, Any]) -> str:
+    """Concatenate the text parts of a generateContent request"""
+    parts = []
+    for content in body.get("contents", []):
+        for part in content.get("parts", []):
+            if "text" in part:
+                parts.append(part["text"])
+    return "\n".join(parts)
+
+
+def _make_handler(config: FakeGeminiConfig):
+    class FakeGeminiHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format: str, *args) -> None:  # silence default stderr logging
+            logger.debug(format % args)
+
+        def _send_json(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> None:
+            data = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=UTF-8")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            if self.path.startswith("/stats"):
+                self._send_json(200, config.stats)
+            else:
+                self._send_json(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            config.count("requests")
+
+            if ":generateContent" not in self.path:
+                self._send_json(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+                return
+
+            delay = config.latency + (config.roll() * config.jitter if config.jitter else 0.0)
+            if delay > 0:
+                time.sleep(delay)
+
+            if config.rate_429 and config.roll() < config.rate_429:
+                config.count("429")
+                self._send_json(
+                    429,
+                    {"error": {
+                        "code": 429,
+                        "message": f"Resource has been exhausted (e.g. check quota). Please retry in {config.retry_after}s.",
+                        "status": "RESOURCE_EXHAUSTED",
+                    }},
+                    headers={"Retry-After": str(int(max(config.retry_after, 1)))},
+                )
+                return
+
+            try:
+                prompt = _extract_prompt(json.loads(raw or b"{}"))
+            except json.JSONDecodeError:
+                self._send_json(400, {"error": {"code": 400, "message": "Invalid JSON", "status": "INVALID_ARGUMENT"}})
+                return
+
+            text = stub_answer(prompt)
+            if config.rate_malformed and config.roll() < config.rate_malformed:
+                config.count("malformed")
+                text = text[: max(1, len(text) // 2)]  # truncated JSON, as a cut-off model answer would be
+            else:
+                config.count("ok")
+
+            self._send_json(200, {
+                "candidates": [{
+                    "content": {"parts": [{"text": text}], "role": "model"},
+                    "finishReason": "STOP",
+                    "index": 0,
+                }],
+                "usageMetadata": {
+                    "promptTokenCount": len(prompt) // 4,
+                    "candidatesTokenCount": len(text) // 4,
+                    "totalTokenCount": (len(prompt) + len(text)) // 4,
+                },
+            })
+
+    return FakeGeminiHandler
+
+
+def start_fake_gemini_server(
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    config: Optional[FakeGeminiConfig] = None
+) -> ThreadingHTTPServer:
+    """
+    Start the fake server on a background thread
+
+    Returns:
+        The running server (call .shutdown() to stop it)
+    """
+    server = ThreadingHTTPServer((host, port), _make_handler(config or FakeGeminiConfig()))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="fake-gemini", daemon=True)
+    thread.start()
+    logger.info(f"Fake Gemini server listening on http://{host}:{server.server_address[1]}")
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local fake Gemini API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="Fixed seconds per call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra uniform random seconds per call")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Fraction of calls answered with 429")
+    parser.add_argument("--rate-malformed", type=float, default=0.0, help="Fraction of calls with truncated JSON")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry delay advertised on 429s")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    config = FakeGeminiConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_429=args.rate_429,
+        rate_malformed=args.rate_malformed,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), _make_handler(config))
+    logger.info(f"Fake Gemini server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info(f"Stats: {config.stats}")
+
+
+if __name__ == "__main__":
+    main()
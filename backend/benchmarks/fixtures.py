@@ -0,0 +1,136 @@
+"""
+Synthetic fixtures for benchmarks
+
+Generates decks of N slides, outline text and transcripts of N minutes.
+Everything is seeded, so the same scale always produces the same input.
+"""
+
+import random
+from typing import Dict, List
+
+from models import TranscriptData, TranscriptSegment
+
+# Vocabulary the generated decks and transcripts are drawn from. Slides and
+# speech share topics so that alignment has real matches to find.
+TOPICS = [
+    ("Cloud Infrastructure", ["virtual machines", "object storage", "autoscaling groups", "regions and zones"]),
+    ("Machine Learning", ["training data", "model evaluation", "overfitting", "feature engineering"]),
+    ("Project Timeline", ["milestones", "risk register", "delivery dates", "team capacity"]),
+    ("Market Analysis", ["target customers", "competitors", "pricing strategy", "market size"]),
+    ("Security", ["access control", "encryption at rest", "audit logging", "incident response"]),
+    ("User Research", ["interviews", "usability tests", "personas", "pain points"]),
+    ("Budget", ["operating costs", "hardware spend", "licensing", "forecast"]),
+    ("Conclusion", ["key takeaways", "next steps", "open questions", "thank you"]),
+]
+
+FILLERS = ["um", "uh", "like", "you know", "basically", "actually"]
+
+WORDS_PER_MINUTE = 140
+SEGMENT_SECONDS = 4.0
+
+
+def make_slides(n_slides: int, seed: int = 0) -> List[Dict[str, str]]:
+    """
+    Build structured slides in the format of extract_slides_structured()
+
+    Args:
+        n_slides: Number of slides
+        seed: Random seed
+
+    Returns:
+        List of slides with 'title' and 'bullets' keys
+    """
+    rng = random.Random(seed)
+    slides = []
+    for i in range(n_slides):
+        topic, points = TOPICS[i % len(TOPICS)]
+        bullets = rng.sample(points, k=3)
+        slides.append({
+            "title": f"{topic} {i + 1}",
+            "bullets": "\n".join(f"{b} for part {i + 1}" for b in bullets),
+        })
+    return slides
+
+
+def make_deck_pptx(n_slides: int, path: str, seed: int = 0) -> str:
+    """
+    Write a PPTX deck with N title-and-content slides
+
+    Args:
+        n_slides: Number of slides
+        path: Output .pptx path
+        seed: Random seed
+
+    Returns:
+        The output path
+    """
+    from pptx import Presentation
+
+    prs = Presentation()
+    layout = prs.slide_layouts[1]  # Title and Content
+    for slide_data in make_slides(n_slides, seed):
+        slide = prs.slides.add_slide(layout)
+        slide.shapes.title.text = slide_data["title"]
+        body = slide.placeholders[1].text_frame
+        lines = slide_data["bullets"].split("\n")
+        body.text = lines[0]
+        for line in lines[1:]:
+            body.add_paragraph().text = line
+    prs.save(path)
+    return path
+
+
+def make_outline_text(n_slides: int, seed: int = 0) -> str:
+    """Outline text in the format of extract_text_from_pptx()"""
+    parts = []
+    for i, slide in enumerate(make_slides(n_slides, seed), start=1):
+        parts.append(f"--- Slide {i} ---")
+        parts.append(slide["title"])
+        parts.append(slide["bullets"])
+    return "\n".join(parts)
+
+
+def make_segments(minutes: float, seed: int = 0) -> List[TranscriptSegment]:
+    """
+    Build Whisper-style transcript segments covering N minutes of speech
+
+    Args:
+        minutes: Length of the talk
+        seed: Random seed
+
+    Returns:
+        Time-stamped segments, roughly SEGMENT_SECONDS each
+    """
+    rng = random.Random(seed)
+    total_seconds = minutes * 60
+    words_per_segment = max(1, int(WORDS_PER_MINUTE * SEGMENT_SECONDS / 60))
+    n_segments = max(1, int(total_seconds / SEGMENT_SECONDS))
+
+    segments = []
+    for i in range(n_segments):
+        # Walk through topics in order, as a presenter walks through slides
+        topic, points = TOPICS[(i * len(TOPICS)) // n_segments]
+        words: List[str] = []
+        while len(words) < words_per_segment:
+            roll = rng.random()
+            if roll < 0.08:
+                words.append(rng.choice(FILLERS))
+            elif roll < 0.5:
+                words.extend(rng.choice(points).split())
+            else:
+                words.extend(rng.choice(["we", "will", "look", "at", "the", "next", "important", "idea", topic.lower()]).split())
+        text = " ".join(words[:words_per_segment]).capitalize() + "."
+        start = i * SEGMENT_SECONDS
+        segments.append(TranscriptSegment(start=start, end=start + SEGMENT_SECONDS, text=text))
+    return segments
+
+
+def make_transcript(minutes: float, seed: int = 0, language: str = "en") -> TranscriptData:
+    """Build a TranscriptData of N minutes"""
+    segments = make_segments(minutes, seed)
+    return TranscriptData(
+        text=" ".join(s.text for s in segments),
+        segments=segments,
+        duration=segments[-1].end if segments else 0.0,
+        language=language,
+    )
@@ -0,0 +1,110 @@
+"""
+Deterministic in-process stand-in for the Gemini model
+
+Answers are derived from a hash of the prompt, so repeated runs see the same
+classifications and the same talking points. A configurable latency (fixed
+plus jitter) models the network round trip without any real API traffic.
+"""
+
+import hashlib
+import json
+import random
+import re
+import time
+from typing import Any, Optional
+
+
+def stub_answer(prompt: str) -> str:
+    """Deterministic JSON answer for a backend prompt (alignment, talking points or feedback)"""
+    digest = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest(), 16)
+
+    if '"alignment"' in prompt:
+        # One answer per numbered spoken part ([1] "...", [2] "...")
+        parts = len(re.findall(r'^\[\d+\] "', prompt, flags=re.MULTILINE))
+        return json.dumps([
+            {
+                "part": n,
+                "alignment": ("high", "partial", "none", "none")[(digest >> (2 * n)) % 4],
+                "reason": "stub classification",
+            }
+            for n in range(1, parts + 1)
+        ])
+
+    if '"talking_points"' in prompt:
+        return json.dumps({"talking_points": [
+            f"Stub talking point {digest % 97}.",
+            f"Stub talking point {digest % 89}.",
+            f"Stub talking point {digest % 83}.",
+        ]})
+
+    return json.dumps({
+        "strengths": ["Clear structure.", "Good pace.", "Relevant examples."],
+        "improvements": ["Fewer fillers.", "Stronger opening.", "Slower conclusion."],
+        "tips": [
+            {"section": "Introduction", "tip": "State the goal early."},
+            {"section": "Main Part", "tip": "Use one example per slide."},
+            {"section": "General", "tip": "Pause between sections."},
+        ],
+    })
+
+
+class _StubResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubGeminiModel:
+    """Drop-in replacement for genai.GenerativeModel used by the backend"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self._rng = random.Random(seed)
+
+    def _sleep(self) -> None:
+        delay = self.latency + (self._rng.random() * self.jitter if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def generate_content(self, prompt: str, generation_config: Optional[Any] = None, **kwargs) -> _StubResponse:
+        self.calls += 1
+        self._sleep()
+        return _StubResponse(stub_answer(prompt))
+
+
+def install_llm_stub(
+    latency: float = 0.0,
+    jitter: float = 0.0,
+    seed: int = 0,
+    unthrottled: bool = True
+) -> StubGeminiModel:
+    """
+    Route every Gemini call in the backend to a shared StubGeminiModel
+
+    Args:
+        latency: Fixed seconds added to every call
+        jitter: Extra uniform random seconds per call
+        seed: Seed for the jitter
+        unthrottled: Replace the gateway's token bucket with an effectively
+            unlimited local one, so stage benchmarks measure our own overhead
+            rather than the configured quota
+
+    Returns:
+        The stub, so callers can read its call count
+    """
+    import gemini_gateway
+
+    stub = StubGeminiModel(latency=latency, jitter=jitter, seed=seed)
+    gemini_gateway._gemini_model = stub
+    if unthrottled:
+        gemini_gateway.get_gateway().bucket = gemini_gateway.TokenBucket(rate_per_sec=1e9, capacity=1e9)
+    return stub
+
+
+def uninstall_llm_stub() -> None:
+    """Drop the stub so the next call initializes the real model and gateway"""
+    import gemini_gateway
+
+    gemini_gateway._gemini_model = None
+    gemini_gateway._gateway = None
@@ -0,0 +1,308 @@
+"""
+End-to-end load test for /api/analyze and /api/analyze-pro
+
+Replays a corpus of audio files and decks against the API at a target
+request rate (open loop, so a slow server cannot slow down the arrival
+rate) and reports throughput plus p50/p95/p99 latency per endpoint and per
+pipeline stage (from the Server-Timing response header, when present).
+
+Fully offline: with --spawn the script starts the fake Gemini server and a
+local uvicorn backend pointed at it.
+
+Usage (from backend/):
+    python -m benchmarks.load_test --spawn --audio-dir corpus/audio \\
+        --deck-dir corpus/decks --rate 2 --duration 60 --mix analyze=1,analyze-pro=1
+"""
+
+import argparse
+import json
+import mimetypes
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.fake_gemini_server import FakeGeminiConfig, start_fake_gemini_server
+
+AUDIO_EXTENSIONS = (".webm", ".wav", ".mp3", ".ogg", ".m4a")
+
+_SERVER_TIMING_RE = re.compile(r"\s*([\w.-]+)(?:;[^,]*?dur=([\d.]+))?[^,]*")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (0 for an empty list)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """Parse 'stt;dur=812.3, metrics;dur=1.2' into {stage: milliseconds}"""
+    timings: Dict[str, float] = {}
+    if not header:
+        return timings
+    for entry in header.split(","):
+        match = _SERVER_TIMING_RE.match(entry)
+        if match and match.group(2):
+            timings[match.group(1)] = float(match.group(2))
+    return timings
+
+
+def encode_multipart(files: List[Tuple[str, str]], fields: Optional[Dict[str, str]] = None) -> Tuple[bytes, str]:
+    """
+    Build a multipart/form-data body
+
+    Args:
+        files: (form field, file path) pairs
+        fields: Plain form fields
+
+    Returns:
+        (body, content type header value)
+    """
+    boundary = uuid.uuid4().hex
+    parts: List[bytes] = []
+    for name, value in (fields or {}).items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode("utf-8")
+        )
+    for name, path in files:
+        filename = os.path.basename(path)
+        content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        with open(path, "rb") as f:
+            data = f.read()
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + data + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+class LoadTestResult:
+    """Thread-safe collector for per-request outcomes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.service_times: Dict[str, List[float]] = defaultdict(list)
+        self.stage_times: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint: str, status: str, latency: float, service_time: float, stages: Dict[str, float]) -> None:
+        with self._lock:
+            self.statuses[endpoint][status] += 1
+            if status == "200":
+                self.latencies[endpoint].append(latency)
+                self.service_times[endpoint].append(service_time)
+                for stage, ms in stages.items():
+                    self.stage_times[endpoint][stage].append(ms / 1000.0)
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        report: Dict[str, Any] = {"elapsed_s": round(elapsed, 2), "endpoints": {}}
+        for endpoint in sorted(self.statuses):
+            latencies = self.latencies[endpoint]
+            report["endpoints"][endpoint] = {
+                "requests": sum(self.statuses[endpoint].values()),
+                "statuses": dict(self.statuses[endpoint]),
+                "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed > 0 else 0.0,
+                "latency_s": {f"p{p}": round(percentile(latencies, p), 3) for p in (50, 95, 99)},
+                "service_time_s": {f"p{p}": round(percentile(self.service_times[endpoint], p), 3) for p in (50, 95, 99)},
+                "stages_s": {
+                    stage: {f"p{p}": round(percentile(values, p), 3) for p in (50, 95, 99)}
+                    for stage, values in sorted(self.stage_times[endpoint].items())
+                },
+            }
+        return report
+
+
+def build_corpus(audio_dir: str, deck_dir: str) -> Tuple[List[str], List[str]]:
+    audio_files = sorted(
+        os.path.join(audio_dir, f) for f in os.listdir(audio_dir) if f.lower().endswith(AUDIO_EXTENSIONS)
+    )
+    decks = sorted(os.path.join(deck_dir, f) for f in os.listdir(deck_dir) if f.lower().endswith(".pptx"))
+    if not audio_files:
+        raise SystemExit(f"No audio files found in {audio_dir}")
+    if not decks:
+        raise SystemExit(f"No .pptx decks found in {deck_dir}")
+    return audio_files, decks
+
+
+def parse_mix(spec: str) -> List[Tuple[str, float]]:
+    mix = []
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        mix.append((name.strip(), float(weight or 1)))
+    return mix
+
+
+def send_request(base_url: str, endpoint: str, audio_path: str, deck_path: str, timeout: float) -> Tuple[str, Dict[str, float]]:
+    body, content_type = encode_multipart([("audio", audio_path), ("outline_file", deck_path)])
+    request = urllib.request.Request(
+        f"{base_url}/api/{endpoint}",
+        data=body,
+        headers={"Content-Type": content_type},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return str(response.status), parse_server_timing(response.headers.get("Server-Timing"))
+    except urllib.error.HTTPError as e:
+        e.read()
+        return str(e.code), {}
+    except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+        return f"error:{type(e).__name__}", {}
+
+
+def wait_for_backend(base_url: str, timeout: float = 300.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/api/health", timeout=2) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.5)
+    raise SystemExit(f"Backend at {base_url} did not become healthy")
+
+
+def spawn_backend(port: int, gemini_port: int, workers: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "GEMINI_API_KEY": env.get("GEMINI_API_KEY") or "fake-key",
+        "GEMINI_API_ENDPOINT": f"http://127.0.0.1:{gemini_port}",
+        "DEBUG": "false",
+    })
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=backend_dir,
+        env=env,
+    )
+
+
+def run_load(
+    base_url: str,
+    audio_files: List[str],
+    decks: List[str],
+    mix: List[Tuple[str, float]],
+    rate: float,
+    duration: float,
+    max_concurrency: int,
+    timeout: float,
+    seed: int
+) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    endpoints = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    result = LoadTestResult()
+    interval = 1.0 / rate
+
+    def task(endpoint: str, audio_path: str, deck_path: str, scheduled: float) -> None:
+        sent = time.perf_counter()
+        status, stages = send_request(base_url, endpoint, audio_path, deck_path, timeout)
+        done = time.perf_counter()
+        # Latency counts from the scheduled arrival, so queueing in the
+        # client is not hidden (no coordinated omission)
+        result.record(endpoint, status, done - scheduled, done - sent, stages)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        n = 0
+        while True:
+            scheduled = start + n * interval
+            if scheduled - start >= duration:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            endpoint = rng.choices(endpoints, weights=weights)[0]
+            pool.submit(task, endpoint, rng.choice(audio_files), rng.choice(decks), scheduled)
+            n += 1
+    return result.summary(time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the analysis endpoints")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--audio-dir", required=True)
+    parser.add_argument("--deck-dir", required=True)
+    parser.add_argument("--mix", default="analyze=1,analyze-pro=1", help="endpoint=weight list")
+    parser.add_argument("--rate", type=float, default=1.0, help="Target requests per second")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to generate load")
+    parser.add_argument("--max-concurrency", type=int, default=64)
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write JSON report to this file")
+
+    spawn = parser.add_argument_group("offline mode")
+    spawn.add_argument("--spawn", action="store_true", help="Start fake Gemini and a local backend")
+    spawn.add_argument("--backend-port", type=int, default=8010)
+    spawn.add_argument("--backend-workers", type=int, default=1)
+    spawn.add_argument("--gemini-port", type=int, default=8765)
+    spawn.add_argument("--gemini-latency", type=float, default=0.5)
+    spawn.add_argument("--gemini-jitter", type=float, default=0.5)
+    spawn.add_argument("--gemini-rate-429", type=float, default=0.0)
+    spawn.add_argument("--gemini-rate-malformed", type=float, default=0.0)
+    args = parser.parse_args()
+
+    audio_files, decks = build_corpus(args.audio_dir, args.deck_dir)
+    mix = parse_mix(args.mix)
+
+    gemini_server = None
+    backend = None
+    base_url = args.base_url
+    try:
+        if args.spawn:
+            gemini_config = FakeGeminiConfig(
+                latency=args.gemini_latency,
+                jitter=args.gemini_jitter,
+                rate_429=args.gemini_rate_429,
+                rate_malformed=args.gemini_rate_malformed,
+                seed=args.seed,
+            )
+            gemini_server = start_fake_gemini_server(port=args.gemini_port, config=gemini_config)
+            backend = spawn_backend(args.backend_port, args.gemini_port, args.backend_workers)
+            base_url = f"http://127.0.0.1:{args.backend_port}"
+
+        wait_for_backend(base_url)
+        report = run_load(
+            base_url, audio_files, decks, mix,
+            rate=args.rate,
+            duration=args.duration,
+            max_concurrency=args.max_concurrency,
+            timeout=args.timeout,
+            seed=args.seed,
+        )
+        report["target_rate_rps"] = args.rate
+        if gemini_server is not None:
+            report["fake_gemini"] = dict(gemini_config.stats)
+    finally:
+        if backend is not None:
+            backend.terminate()
+            backend.wait(timeout=30)
+        if gemini_server is not None:
+            gemini_server.shutdown()
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
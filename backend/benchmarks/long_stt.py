@@ -0,0 +1,90 @@
+"""
+Long-audio STT: one Whisper call against chunks on the STT process pool
+
+Transcribes a recording twice, with stt.transcribe_audio(parallel=False)
+and with the long-audio mode (chunks cut at pauses, transcribed on the
+STT pool), and reports wall time, speedup and how far the two transcripts
+agree (word sequence similarity, segment timestamps).
+
+Pool start-up and model loading are excluded: the pool is warmed up
+before timing. Pass --processes to override STT_PROCESSES. The recording
+must be longer than STT_LONG_AUDIO_SEC after silence trimming, or both
+runs take the single-call path.
+
+Usage (from backend/):
+    python -m benchmarks.long_stt --audio rehearsal.wav
+    python -m benchmarks.long_stt --audio rehearsal.wav --processes 8 --output long.json
+"""
+
+import argparse
+import difflib
+import json
+import os
+import time
+
+import numpy as np
+
+from config import settings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Long-audio STT: single call vs parallel chunks")
+    parser.add_argument("--audio", required=True, help="Recording to transcribe (a long one, e.g. 20 minutes)")
+    parser.add_argument("--processes", type=int, default=0, help="STT pool size (default: STT_PROCESSES)")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    if args.processes:
+        settings.STT_PROCESSES = args.processes
+    if not settings.STT_LONG_AUDIO_SEC:
+        raise SystemExit("STT_LONG_AUDIO_SEC=0 turns the long-audio mode off")
+
+    from stt import transcribe_audio
+    from worker_pool import get_stt_pool, shutdown_stt_pool, stt_process_count
+
+    workers = stt_process_count()
+    print(f"STT pool: {workers} workers; warming up...")
+    pool = get_stt_pool()
+    list(pool.map(abs, range(workers)))  # start every worker (loads the model)
+
+    start = time.perf_counter()
+    serial = transcribe_audio(args.audio, parallel=False)
+    serial_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parallel = transcribe_audio(args.audio)
+    parallel_s = time.perf_counter() - start
+    shutdown_stt_pool()
+
+    serial_words = serial.text.lower().split()
+    parallel_words = parallel.text.lower().split()
+    word_similarity = difflib.SequenceMatcher(None, serial_words, parallel_words, autojunk=False).ratio()
+    starts = np.array([seg.start for seg in parallel.segments])
+    offsets = [np.abs(starts - seg.start).min() for seg in serial.segments] if len(starts) else [0.0]
+
+    result = {
+        "cpu_count": os.cpu_count(),
+        "workers": workers,
+        "audio_duration_s": serial.silence.original_duration_sec if serial.silence else serial.duration,
+        "serial_s": serial_s,
+        "parallel_s": parallel_s,
+        "speedup": serial_s / parallel_s,
+        "serial_words": len(serial_words),
+        "parallel_words": len(parallel_words),
+        "word_similarity": word_similarity,
+        "segment_start_offset_median_s": float(np.median(offsets)),
+    }
+    print(
+        f"single call {serial_s:.1f}s, {workers} chunks {parallel_s:.1f}s "
+        f"({result['speedup']:.2f}x); words {len(serial_words)} vs {len(parallel_words)}, "
+        f"similarity {word_similarity:.1%}, median segment offset {result['segment_start_offset_median_s']:.2f}s"
+    )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
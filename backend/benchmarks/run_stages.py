@@ -0,0 +1,192 @@
+"""
+Per-stage benchmark runner
+
+Times each pipeline stage at several input scales and records wall time,
+allocations and peak traced memory. Results are written as JSON so two
+commits can be compared with benchmarks.compare.
+
+Usage (from backend/):
+    python -m benchmarks.run_stages --output before.json
+    python -m benchmarks.run_stages --stages metrics,alignment --repeat 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmarks.fixtures import make_deck_pptx, make_outline_text, make_slides, make_transcript
+from benchmarks.llm_stub import install_llm_stub
+
+# A stage is: scales -> setup(scale) -> args, and the function under test
+StageSpec = Tuple[List[Dict[str, Any]], Callable[[Dict[str, Any]], tuple], Callable[..., Any]]
+
+
+def _stage_metrics() -> StageSpec:
+    from metrics import calculate_metrics
+
+    scales = [{"minutes": m} for m in (1, 5, 20, 60)]
+    return scales, lambda s: (make_transcript(s["minutes"]),), calculate_metrics
+
+
+def _stage_alignment() -> StageSpec:
+    from alignment import align_transcript_to_outline, get_embedding_model
+
+    get_embedding_model()  # model load is not part of the measurement
+    scales = [{"minutes": m, "slides": n} for m, n in ((1, 10), (5, 30), (20, 100))]
+    return (
+        scales,
+        lambda s: (make_transcript(s["minutes"]), make_outline_text(s["slides"])),
+        align_transcript_to_outline,
+    )
+
+
+def _stage_pptx(workdir: str) -> StageSpec:
+    from pptx_parser import extract_slides_structured
+
+    def setup(scale: Dict[str, Any]) -> tuple:
+        path = os.path.join(workdir, f"deck_{scale['slides']}.pptx")
+        if not os.path.exists(path):
+            make_deck_pptx(scale["slides"], path)
+        return (path,)
+
+    scales = [{"slides": n} for n in (10, 50, 200)]
+    return scales, setup, extract_slides_structured
+
+
+def _stage_blocks() -> StageSpec:
+    from slide_alignment import split_transcript_into_blocks
+
+    scales = [{"minutes": m} for m in (1, 5, 20, 60)]
+    return scales, lambda s: (make_transcript(s["minutes"]).text,), split_transcript_into_blocks
+
+
+def _stage_slide_analysis() -> StageSpec:
+    from slide_alignment import analyze_slide_by_slide_alignment
+    from talking_points import generate_talking_points_batch
+
+    async def pipeline(slides, transcript_text, language):
+        analysis = await analyze_slide_by_slide_alignment(slides, transcript_text, language)
+        return await generate_talking_points_batch(analysis, language)
+
+    def run(slides, transcript_text, language):
+        return asyncio.run(pipeline(slides, transcript_text, language))
+
+    scales = [{"minutes": m, "slides": n} for m, n in ((1, 5), (3, 10), (5, 20))]
+    return (
+        scales,
+        lambda s: (make_slides(s["slides"]), make_transcript(s["minutes"]).text, "en"),
+        run,
+    )
+
+
+def _measure(fn: Callable[..., Any], args: tuple, repeat: int) -> Dict[str, Any]:
+    """Run fn(*args) `repeat` times for timing, then once under tracemalloc"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+
+    # Separate traced run: tracemalloc overhead must not skew wall time
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    base_current, _ = tracemalloc.get_traced_memory()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    diff = after.compare_to(before, "filename")
+    alloc_blocks = sum(max(stat.count_diff, 0) for stat in diff)
+    alloc_bytes = sum(max(stat.size_diff, 0) for stat in diff)
+
+    return {
+        "wall_s_median": statistics.median(timings),
+        "wall_s_min": min(timings),
+        "wall_s_max": max(timings),
+        "repeat": repeat,
+        "alloc_blocks": alloc_blocks,
+        "alloc_bytes": alloc_bytes,
+        "peak_bytes": max(peak - base_current, 0),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark backend pipeline stages")
+    parser.add_argument("--stages", default="metrics,alignment,pptx,blocks,slide_analysis",
+                        help="Comma-separated stages to run")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per scale")
+    parser.add_argument("--llm-latency", type=float, default=0.0,
+                        help="Seconds of simulated latency per LLM call")
+    parser.add_argument("--llm-jitter", type=float, default=0.0,
+                        help="Extra uniform random seconds per LLM call")
+    parser.add_argument("--output", help="Write JSON results to this file (default: stdout)")
+    args = parser.parse_args()
+
+    stub = install_llm_stub(latency=args.llm_latency, jitter=args.llm_jitter)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        registry: Dict[str, Callable[[], StageSpec]] = {
+            "metrics": _stage_metrics,
+            "alignment": _stage_alignment,
+            "pptx": lambda: _stage_pptx(workdir),
+            "blocks": _stage_blocks,
+            "slide_analysis": _stage_slide_analysis,
+        }
+
+        results = []
+        for name in [s.strip() for s in args.stages.split(",") if s.strip()]:
+            if name not in registry:
+                parser.error(f"Unknown stage: {name}")
+            scales, setup, fn = registry[name]()
+            for scale in scales:
+                stage_args = setup(scale)
+                calls_before = stub.calls
+                measurement = _measure(fn, stage_args, args.repeat)
+                measurement["llm_calls"] = (stub.calls - calls_before) // (args.repeat + 1)
+                results.append({"stage": name, "scale": scale, **measurement})
+                print(
+                    f"{name:<15} {json.dumps(scale):<32} "
+                    f"median={measurement['wall_s_median'] * 1000:9.2f} ms  "
+                    f"peak={measurement['peak_bytes'] / 1024:9.1f} KiB"
+                )
+
+    report = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "llm_latency": args.llm_latency,
+        "llm_jitter": args.llm_jitter,
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""
+Offline Bulk Analysis
+
+Runs the analysis over a directory of recordings without the HTTP server,
+on a pool of worker processes (each loads Whisper and the embedding model
+once), and appends one JSON line per recording to the output file as soon
+as it finishes. Re-running with the same output file skips recordings that
+already have a successful record (matched by path and audio hash), so an
+interrupted overnight run simply resumes.
+
+Each recording is paired with a deck by file stem (talk1.webm + talk1.pptx,
+.pdf, .txt or .md in the same directory), falling back to --deck.
+
+With --workers 1 (e.g. a few long lecture recordings), recordings longer
+than STT_LONG_AUDIO_SEC are transcribed as parallel chunks on the STT pool
+(see stt.transcribe_long_audio()); with more workers the cores are already
+shared between recordings, so each one is transcribed in a single call.
+
+Usage (from backend/):
+    python bulk_analyze.py archive/ --deck course.pptx --out results.jsonl \\
+        --workers 8 --slides --feedback
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger("bulk_analyze")
+
+AUDIO_EXTENSIONS = (".webm", ".wav", ".mp3", ".ogg", ".m4a")
+DECK_EXTENSIONS = (".pptx", ".pdf", ".txt", ".md")
+
+
+# ============================================================================
+# JOB DISCOVERY AND RESUME
+# ============================================================================
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_deck(audio_path: str, default_deck: Optional[str]) -> Optional[str]:
+    """Deck with the same stem as the recording, else the default deck"""
+    stem = os.path.splitext(audio_path)[0]
+    for ext in DECK_EXTENSIONS:
+        if os.path.isfile(stem + ext):
+            return stem + ext
+    return default_deck
+
+
+def discover_jobs(input_dir: str, default_deck: Optional[str]) -> Iterator[Tuple[str, str, Optional[str]]]:
+    """Yield (job id, audio path, deck path) for every recording, sorted"""
+    for root, _dirs, files in os.walk(input_dir):
+        for name in sorted(files):
+            if name.lower().endswith(AUDIO_EXTENSIONS):
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, input_dir), path, find_deck(path, default_deck)
+
+
+def load_done(output_path: str) -> Set[Tuple[str, str]]:
+    """(job id, audio sha256) of records already written successfully"""
+    done: Set[Tuple[str, str]] = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # truncated last line of an interrupted run
+            if record.get("status") == "ok":
+                done.add((record.get("id"), record.get("audio_sha256")))
+    return done
+
+
+# ============================================================================
+# WORKER SIDE
+# ============================================================================
+
+# Per-worker cache of parsed and embedded decks: path -> (mtime, deck dict)
+_decks: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+
+def _init_worker(threads: int, cpu_queue: Optional[Any], options: Dict[str, Any]) -> None:
+    """Runs once per worker process: apply the CPU policy and load the models"""
+    from resource_policy import init_worker_resources
+    init_worker_resources(threads, cpu_queue)
+
+    if options.get("stub_llm"):
+        from benchmarks.llm_stub import install_llm_stub
+        install_llm_stub()
+
+    from stt import get_whisper_model
+    from alignment import get_embedding_model
+    get_whisper_model()
+    get_embedding_model()
+
+
+def _load_deck(deck_path: str, with_slides: bool) -> Dict[str, Any]:
+    """Parse and embed a deck (cached per worker, reloaded if the file changed)"""
+    from alignment import encode_outline
+    from file_utils import extract_text_from_pdf, extract_text_from_pptx
+    from pptx_parser import extract_slides_structured
+
+    mtime = os.path.getmtime(deck_path)
+    cached = _decks.get(deck_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    ext = os.path.splitext(deck_path)[1].lower()
+    slides = None
+    if ext == ".pptx":
+        text = extract_text_from_pptx(deck_path)
+        if with_slides:
+            slides = extract_slides_structured(deck_path)
+    elif ext == ".pdf":
+        text = extract_text_from_pdf(deck_path)
+    else:
+        with open(deck_path, "r", encoding="utf-8") as f:
+            text = f.read()
+
+    if not text or len(text.strip()) < 20:
+        raise ValueError(f"Outline too short or unreadable: {deck_path}")
+
+    deck = {"text": text, "outline": encode_outline(text), "slides": slides}
+    _decks[deck_path] = (mtime, deck)
+    return deck
+
+
+async def _llm_stages(deck: Dict[str, Any], transcript, metrics, alignment, options: Dict[str, Any]) -> Dict[str, Any]:
+    from llm_feedback import detect_language, generate_feedback_or_template
+    from slide_alignment import analyze_slide_by_slide_alignment
+    from talking_points import build_slide_alignment, generate_talking_points_batch
+
+    output: Dict[str, Any] = {"degraded_stages": []}
+
+    if options.get("feedback"):
+        feedback, fallback = await generate_feedback_or_template(deck["text"], transcript, metrics, alignment)
+        output["feedback"] = feedback.model_dump(mode="json")
+        if fallback:
+            output["degraded_stages"].append("feedback_llm")
+
+    if options.get("slides") and deck["slides"]:
+        language = detect_language(deck["text"], transcript.text)
+        slides = await analyze_slide_by_slide_alignment(deck["slides"], transcript.text, language)
+        slides = await generate_talking_points_batch(slides, language)
+        output["slide_alignment"] = build_slide_alignment(slides, language).model_dump(mode="json")
+        if any(s.get("source", "llm") != "llm" for s in slides):
+            output["degraded_stages"].append("slide_alignment")
+        if any(s.get("talking_points_fallback") for s in slides):
+            output["degraded_stages"].append("talking_points")
+
+    return output
+
+
+def analyze_recording(job_id: str, audio_path: str, deck_path: Optional[str], options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Analyze one recording (runs in a worker process; never raises)
+
+    Returns:
+        JSON-serializable record with status "ok" or "error"
+    """
+    from alignment import align_transcript_to_outline
+    from audio_utils import convert_webm_to_wav
+    from metrics import calculate_metrics
+    from stt import transcribe_audio
+
+    started = time.perf_counter()
+    record: Dict[str, Any] = {"id": job_id, "audio": audio_path, "deck": deck_path}
+    try:
+        record["audio_sha256"] = file_sha256(audio_path)
+        if deck_path is None:
+            raise ValueError("No deck found (same stem or --deck)")
+        deck = _load_deck(deck_path, with_slides=bool(options.get("slides")))
+
+        with tempfile.TemporaryDirectory(prefix="cm_bulk_") as tmp:
+            wav_path = audio_path
+            if not audio_path.lower().endswith(".wav"):
+                wav_path = convert_webm_to_wav(audio_path, os.path.join(tmp, "audio.wav"))
+            transcript = transcribe_audio(wav_path, parallel=bool(options.get("long_audio")))
+
+        metrics = calculate_metrics(transcript)
+        alignment = align_transcript_to_outline(transcript, deck["text"], deck["outline"])
+
+        record.update({
+            "status": "ok",
+            "transcript": transcript.model_dump(mode="json"),
+            "metrics": metrics.model_dump(mode="json"),
+            "alignment": alignment.model_dump(mode="json"),
+        })
+        if options.get("feedback") or options.get("slides"):
+            record.update(asyncio.run(_llm_stages(deck, transcript, metrics, alignment, options)))
+
+    except Exception as e:
+        record.update({
+            "status": "error",
+            "error": f"{type(e).__name__}: {e}",
+            "traceback": traceback.format_exc(limit=5),
+        })
+
+    record["elapsed_sec"] = round(time.perf_counter() - started, 3)
+    return record
+
+
+# ============================================================================
+# DRIVER
+# ============================================================================
+
+def run(args: argparse.Namespace) -> int:
+    import multiprocessing
+    from resource_policy import threads_per_process, worker_cpu_queue
+
+    done = set() if args.no_resume else load_done(args.out)
+    jobs: List[Tuple[str, str, Optional[str]]] = []
+    skipped = 0
+    for job_id, audio_path, deck_path in discover_jobs(args.input_dir, args.deck):
+        if done and (job_id, file_sha256(audio_path)) in done:
+            skipped += 1
+            continue
+        jobs.append((job_id, audio_path, deck_path))
+        if args.limit and len(jobs) >= args.limit:
+            break
+
+    logger.info(f"{len(jobs)} recordings to analyze, {skipped} already done")
+    if not jobs:
+        return 0
+
+    workers = args.workers or os.cpu_count() or 1
+    threads = args.threads or threads_per_process(workers)
+    options = {
+        "slides": args.slides,
+        "feedback": args.feedback,
+        "stub_llm": args.stub_llm,
+        "long_audio": workers == 1,
+    }
+
+    out_dir = os.path.dirname(os.path.abspath(args.out))
+    os.makedirs(out_dir, exist_ok=True)
+
+    failed = 0
+    started = time.perf_counter()
+    pending_jobs = iter(jobs)
+    in_flight: Dict[Future, str] = {}
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(threads, worker_cpu_queue(context, workers), options),
+    ) as pool, open(args.out, "a", encoding="utf-8") as out:
+
+        def submit_next() -> bool:
+            job = next(pending_jobs, None)
+            if job is None:
+                return False
+            in_flight[pool.submit(analyze_recording, *job, options)] = job[0]
+            return True
+
+        # Keep a bounded number of jobs queued so memory stays flat
+        for _ in range(workers * 2):
+            if not submit_next():
+                break
+
+        completed = 0
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                job_id = in_flight.pop(future)
+                try:
+                    record = future.result()
+                except Exception as e:  # worker process died
+                    record = {"id": job_id, "status": "error", "error": f"{type(e).__name__}: {e}"}
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+
+                completed += 1
+                if record["status"] != "ok":
+                    failed += 1
+                    logger.warning(f"[{completed}/{len(jobs)}] {job_id}: {record['error']}")
+                else:
+                    logger.info(f"[{completed}/{len(jobs)}] {job_id} ({record['elapsed_sec']}s)")
+                submit_next()
+
+    elapsed = time.perf_counter() - started
+    logger.info(
+        f"Done: {len(jobs) - failed} ok, {failed} failed in {elapsed:.1f}s "
+        f"({len(jobs) / elapsed * 3600:.0f} recordings/hour with {workers} workers x {threads} threads)"
+    )
+    return 1 if failed else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Analyze a directory of recordings offline")
+    parser.add_argument("input_dir", help="Directory with recordings (searched recursively)")
+    parser.add_argument("--deck", help="Deck/outline for recordings without a same-stem deck")
+    parser.add_argument("--out", default="bulk_results.jsonl", help="JSONL output (appended to)")
+    parser.add_argument("--workers", type=int, default=0, help="Worker processes (default: all cores)")
+    parser.add_argument("--threads", type=int, default=0, help="Torch threads per worker (default: cores / workers)")
+    parser.add_argument("--slides", action="store_true", help="Slide-by-slide analysis for .pptx decks (uses the LLM)")
+    parser.add_argument("--feedback", action="store_true", help="Generate feedback (uses the LLM)")
+    parser.add_argument("--stub-llm", action="store_true", help="Use the offline LLM stub (testing)")
+    parser.add_argument("--no-resume", action="store_true", help="Reprocess recordings already in --out")
+    parser.add_argument("--limit", type=int, default=0, help="Stop after this many new recordings")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if not os.path.isdir(args.input_dir):
+        parser.error(f"Not a directory: {args.input_dir}")
+    if args.deck and not os.path.isfile(args.deck):
+        parser.error(f"Deck not found: {args.deck}")
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
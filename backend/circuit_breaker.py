@@ -0,0 +1,129 @@
+"""
+Circuit Breaker Module
+
+Stops calling a dependency that is failing or slow, so requests get a fast
+local answer instead of each waiting out its own timeout.
+
+    closed     calls go through; consecutive failures (errors or calls slower
+               than slow_call_sec) are counted
+    open       after failure_threshold of them, calls are rejected at once
+               for open_seconds
+    half-open  then up to half_open_probes calls are let through; a success
+               closes the circuit, a failure opens it again
+
+State is per process.
+"""
+
+import logging
+import threading
+import time
+from typing import Optional
+
+from telemetry import CIRCUIT_STATE
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker
+
+    Args:
+        name: Label for logs and the cm_circuit_state metric
+        failure_threshold: Consecutive failures that open the circuit
+        slow_call_sec: Successful calls slower than this count as failures
+            (0 = never)
+        open_seconds: How long to reject calls before probing
+        half_open_probes: Calls allowed through at once while half-open
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        slow_call_sec: float,
+        open_seconds: float,
+        half_open_probes: int = 1
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_sec = slow_call_sec
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set(_STATE_VALUES[CLOSED], breaker=name)
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            logger.warning(f"Circuit '{self.name}': {self.state} -> {state}")
+            self.state = state
+            CIRCUIT_STATE.set(_STATE_VALUES[state], breaker=self.name)
+
+    def allow(self) -> bool:
+        """Whether a call may go through now (a True in half-open is a probe)"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self._opened_at < self.open_seconds:
+                    return False
+                self._set_state(HALF_OPEN)
+                self._probes_in_flight = 0
+
+            if self.state == HALF_OPEN:
+                if self._probes_in_flight >= self.half_open_probes:
+                    return False
+                self._probes_in_flight += 1
+            return True
+
+    def is_open(self) -> bool:
+        """True while calls are being rejected (without taking a probe slot)"""
+        with self._lock:
+            return self.state == OPEN and time.monotonic() - self._opened_at < self.open_seconds
+
+    def record_success(self, duration: Optional[float] = None) -> None:
+        """
+        Report a finished call; slow calls are treated as failures
+
+        Only a probe (half-open) closes an open circuit: a success reported
+        while open comes from a call sent before it opened and is ignored.
+        """
+        if self.slow_call_sec > 0 and duration is not None and duration > self.slow_call_sec:
+            logger.warning(f"Circuit '{self.name}': slow call ({duration:.1f}s)")
+            self.record_failure()
+            return
+        with self._lock:
+            if self.state == OPEN:
+                return
+            self.failures = 0
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        """Report a failed call"""
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._probes_in_flight = 0
+                self._set_state(OPEN)
+
+    def release(self) -> None:
+        """Report a call that ended without an outcome (e.g. cancelled)"""
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
@@ -1,6 +1,6 @@
 import os
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Any, Dict, List
 
 
 class Settings(BaseSettings):
@@ -9,14 +9,118 @@ class Settings(BaseSettings):
     # API Keys
     GEMINI_API_KEY: str = ""
     GEMINI_MODEL: str = "gemini-flash-latest"
+    GEMINI_API_ENDPOINT: str = ""  # e.g. http://127.0.0.1:8765 for a local fake server
+    
+    # Gemini gateway (rate limiting and retries)
+    GEMINI_RPM: int = 60  # requests per minute allowed by our quota
+    GEMINI_BURST: int = 10  # token bucket capacity
+    GEMINI_MAX_CONCURRENCY: int = 8  # calls in flight per process
+    GEMINI_MAX_RETRIES: int = 4
+    GEMINI_BACKOFF_BASE: float = 1.0  # seconds, doubled per retry
+    GEMINI_BACKOFF_MAX: float = 30.0  # seconds
+    GEMINI_RATE_LIMIT_SHARED: bool = True  # share the bucket across workers via a lock file
+    GEMINI_RATE_LIMIT_FILE: str = ""  # bucket state file (default: system temp)
+    
+    # LLM deadlines and hedging
+    LLM_DEADLINE_SEC: float = 45.0  # whole feedback call incl. retries, from dispatch (0 = none)
+    LLM_CHECK_DEADLINE_SEC: float = 15.0  # per slide check batch / talking points call
+    LLM_QUEUE_TIMEOUT_SEC: float = 30.0  # max local wait for a rate-limit token and a free slot, per attempt (0 = none)
+    SLIDE_CHECK_BATCH_BLOCKS: int = 8  # transcript blocks judged against a slide per LLM call
+    SLIDE_CHECKS_IN_FLIGHT: int = 4  # slide check calls one request may have in flight (capped at GEMINI_BURST)
+    LLM_HEDGE_ENABLED: bool = False  # send a duplicate request when a call runs slow
+    LLM_HEDGE_PERCENTILE: float = 95.0  # hedge after this percentile of recent latency
+    LLM_HEDGE_MIN_DELAY: float = 0.2  # seconds, floor for the hedge delay
+    LLM_HEDGE_MAX_RATIO: float = 0.05  # max hedges per primary call
+    LLM_HEDGE_MIN_SAMPLES: int = 20  # latencies needed before hedging starts
+    LLM_LATENCY_WINDOW: int = 200  # recent latencies kept per caller
+    
+    # LLM circuit breaker (falls back to local analysis while open)
+    LLM_BREAKER_FAILURE_THRESHOLD: int = 5  # consecutive failed/slow calls before opening
+    LLM_BREAKER_SLOW_CALL_SEC: float = 20.0  # calls slower than this count as failures
+    LLM_BREAKER_OPEN_SEC: float = 30.0  # fail fast for this long, then probe
+    LLM_BREAKER_HALF_OPEN_PROBES: int = 1  # calls let through while probing
+    SLIDE_FALLBACK_HIGH_THRESHOLD: float = 0.6  # local similarity for "high" alignment
+    SLIDE_FALLBACK_FAILURE_RATIO: float = 0.5  # a slide with more failed checks than this is classified locally as a whole
     
     # Application
     DEBUG: bool = True
-    MAX_AUDIO_DURATION: int = 180  # seconds
-    MAX_FILE_SIZE: int = 20  # MB
+    MAX_AUDIO_DURATION: int = 180  # seconds (API uploads; below STT_LONG_AUDIO_SEC, so the API never uses chunked STT)
+    MAX_FILE_SIZE: int = 20  # MB (per uploaded file)
+    MAX_REQUEST_SIZE: int = 45  # MB (whole multipart body)
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # bytes read per chunk when streaming uploads
+    
+    # Scratch space (per-request temp files)
+    SCRATCH_BUDGET_MB: int = 200  # max bytes a single request may write
+    SCRATCH_MEMORY_THRESHOLD_MB: int = 32  # files up to this size go to tmpfs
+    SCRATCH_MEMORY_DIR: str = ""  # override tmpfs location (default: /dev/shm)
+    SCRATCH_DISK_DIR: str = ""  # override disk location (default: system temp)
+    
+    # Request coalescing (identical concurrent analyses share one computation)
+    COALESCE_RESULT_TTL_SEC: float = 120.0  # keep finished responses for Idempotency-Key retries
+    COALESCE_MAX_ENTRIES: int = 256
+    
+    # Session history (SQLite)
+    SESSION_STORE_ENABLED: bool = True  # runs are stored per X-User-Id (none = not stored); set the header from an authenticating proxy
+    SESSION_DB_PATH: str = "sessions.db"
+    SESSION_REUSE_TRANSCRIPTS: bool = True  # skip decode/STT when the same user re-sends the same audio
+    SESSION_HISTORY_LIMIT: int = 100  # max runs returned by list/progress endpoints
+    
+    # Pipeline
+    PIPELINE_THREADS: int = 0  # stage thread pool size (0 = min(32, cpu_count + 4))
+    STT_PROCESSES: int = 0  # STT worker processes for batch work (0 = cpu_count // 2)
+    STT_LONG_AUDIO_SEC: float = 240.0  # longer speech is chunked on the STT pool (0 = never); bulk_analyze --workers 1, or the API if MAX_AUDIO_DURATION is above it
+    STT_CHUNK_MIN_SEC: float = 60.0  # fewer chunks than workers rather than shorter ones
+    STT_CHUNK_OVERLAP_SEC: float = 1.0  # audio shared by neighbouring chunks
+    
+    # Silence trimming before STT (see vad.py)
+    VAD_ENABLED: bool = True
+    VAD_FRAME_MS: int = 30  # energy frame length
+    VAD_THRESHOLD_DB: float = 12.0  # speech is this far above the noise floor
+    VAD_MIN_SILENCE_MS: int = 700  # shorter silences are kept
+    VAD_PAD_MS: int = 250  # audio kept on each side of speech
+    
+    # CPU resource policy for model inference (see resource_policy.py)
+    INFERENCE_SLOTS: int = 0  # concurrent Whisper/embedding calls in the API process (0 = cores / TORCH_INTRA_OP_THREADS)
+    TORCH_INTRA_OP_THREADS: int = 0  # torch threads per inference call (0 = cores / INFERENCE_SLOTS, or min(4, cores))
+    TORCH_INTER_OP_THREADS: int = 1  # torch inter-op pool per process
+    CPU_AFFINITY: bool = False  # pin each worker process to its own cores (Linux)
+    
+    # Cohort endpoint (many recordings, one deck)
+    COHORT_MAX_RECORDINGS: int = 40
+    MAX_COHORT_REQUEST_SIZE: int = 600  # MB (whole multipart body)
+    
+    # Profiling (opt-in, per request)
+    PROFILE_ENABLED: bool = False  # install the profiling middleware at all
+    PROFILE_SAMPLE_RATE: float = 0.0  # fraction of analysis requests profiled automatically
+    PROFILE_HEADER: str = "X-Profile"  # send "X-Profile: 1" to profile one request
+    PROFILE_DIR: str = "profiles"
+    PROFILE_INTERVAL_MS: int = 5  # stack sampling interval
+    PROFILE_TOP_ALLOCATIONS: int = 50
+    PROFILE_TRACEMALLOC_FRAMES: int = 10
+    
+    # Request traces (JSON lines, one record per request)
+    TRACE_ENABLED: bool = False
+    TRACE_FILE: str = "traces/requests.jsonl"
+    TRACE_QUEUE_SIZE: int = 10000  # records buffered before new ones are dropped
     
     # Alignment
     SIMILARITY_THRESHOLD: float = 0.45
+    ALIGNMENT_TOP_K: int = 3  # closest sections per segment and segments per section in the response
+    TIMELINE_SKIP_PENALTY: float = 0.3  # similarity cost per slide skipped in the slide timeline
+    
+    # Sentence embeddings
+    EMBEDDING_BACKEND: str = "torch"  # "torch" (sentence-transformers) or "onnx" (ONNX Runtime, see embedding_backend.py)
+    EMBEDDING_ONNX_DIR: str = "models/onnx-minilm"  # output of: python -m embedding_backend export
+    EMBEDDING_ONNX_QUANTIZED: bool = True  # use the int8 dynamically quantized model
+    
+    # Approximate nearest-neighbor search (long outlines, deck library)
+    ANN_ENABLED: bool = True  # store deck encodings and index large outlines/libraries
+    ANN_BACKEND: str = "ivf"  # "ivf" (NumPy) or "hnsw" (needs hnswlib, falls back to ivf)
+    ANN_MIN_ITEMS: int = 1000  # fewer sections than this are searched exactly (one matrix product is faster)
+    ANN_NPROBE: int = 8  # IVF lists scanned per query
+    ANN_HNSW_EF: int = 64  # HNSW search breadth (higher = better recall, slower)
+    ANN_INDEX_DIR: str = "deck_indexes"  # per-deck section embeddings and index files
+    LIBRARY_MAX_DECKS: int = 200  # most recently used decks searched by /api/library/match
     
     # Filler Words
     FILLER_WORDS_TR: str = "yani,şey,işte,hani,ee,ııı,mmm,aaa"
@@ -26,6 +130,16 @@ class Settings(BaseSettings):
         env_file = ".env"
         case_sensitive = True
     
+    @property
+    def genai_configure_kwargs(self) -> Dict[str, Any]:
+        """Keyword arguments for genai.configure()"""
+        kwargs: Dict[str, Any] = {"api_key": self.GEMINI_API_KEY}
+        if self.GEMINI_API_ENDPOINT:
+            # Custom endpoints (local fakes, proxies) are only reachable over REST
+            kwargs["transport"] = "rest"
+            kwargs["client_options"] = {"api_endpoint": self.GEMINI_API_ENDPOINT}
+        return kwargs
+    
     @property
     def filler_words_list(self) -> List[str]:
         """Combined Turkish and English filler words"""
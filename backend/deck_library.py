@@ -0,0 +1,170 @@
+"""
+Deck Library Module
+
+Finds which of a user's decks a recording belongs to. The user's decks are
+the ones in their session history; each deck's section embeddings come
+from its stored encoding (alignment.encode_outline() with the deck hash),
+or are encoded from the stored outline text when none is stored yet.
+
+All sections are pooled into one index (ANN once the library is large, see
+ann_index.py) and every on-topic transcript segment votes for the deck of
+its closest section. The pooled index is cached per user and rebuilt when
+their set of decks changes.
+
+All functions block; call them through pipeline.run_in_thread() from async
+code.
+"""
+
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List, NamedTuple
+
+import numpy as np
+
+from alignment import encode_outline, encode_texts, load_deck_sections
+from ann_index import VectorIndex, build_index
+from config import settings
+from models import DeckMatch, LibraryMatchResponse, TranscriptData
+from session_store import get_session_store
+from singleflight import TTLCache
+from telemetry import annotate_stage
+
+logger = logging.getLogger(__name__)
+
+_LIBRARY_CACHE_TTL_SEC = 600
+_LIBRARY_CACHE_SIZE = 16
+
+
+class DeckLibrary(NamedTuple):
+    """A user's decks with all their sections in one index"""
+    decks: List[Dict[str, Any]]  # SessionStore.list_decks() entries
+    owners: np.ndarray  # position in `decks` of every indexed section
+    index: VectorIndex
+
+
+def build_library(decks: List[Dict[str, Any]]) -> DeckLibrary:
+    """
+    Pool the sections of several decks into one index
+
+    Decks with neither a stored encoding nor stored outline text are left out.
+
+    Args:
+        decks: SessionStore.list_decks() entries
+
+    Returns:
+        DeckLibrary over the decks that could be loaded
+    """
+    kept, vectors, owners = [], [], []
+    for deck in decks:
+        outline = load_deck_sections(deck["deck_hash"])
+        if outline is None and deck["outline_text"]:
+            outline = encode_outline(deck["outline_text"], deck["deck_hash"])
+        if outline is None or not outline.sections:
+            continue
+        owners.append(np.full(len(outline.sections), len(kept), dtype=np.int64))
+        vectors.append(outline.embeddings)
+        kept.append(deck)
+
+    if not kept:
+        return DeckLibrary([], np.zeros(0, dtype=np.int64), build_index(np.zeros((0, 0))))
+    logger.info(f"Deck library: {len(kept)} decks, {sum(len(o) for o in owners)} sections")
+    return DeckLibrary(kept, np.concatenate(owners), build_index(np.vstack(vectors)))
+
+
+class _LibraryCache:
+    """Per-user DeckLibrary, keyed by the user's set of decks"""
+
+    def __init__(self):
+        self._entries = TTLCache(_LIBRARY_CACHE_TTL_SEC, _LIBRARY_CACHE_SIZE)
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> DeckLibrary:
+        decks = get_session_store().list_decks(user_id, settings.LIBRARY_MAX_DECKS)
+        deck_set = hashlib.sha256("\n".join(sorted(d["deck_hash"] for d in decks)).encode("utf-8")).hexdigest()
+        key = f"{user_id}:{deck_set}"
+        with self._lock:
+            library = self._entries.get(key)
+        if library is None:
+            library = build_library(decks)
+            with self._lock:
+                self._entries.set(key, library)
+        return library
+
+
+_cache = _LibraryCache()
+
+
+def rank_decks(user_id: str, library: DeckLibrary, transcript: TranscriptData, limit: int) -> LibraryMatchResponse:
+    """
+    Rank a library's decks by how many transcript segments they explain
+
+    Args:
+        user_id: Owner of the library
+        library: build_library() result
+        transcript: Transcript of the recording
+        limit: Max decks returned
+
+    Returns:
+        LibraryMatchResponse
+    """
+    texts = [seg.text for seg in transcript.segments]
+    annotate_stage(segment_count=len(texts), deck_count=len(library.decks), section_count=len(library.owners))
+    if not texts or not library.decks:
+        return LibraryMatchResponse(
+            user_id=user_id, deck_count=len(library.decks), segment_count=len(texts), on_topic_segments=0, matches=[]
+        )
+
+    embeddings = encode_texts(texts)
+    idx, scores = library.index.search(embeddings, 1)
+    best = scores[:, 0]
+    on_topic = best >= settings.SIMILARITY_THRESHOLD
+    votes = library.owners[idx[on_topic, 0]]
+
+    n_decks = len(library.decks)
+    hits = np.bincount(votes, minlength=n_decks)
+    similarity = np.bincount(votes, weights=best[on_topic], minlength=n_decks)
+    n_on_topic = int(on_topic.sum())
+
+    matches = [
+        DeckMatch(
+            deck_hash=library.decks[d]["deck_hash"],
+            deck_name=library.decks[d]["deck_name"],
+            match_rate=round(float(hits[d]) / n_on_topic * 100, 1),
+            mean_similarity=round(float(similarity[d] / hits[d]), 3),
+            segment_hits=int(hits[d]),
+            last_used=library.decks[d]["last_used"]
+        )
+        for d in np.flatnonzero(hits)
+    ]
+    matches.sort(key=lambda m: (-m.segment_hits, -m.mean_similarity))
+    matches = matches[:limit]
+
+    return LibraryMatchResponse(
+        user_id=user_id,
+        deck_count=n_decks,
+        segment_count=len(texts),
+        on_topic_segments=n_on_topic,
+        matches=matches,
+        best_deck_hash=matches[0].deck_hash if matches else None
+    )
+
+
+def match_recording(user_id: str, transcript: TranscriptData, limit: int = 5) -> LibraryMatchResponse:
+    """
+    Which of the user's decks a recording belongs to, best first
+
+    Args:
+        user_id: Whose library to search
+        transcript: Transcript of the recording
+        limit: Max decks returned
+
+    Returns:
+        LibraryMatchResponse
+    """
+    response = rank_decks(user_id, _cache.get(user_id), transcript, limit)
+    logger.info(
+        f"Library match for {user_id}: {response.deck_count} decks searched, "
+        f"best {response.best_deck_hash[:12] if response.best_deck_hash else 'none'}"
+    )
+    return response
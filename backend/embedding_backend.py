@@ -0,0 +1,255 @@
+"""
+Sentence Embedding Backends
+
+Every request encodes its outline and transcript segments, so the
+embedding model is on the hot path. Two interchangeable backends are
+selected with EMBEDDING_BACKEND:
+
+- "torch" (default): sentence-transformers on PyTorch
+- "onnx": the same model exported to ONNX with int8 dynamic quantization,
+  run by ONNX Runtime with the Rust `tokenizers` fast tokenizer; no torch
+  import at serving time. Needs onnxruntime and a model exported once with:
+
+      python -m embedding_backend export --out models/onnx-minilm
+
+Both expose SentenceTransformer-style encode(sentences,
+normalize_embeddings=...) returning a float32 array. ONNX vectors agree
+with the torch ones to within quantization error; measure agreement and
+speed on this machine with benchmarks/embedding_compare.py.
+Stored deck encodings are keyed by embedding_model_id(), so switching
+backends re-encodes decks instead of mixing vectors from both.
+"""
+
+import argparse
+import json
+import logging
+import os
+from typing import Any, Dict, List, Union
+
+import numpy as np
+
+from config import EMBEDDING_MODEL, settings
+
+logger = logging.getLogger(__name__)
+
+_CONFIG_FILE = "embedding_config.json"
+_FP32_FILE = "model.onnx"
+_INT8_FILE = "model.int8.onnx"
+
+
+def embedding_model_id() -> str:
+    """Identifies the vectors the configured backend produces"""
+    if settings.EMBEDDING_BACKEND == "onnx":
+        suffix = "onnx-int8" if settings.EMBEDDING_ONNX_QUANTIZED else "onnx"
+        return f"{EMBEDDING_MODEL}:{suffix}"
+    return EMBEDDING_MODEL
+
+
+class OnnxEmbeddingModel:
+    """
+    ONNX Runtime sentence encoder with a SentenceTransformer-like encode()
+
+    Reproduces the sentence-transformers pipeline of the exported model:
+    transformer, then mean (or CLS) pooling, then L2 normalization if the
+    model has a Normalize module.
+    """
+
+    def __init__(self, model_dir: str, quantized: bool = True):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, _CONFIG_FILE), encoding="utf-8") as f:
+            self.config: Dict[str, Any] = json.load(f)
+        if self.config["model"] != EMBEDDING_MODEL:
+            raise RuntimeError(
+                f"ONNX model in {model_dir} was exported from {self.config['model']}, "
+                f"not {EMBEDDING_MODEL}; export it again"
+            )
+
+        if quantized and not self.config["quantized"]:
+            raise RuntimeError(f"No int8 model in {model_dir}; export it without --no-quantize")
+        model_file = _INT8_FILE if quantized else _FP32_FILE
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.config["max_seq_length"])
+        self.tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        normalize_embeddings: bool = False,
+        batch_size: int = 32
+    ) -> np.ndarray:
+        """
+        Encode sentences (same call shape as SentenceTransformer.encode)
+
+        Args:
+            sentences: A sentence or a list of sentences
+            normalize_embeddings: L2-normalize the vectors
+            batch_size: Sentences per ONNX Runtime call
+
+        Returns:
+            (n, dim) float32 array, or (dim,) for a single string
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.zeros((0, self.config["dimension"]), dtype=np.float32)
+
+        # Longest first, so each batch pads to similar lengths
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        out = np.empty((len(texts), self.config["dimension"]), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            batch_idx = order[start:start + batch_size]
+            out[batch_idx] = self._encode_batch([texts[i] for i in batch_idx])
+
+        if normalize_embeddings or self.config["normalize"]:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out[0] if single else out
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": mask,
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+
+        if self.config["pooling"] == "cls":
+            return hidden[:, 0]
+        weights = mask[:, :, None].astype(np.float32)
+        return (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+
+
+def load_embedding_model(backend: str) -> Any:
+    """
+    Load the sentence embedding model for a backend
+
+    Args:
+        backend: "torch" or "onnx"
+
+    Returns:
+        Object with SentenceTransformer-style encode()
+
+    Raises:
+        RuntimeError: If the ONNX backend is selected but not usable
+    """
+    if backend == "onnx":
+        model_dir = settings.EMBEDDING_ONNX_DIR
+        if not os.path.exists(os.path.join(model_dir, _CONFIG_FILE)):
+            raise RuntimeError(
+                f"No exported ONNX model in {model_dir}; "
+                f"run: python -m embedding_backend export --out {model_dir}"
+            )
+        try:
+            return OnnxEmbeddingModel(model_dir, quantized=settings.EMBEDDING_ONNX_QUANTIZED)
+        except ImportError as e:
+            raise RuntimeError(f"EMBEDDING_BACKEND=onnx needs onnxruntime and tokenizers: {e}")
+
+    if backend != "torch":
+        raise RuntimeError(f"Unknown EMBEDDING_BACKEND: {backend}")
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL)
+
+
+def export_onnx(out_dir: str, quantize: bool = True, opset: int = 14) -> str:
+    """
+    Export EMBEDDING_MODEL to ONNX (and an int8 dynamically quantized copy)
+
+    Needs torch, sentence-transformers, onnx and onnxruntime; only the
+    exported files are needed at serving time.
+
+    Args:
+        out_dir: Directory to write model.onnx, model.int8.onnx, the
+            tokenizer and embedding_config.json to
+        quantize: Also write the int8 model
+        opset: ONNX opset version
+
+    Returns:
+        out_dir
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    os.makedirs(out_dir, exist_ok=True)
+    st_model = SentenceTransformer(EMBEDDING_MODEL, device="cpu")
+    transformer = st_model[0]
+    tokenizer = transformer.tokenizer
+    pooling = next((m for m in st_model if isinstance(m, Pooling)), None)
+
+    class _Encoder(torch.nn.Module):
+        """Transformer returning only the token embeddings"""
+
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(
+                input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids
+            )[0]
+
+    dummy = tokenizer(["an example sentence"], return_tensors="pt", return_token_type_ids=True)
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    fp32_path = os.path.join(out_dir, _FP32_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            _Encoder(transformer.auto_model.eval()),
+            tuple(dummy[n] for n in names),
+            fp32_path,
+            input_names=names,
+            output_names=["token_embeddings"],
+            dynamic_axes={n: {0: "batch", 1: "sequence"} for n in names + ["token_embeddings"]},
+            opset_version=opset
+        )
+    logger.info(f"Exported {EMBEDDING_MODEL} to {fp32_path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, os.path.join(out_dir, _INT8_FILE), weight_type=QuantType.QInt8)
+        logger.info(f"Wrote int8 model to {os.path.join(out_dir, _INT8_FILE)}")
+
+    # Writes tokenizer.json (the fast tokenizer) among others
+    tokenizer.save_pretrained(out_dir)
+    config = {
+        "model": EMBEDDING_MODEL,
+        "max_seq_length": st_model.max_seq_length,
+        "dimension": st_model.get_sentence_embedding_dimension(),
+        "pooling": "cls" if pooling is not None and pooling.pooling_mode_cls_token else "mean",
+        "normalize": any(isinstance(m, Normalize) for m in st_model),
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+        "quantized": quantize,
+    }
+    with open(os.path.join(out_dir, _CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    return out_dir
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sentence embedding backend tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help=f"Export {EMBEDDING_MODEL} to ONNX")
+    export.add_argument("--out", default=settings.EMBEDDING_ONNX_DIR, help="Output directory")
+    export.add_argument("--no-quantize", action="store_true", help="Skip the int8 model")
+    export.add_argument("--opset", type=int, default=14)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    if args.command == "export":
+        print(export_onnx(args.out, quantize=not args.no_quantize, opset=args.opset))
+
+
+if __name__ == "__main__":
+    main()
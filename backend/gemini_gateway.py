@@ -0,0 +1,632 @@
+"""
+Gemini Gateway Module
+
+Single entry point for all Gemini traffic. Every call goes through:
+
+- a client-side token bucket sized from our quota (GEMINI_RPM / GEMINI_BURST),
+  shared by all workers on the node through a lock file, so the fleet stays
+  under quota instead of discovering it through 429s
+- a concurrency cap (GEMINI_MAX_CONCURRENCY) on calls in flight
+- a bound on local queueing (LLM_QUEUE_TIMEOUT_SEC per attempt for a token
+  and a free slot); a call that waits longer fails with GeminiThrottled
+- async retries with jittered exponential backoff that honour the server's
+  retry delay; a 429 also pauses the shared bucket for every worker
+- a per-call deadline covering the dispatched requests and the backoff
+  between retries (time spent queueing locally does not count)
+- optional hedging: when an attempt is slower than the caller's recent
+  LLM_HEDGE_PERCENTILE latency, a duplicate request is sent and the first
+  answer wins; hedges are capped at LLM_HEDGE_MAX_RATIO of primary calls
+- a circuit breaker: after repeated upstream errors or slow answers (timed
+  from dispatch; local throttling does not count), calls fail fast with
+  CircuitOpenError so callers can use their local fallback
+
+The blocking SDK call runs on a small dedicated thread pool, so waiting
+(for tokens, backoff or the network) never blocks the event loop.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+import google.generativeai as genai
+from google.api_core import exceptions
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from config import settings
+from telemetry import GEMINI_DEADLINE_EXCEEDED, GEMINI_HEDGES, GEMINI_RETRIES, record_gemini_call
+
+try:
+    import fcntl  # POSIX only; Windows falls back to a per-process bucket
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying (transient server-side or rate limiting)
+RETRYABLE_ERRORS = (
+    exceptions.ResourceExhausted,
+    exceptions.ServiceUnavailable,
+    exceptions.InternalServerError,
+    exceptions.DeadlineExceeded,
+    exceptions.TooManyRequests,
+)
+
+_RETRY_IN_RE = re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE)
+
+
+class GeminiResponseError(ValueError):
+    """Raised when the model answers with something the caller cannot parse"""
+
+
+class GeminiDeadlineExceeded(RuntimeError):
+    """Raised when no answer arrived within the call's deadline"""
+
+
+class GeminiThrottled(RuntimeError):
+    """Raised when a call waited too long locally for a rate-limit token or a free slot"""
+
+
+# Singleton Gemini model
+_gemini_model = None
+_model_lock = threading.Lock()
+
+
+def get_gemini_model():
+    """Initialize and return Gemini model (singleton pattern)"""
+    global _gemini_model
+    if _gemini_model is None:
+        with _model_lock:
+            if _gemini_model is None:
+                genai.configure(**settings.genai_configure_kwargs)
+                _gemini_model = genai.GenerativeModel(settings.GEMINI_MODEL)
+                logger.info(f"Gemini model initialized: {settings.GEMINI_MODEL}")
+    return _gemini_model
+
+
+def clean_json_text(text: str) -> str:
+    """Strip markdown code fences the model sometimes wraps JSON in"""
+    text = text.strip()
+    if text.startswith("```"):
+        lines = text.splitlines()
+        if lines[0].strip().startswith("```"):
+            lines = lines[1:]
+        if lines and lines[-1].strip() == "```":
+            lines = lines[:-1]
+        text = "\n".join(lines).strip()
+    return text
+
+
+def parse_json_response(text: str) -> Any:
+    """Parse a model answer as JSON (raises GeminiResponseError if malformed)"""
+    try:
+        return json.loads(clean_json_text(text))
+    except json.JSONDecodeError as e:
+        raise GeminiResponseError(f"LLM returned invalid JSON format: {e}")
+
+
+def retry_delay_from_error(error: Exception) -> Optional[float]:
+    """
+    Extract the server-advised retry delay (seconds) from an API error
+
+    Looks at RetryInfo details (gRPC), a Retry-After header (REST) and the
+    "Please retry in Ns" hint in the message, in that order.
+    """
+    for detail in getattr(error, "details", None) or []:
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None:
+            seconds = getattr(delay, "seconds", 0) + getattr(delay, "nanos", 0) / 1e9
+            if seconds > 0:
+                return seconds
+
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        value = headers.get("Retry-After") or headers.get("retry-after")
+        try:
+            if value:
+                return float(value)
+        except ValueError:
+            pass
+
+    match = _RETRY_IN_RE.search(str(error))
+    if match:
+        return float(match.group(1))
+    return None
+
+
+# ============================================================================
+# TOKEN BUCKET
+# ============================================================================
+
+def _take_token(state: Dict[str, float], now: float, rate: float, capacity: float) -> float:
+    """
+    Refill and try to take one token from a bucket state dict (in place)
+
+    Returns:
+        0.0 if a token was taken, otherwise seconds until one is available
+    """
+    blocked_until = state.get("blocked_until", 0.0)
+    if now < blocked_until:
+        return blocked_until - now
+
+    tokens = state.get("tokens", capacity)
+    updated = state.get("updated", now)
+    tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+    state["updated"] = now
+
+    if tokens >= 1.0:
+        state["tokens"] = tokens - 1.0
+        return 0.0
+    state["tokens"] = tokens
+    return (1.0 - tokens) / rate
+
+
+class TokenBucket:
+    """
+    Token bucket for Gemini requests
+
+    With a state file the bucket is shared by every process on the node
+    (guarded by flock); otherwise it is local to this process. The state
+    file is read and written on a dedicated thread, so waiting for another
+    worker's lock never blocks the event loop.
+    """
+
+    def __init__(self, rate_per_sec: float, capacity: float, state_file: Optional[str] = None):
+        self.rate = rate_per_sec
+        self.capacity = capacity
+        self.state_file = state_file if fcntl is not None else None
+        self._state: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._io: Optional[ThreadPoolExecutor] = None
+        if self.state_file is not None:
+            # One thread: updates are serialized by the locks anyway
+            self._io = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gemini-bucket")
+
+    def _with_state(self, update: Callable[[Dict[str, float]], float]) -> float:
+        if self.state_file is None:
+            with self._lock:
+                return update(self._state)
+
+        with self._lock, open(self.state_file, "a+", encoding="utf-8") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                try:
+                    state = json.loads(raw) if raw else {}
+                except json.JSONDecodeError:
+                    state = {}
+                result = update(state)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+                return result
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    async def _update(self, update: Callable[[Dict[str, float]], float]) -> float:
+        if self._io is None:
+            return self._with_state(update)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._io, self._with_state, update)
+
+    async def try_acquire(self) -> float:
+        """Take a token if possible; returns seconds to wait otherwise"""
+        return await self._update(lambda s: _take_token(s, time.time(), self.rate, self.capacity))
+
+    async def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for `seconds` (e.g. after a 429)"""
+        until = time.time() + seconds
+
+        def update(state: Dict[str, float]) -> float:
+            state["blocked_until"] = max(state.get("blocked_until", 0.0), until)
+            return 0.0
+
+        await self._update(update)
+
+    async def acquire(self) -> None:
+        """Wait (asynchronously) until a token is available"""
+        while True:
+            wait = await self.try_acquire()
+            if wait <= 0:
+                return
+            # Small jitter so waiting workers do not wake in lockstep
+            await asyncio.sleep(wait + random.uniform(0, 0.05))
+
+
+# ============================================================================
+# HEDGING
+# ============================================================================
+
+class LatencyTracker:
+    """Rolling window of successful call latencies, per caller"""
+
+    def __init__(self, window: int, min_samples: int):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, caller: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.get(caller)
+            if samples is None:
+                samples = self._samples[caller] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, caller: str, q: float) -> Optional[float]:
+        """q-th percentile (0-100) of recent latencies, None until enough samples"""
+        with self._lock:
+            samples = sorted(self._samples.get(caller, ()))
+        if len(samples) < self.min_samples:
+            return None
+        index = min(len(samples) - 1, int(round(q / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+
+class HedgeBudget:
+    """
+    Caps hedged requests at a fraction of primary requests
+
+    Every primary call earns `ratio` credit (up to `burst`); a hedge costs one.
+    """
+
+    def __init__(self, ratio: float, burst: float = 5.0):
+        self.ratio = ratio
+        self.burst = burst
+        self._credit = 0.0
+        self._lock = threading.Lock()
+
+    def on_primary(self) -> None:
+        with self._lock:
+            self._credit = min(self.burst, self._credit + self.ratio)
+
+    def available(self) -> bool:
+        with self._lock:
+            return self._credit >= 1.0
+
+    def spend(self) -> None:
+        with self._lock:
+            self._credit -= 1.0
+
+
+# ============================================================================
+# GATEWAY
+# ============================================================================
+
+class GeminiGateway:
+    """Rate-limited, retrying access to the Gemini model"""
+
+    def __init__(self):
+        state_file = None
+        if settings.GEMINI_RATE_LIMIT_SHARED:
+            state_file = settings.GEMINI_RATE_LIMIT_FILE or os.path.join(
+                tempfile.gettempdir(), "confidencemirror_gemini_bucket.json"
+            )
+        self.bucket = TokenBucket(
+            rate_per_sec=settings.GEMINI_RPM / 60.0,
+            capacity=float(settings.GEMINI_BURST),
+            state_file=state_file,
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.GEMINI_MAX_CONCURRENCY,
+            thread_name_prefix="gemini",
+        )
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop = None
+        self.latency = LatencyTracker(settings.LLM_LATENCY_WINDOW, settings.LLM_HEDGE_MIN_SAMPLES)
+        self.hedge_budget = HedgeBudget(settings.LLM_HEDGE_MAX_RATIO)
+        self.breaker = CircuitBreaker(
+            "gemini",
+            failure_threshold=settings.LLM_BREAKER_FAILURE_THRESHOLD,
+            slow_call_sec=settings.LLM_BREAKER_SLOW_CALL_SEC,
+            open_seconds=settings.LLM_BREAKER_OPEN_SEC,
+            half_open_probes=settings.LLM_BREAKER_HALF_OPEN_PROBES,
+        )
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # Semaphores bind to one event loop; the CLI may run several in turn
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(settings.GEMINI_MAX_CONCURRENCY)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def _call(self, prompt: str, generation_config: Dict[str, Any]) -> str:
+        model = get_gemini_model()
+        loop = asyncio.get_running_loop()
+
+        def call() -> str:
+            response = model.generate_content(
+                prompt,
+                generation_config=genai.types.GenerationConfig(**generation_config),
+            )
+            return response.text
+
+        return await loop.run_in_executor(self.executor, call)
+
+    async def _call_once(
+        self,
+        prompt: str,
+        generation_config: Dict[str, Any],
+        caller: str,
+        parse: Optional[Callable[[str], Any]]
+    ) -> Any:
+        """A single request (primary or hedge), counted in metrics"""
+        try:
+            started = time.perf_counter()
+            text = await self._call(prompt, generation_config)
+            self.latency.observe(caller, time.perf_counter() - started)
+            result = parse(text) if parse else text
+        except (exceptions.ResourceExhausted, exceptions.TooManyRequests):
+            record_gemini_call(caller, "rate_limited")
+            raise
+        except Exception:
+            record_gemini_call(caller, "error")
+            raise
+        record_gemini_call(caller, "ok")
+        return result
+
+    def _hedge_delay(self, caller: str) -> Optional[float]:
+        if not settings.LLM_HEDGE_ENABLED:
+            return None
+        p = self.latency.percentile(caller, settings.LLM_HEDGE_PERCENTILE)
+        if p is None:
+            return None
+        return max(settings.LLM_HEDGE_MIN_DELAY, p)
+
+    async def _admit(self, caller: str) -> asyncio.Semaphore:
+        """
+        Wait for a free slot and a rate-limit token
+
+        Returns:
+            The semaphore, acquired; the caller must release it
+
+        Raises:
+            GeminiThrottled: If both were not available within LLM_QUEUE_TIMEOUT_SEC
+        """
+        semaphore = self._get_semaphore()
+
+        async def queue() -> None:
+            await semaphore.acquire()
+            try:
+                await self.bucket.acquire()
+            except BaseException:
+                semaphore.release()
+                raise
+
+        timeout = settings.LLM_QUEUE_TIMEOUT_SEC
+        try:
+            await asyncio.wait_for(queue(), timeout if timeout > 0 else None)
+        except asyncio.TimeoutError:
+            record_gemini_call(caller, "throttled")
+            logger.warning(f"[{caller}] No Gemini slot or rate-limit token within {timeout:.1f}s")
+            raise GeminiThrottled(f"Gemini calls are queued locally for more than {timeout:.1f}s") from None
+        return semaphore
+
+    def _dispatch(
+        self,
+        semaphore: asyncio.Semaphore,
+        prompt: str,
+        generation_config: Dict[str, Any],
+        caller: str,
+        parse: Optional[Callable[[str], Any]]
+    ) -> asyncio.Future:
+        """Start a request holding an acquired slot; the slot is freed when it ends"""
+        task = asyncio.ensure_future(self._call_once(prompt, generation_config, caller, parse))
+        task.add_done_callback(lambda _: semaphore.release())
+        return task
+
+    async def _attempt(
+        self,
+        prompt: str,
+        generation_config: Dict[str, Any],
+        caller: str,
+        parse: Optional[Callable[[str], Any]],
+        semaphore: asyncio.Semaphore,
+        timeout: Optional[float]
+    ) -> Any:
+        """
+        One attempt, hedged if the primary is slower than usual
+
+        Takes over a slot acquired with _admit(). Returns the first
+        successful answer; if every request in flight fails, the last error
+        is raised, and asyncio.TimeoutError if none answered within
+        `timeout` seconds. The losing request is cancelled (its worker
+        thread finishes in the background, result discarded).
+        """
+        loop = asyncio.get_running_loop()
+        give_up_at = None if timeout is None else loop.time() + timeout
+
+        def time_left(limit: Optional[float] = None) -> Optional[float]:
+            left = None if give_up_at is None else max(0.0, give_up_at - loop.time())
+            if limit is None or left is None:
+                return limit if left is None else left
+            return min(limit, left)
+
+        self.hedge_budget.on_primary()
+        primary = self._dispatch(semaphore, prompt, generation_config, caller, parse)
+        pending = {primary}
+
+        try:
+            delay = self._hedge_delay(caller)
+            if delay is not None:
+                done, _ = await asyncio.wait(pending, timeout=time_left(delay))
+                # A hedge needs budget, a free slot and a rate-limit token
+                # right now; it never waits for any of them
+                if (not done and self.hedge_budget.available() and not semaphore.locked()
+                        and await self.bucket.try_acquire() <= 0 and not semaphore.locked()):
+                    await semaphore.acquire()
+                    self.hedge_budget.spend()
+                    GEMINI_HEDGES.inc(caller=caller, outcome="issued")
+                    logger.info(f"[{caller}] Call slower than {delay:.2f}s, sending hedge request")
+                    pending.add(self._dispatch(semaphore, prompt, generation_config, caller, parse))
+
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=time_left(), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise asyncio.TimeoutError()
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            GEMINI_HEDGES.inc(caller=caller, outcome="won")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def generate(
+        self,
+        prompt: str,
+        generation_config: Dict[str, Any],
+        caller: str,
+        parse: Optional[Callable[[str], Any]] = None,
+        deadline: Optional[float] = None
+    ) -> Any:
+        """
+        Call Gemini with rate limiting, retries, a deadline and optional hedging
+
+        Args:
+            prompt: Prompt text
+            generation_config: Keyword arguments for genai.types.GenerationConfig
+            caller: Label for metrics/logs (e.g. "feedback")
+            parse: Optional parser for the response text; a GeminiResponseError
+                from it is retried like a transient error
+            deadline: Seconds allowed for the dispatched requests and the
+                backoff between them, not counting local queueing
+                (default LLM_DEADLINE_SEC, 0 = no deadline)
+
+        Returns:
+            Parsed response (or the raw text if no parser is given)
+
+        Raises:
+            CircuitOpenError: If the circuit breaker is open (no call is made)
+            GeminiThrottled: If an attempt waited longer than LLM_QUEUE_TIMEOUT_SEC
+                for a rate-limit token or a free slot
+            GeminiDeadlineExceeded: If the deadline passes first
+            The last error once GEMINI_MAX_RETRIES retries are used up
+        """
+        if not self.breaker.allow():
+            record_gemini_call(caller, "circuit_open")
+            raise CircuitOpenError(f"Gemini circuit is open; skipping {caller} call")
+
+        try:
+            result, latency = await self._generate_with_retries(prompt, generation_config, caller, parse, deadline)
+        except (asyncio.CancelledError, GeminiThrottled):
+            # No upstream outcome: cancelled, or held back by our own limits
+            self.breaker.release()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success(latency)
+        return result
+
+    async def _generate_with_retries(
+        self,
+        prompt: str,
+        generation_config: Dict[str, Any],
+        caller: str,
+        parse: Optional[Callable[[str], Any]],
+        deadline: Optional[float]
+    ) -> Tuple[Any, float]:
+        """Returns the answer and the seconds from dispatch to answer of the winning attempt"""
+        max_attempts = settings.GEMINI_MAX_RETRIES + 1
+        deadline = settings.LLM_DEADLINE_SEC if deadline is None else deadline
+        loop = asyncio.get_running_loop()
+        remaining = deadline if deadline > 0 else None
+
+        def deadline_exceeded() -> GeminiDeadlineExceeded:
+            GEMINI_DEADLINE_EXCEEDED.inc(caller=caller)
+            logger.warning(f"[{caller}] Gemini call exceeded its {deadline:.1f}s deadline")
+            return GeminiDeadlineExceeded(f"No answer from Gemini within {deadline:.1f}s")
+
+        for attempt in range(max_attempts):
+            # The deadline clock only runs once the request is dispatched
+            semaphore = await self._admit(caller)
+            dispatched = loop.time()
+            try:
+                result = await self._attempt(prompt, generation_config, caller, parse, semaphore, remaining)
+                return result, loop.time() - dispatched
+
+            except asyncio.TimeoutError:
+                raise deadline_exceeded() from None
+
+            except RETRYABLE_ERRORS + (GeminiResponseError,) as e:
+                if remaining is not None:
+                    remaining -= loop.time() - dispatched
+                if attempt == max_attempts - 1:
+                    logger.error(f"[{caller}] Gemini call failed after {max_attempts} attempts: {e}")
+                    raise
+
+                rate_limited = isinstance(e, (exceptions.ResourceExhausted, exceptions.TooManyRequests))
+
+                # Full jitter exponential backoff, never shorter than the
+                # delay the server asked for
+                backoff = min(settings.GEMINI_BACKOFF_MAX, settings.GEMINI_BACKOFF_BASE * (2 ** attempt))
+                wait = random.uniform(backoff / 2, backoff)
+                server_delay = retry_delay_from_error(e) if rate_limited else None
+                if server_delay is not None:
+                    wait = max(wait, server_delay)
+                if rate_limited:
+                    # Quota is per project: pause every worker, not just this call
+                    await self.bucket.pause(server_delay if server_delay is not None else wait)
+
+                if remaining is not None:
+                    if wait >= remaining:
+                        raise deadline_exceeded() from e
+                    remaining -= wait
+
+                GEMINI_RETRIES.inc(caller=caller)
+                logger.warning(
+                    f"[{caller}] {type(e).__name__}; retrying in {wait:.1f}s "
+                    f"(attempt {attempt + 1}/{max_attempts})"
+                )
+                await asyncio.sleep(wait)
+
+
+_gateway: Optional[GeminiGateway] = None
+
+
+def get_gateway() -> GeminiGateway:
+    """Get or create the process-wide gateway (singleton pattern)"""
+    global _gateway
+    if _gateway is None:
+        _gateway = GeminiGateway()
+    return _gateway
+
+
+async def generate_json(
+    prompt: str,
+    caller: str,
+    temperature: float,
+    max_output_tokens: int,
+    deadline: Optional[float] = None
+) -> Any:
+    """Request a JSON answer and return it parsed (see GeminiGateway.generate)"""
+    return await get_gateway().generate(
+        prompt,
+        {
+            "temperature": temperature,
+            "max_output_tokens": max_output_tokens,
+            "response_mime_type": "application/json",
+        },
+        caller=caller,
+        parse=parse_json_response,
+        deadline=deadline,
+    )
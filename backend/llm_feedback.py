@@ -1,10 +1,6 @@
-import google.generativeai as genai
 from models import Feedback, FeedbackTip
-import json
 import logging
-import time
-from typing import Dict, Any
-from google.api_core import exceptions
+from typing import Tuple
 from models import (
     TranscriptData, 
     SpeechMetrics, 
@@ -12,23 +8,12 @@ from models import (
     Feedback, 
     FeedbackTip
 )
-from config import settings
+from gemini_gateway import generate_json, GeminiResponseError
+from metrics import analyze_speaking_pace
+from telemetry import annotate_stage, LLM_FALLBACKS
 
 logger = logging.getLogger(__name__)
 
-# Global Gemini model instance
-_gemini_model = None
-
-
-def get_gemini_model():
-    """Initialize and return Gemini model (singleton pattern)"""
-    global _gemini_model
-    if _gemini_model is None:
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        _gemini_model = genai.GenerativeModel(settings.GEMINI_MODEL)
-        logger.info(f"Gemini model initialized: {settings.GEMINI_MODEL}")
-    return _gemini_model
-
 
 def detect_language(outline_text: str, transcript_text: str) -> str:
     """
@@ -170,7 +155,7 @@ RULES:
     return prompt
 
 
-def generate_feedback(
+async def generate_feedback(
     outline_text: str,
     transcript: TranscriptData,
     metrics: SpeechMetrics,
@@ -205,55 +190,16 @@ def generate_feedback(
             language
         )
         
+        annotate_stage(prompt_chars=len(prompt))
         logger.info("Generating feedback with Gemini API...")
         
-        # Call Gemini API with retry logic
-        model = get_gemini_model()
-        
-        max_retries = 3
-        retry_delay = 5  # Start with 5 seconds
-        
-        response = None
-        for attempt in range(max_retries):
-            try:
-                response = model.generate_content(
-                    prompt,
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=0.3,
-                        max_output_tokens=8192,
-                        response_mime_type="application/json",
-                    )
-                )
-                break  # Success, exit loop
-                
-            except exceptions.ResourceExhausted as e:
-                if attempt < max_retries - 1:
-                    wait_time = retry_delay * (2 ** attempt)  # 5, 10, 20 seconds
-                    logger.warning(f"Quota exceeded (429). Retrying in {wait_time}s... (Attempt {attempt + 1}/{max_retries})")
-                    time.sleep(wait_time)
-                else:
-                    logger.error("Max retries exceeded for Gemini API.")
-                    raise e
-                    
-        if not response:
-            raise RuntimeError("Failed to get response from Gemini API after retries")
-        
-        # Extract response text
-        response_text = response.text.strip()
-        
-        # Clean markdown code blocks if present
-        if response_text.startswith("```"):
-            lines = response_text.splitlines()
-            # Remove first line if it starts with ```
-            if lines[0].strip().startswith("```"):
-                lines = lines[1:]
-            # Remove last line if it matches ```
-            if lines and lines[-1].strip() == "```":
-                lines = lines[:-1]
-            response_text = "\n".join(lines).strip()
-            
-        # Parse JSON
-        feedback_data = json.loads(response_text)
+        # Call Gemini API (rate limited, retried with async backoff)
+        feedback_data = await generate_json(
+            prompt,
+            caller="feedback",
+            temperature=0.3,
+            max_output_tokens=8192
+        )
         
         # Validate structure
         if not all(key in feedback_data for key in ['strengths', 'improvements', 'tips']):
@@ -281,11 +227,147 @@ def generate_feedback(
         logger.info("Feedback generated successfully")
         return feedback
         
-    except json.JSONDecodeError as e:
+    except GeminiResponseError as e:
         logger.error(f"Failed to parse LLM response as JSON: {e}")
-        logger.error(f"Response was: {response_text}")
         raise RuntimeError("LLM returned invalid JSON format")
     
     except Exception as e:
         logger.error(f"Feedback generation failed: {str(e)}")
-        raise RuntimeError(f"Failed to generate feedback: {str(e)}")
\ No newline at end of file
+        raise RuntimeError(f"Failed to generate feedback: {str(e)}")
+
+
+def build_template_feedback(
+    metrics: SpeechMetrics,
+    alignment: AlignmentResult,
+    language: str = 'en'
+) -> Feedback:
+    """
+    Build feedback from the metrics and alignment alone (no LLM)
+    
+    Used when the LLM is unavailable, so the user still gets honest,
+    data-backed feedback instead of an error.
+    
+    Args:
+        metrics: Speech metrics
+        alignment: Alignment results
+        language: Target language ('tr' or 'en')
+        
+    Returns:
+        Feedback object
+    """
+    tr = language == 'tr'
+    pace = analyze_speaking_pace(metrics.wpm)
+    filler_rate = (metrics.filler_count / metrics.word_count * 100) if metrics.word_count else 0.0
+    total = len(alignment.items)
+    off_topic = len(alignment.off_topic_segments)
+    on_topic_rate = ((total - off_topic) / total * 100) if total else 0.0
+    
+    strengths = []
+    improvements = []
+    tips = []
+    
+    if pace == "dengeli":
+        strengths.append(
+            f"Konuşma hızınız ({metrics.wpm:.0f} kelime/dk) dengeli aralıkta (120-160)." if tr
+            else f"Your pace ({metrics.wpm:.0f} words/min) is in the comfortable 120-160 range."
+        )
+    else:
+        slow = pace == "yavaş"
+        improvements.append(
+            f"Konuşma hızınız {metrics.wpm:.0f} kelime/dk; 120-160 aralığını hedefleyin." if tr
+            else f"Your pace is {metrics.wpm:.0f} words/min; aim for 120-160."
+        )
+        tips.append(FeedbackTip(
+            section="Hız" if tr else "Pace",
+            tip=(
+                ("Gereksiz duraklamaları kısaltın ve cümleleri birbirine bağlayın." if slow
+                 else "Önemli noktalardan sonra kısa bir duraklama yapın.") if tr
+                else ("Shorten long pauses and link sentences together." if slow
+                      else "Pause briefly after each key point.")
+            )
+        ))
+    
+    if filler_rate < 2:
+        strengths.append(
+            f"Az dolgu kelimesi kullandınız ({metrics.filler_count} / {metrics.word_count} kelime)." if tr
+            else f"You used few filler words ({metrics.filler_count} in {metrics.word_count} words)."
+        )
+    else:
+        top = metrics.filler_words[0] if metrics.filler_words else None
+        detail = f" ('{top.word}' {top.count}x)" if top else ""
+        improvements.append(
+            f"Dolgu kelimelerini azaltın: {metrics.filler_count} adet{detail}." if tr
+            else f"Reduce filler words: {metrics.filler_count} total{detail}."
+        )
+        tips.append(FeedbackTip(
+            section="Genel" if tr else "General",
+            tip="Dolgu kelimesi yerine sessizce duraklayın." if tr
+            else "Replace filler words with a silent pause."
+        ))
+    
+    if total and on_topic_rate >= 70:
+        strengths.append(
+            f"Konuşmanızın %{on_topic_rate:.0f}'i sunum planıyla uyumlu." if tr
+            else f"{on_topic_rate:.0f}% of your speech stayed on the outline's topics."
+        )
+    elif off_topic:
+        improvements.append(
+            f"{off_topic} bölüm sunum planından uzaklaştı; her noktayı bir başlığa bağlayın." if tr
+            else f"{off_topic} segments drifted from the outline; tie each point back to a section."
+        )
+        first = alignment.off_topic_segments[0]
+        tips.append(FeedbackTip(
+            section=first.best_match,
+            tip=f"Segment {first.segment_idx + 1}: bu başlıkla ilişkisini açıkça söyleyin." if tr
+            else f"Segment {first.segment_idx + 1}: say explicitly how it relates to this section."
+        ))
+    
+    if not strengths:
+        strengths.append(
+            f"Tam bir prova kaydı tamamladınız ({metrics.duration_sec:.0f} sn)." if tr
+            else f"You completed a full practice run ({metrics.duration_sec:.0f}s)."
+        )
+    if not improvements:
+        improvements.append(
+            "Aynı akışı koruyarak bir prova daha yapın ve ana mesajları vurgulayın." if tr
+            else "Run the talk once more, keeping this flow and stressing the key messages."
+        )
+    if not tips:
+        tips.append(FeedbackTip(
+            section="Genel" if tr else "General",
+            tip="Girişte sunumun ana mesajını tek cümleyle söyleyin." if tr
+            else "State your main message in one sentence in the introduction."
+        ))
+    
+    return Feedback(
+        strengths=strengths[:3],
+        improvements=improvements[:3],
+        tips=tips[:3],
+        ethical_note=(
+            "Bu bir sunum geri bildirim aracıdır. Psikolojik değerlendirme değildir."
+            if tr
+            else "This is a presentation feedback tool. Not a psychological evaluation."
+        )
+    )
+
+
+async def generate_feedback_or_template(
+    outline_text: str,
+    transcript: TranscriptData,
+    metrics: SpeechMetrics,
+    alignment: AlignmentResult
+) -> Tuple[Feedback, bool]:
+    """
+    Generate feedback with the LLM, falling back to the template path
+    
+    Returns:
+        (feedback, True if the template fallback was used)
+    """
+    try:
+        return await generate_feedback(outline_text, transcript, metrics, alignment), False
+    except RuntimeError as e:
+        logger.warning(f"LLM feedback unavailable, using template feedback: {e}")
+        LLM_FALLBACKS.inc(stage="feedback_llm")
+        annotate_stage(fallback="template")
+        language = detect_language(outline_text, transcript.text)
+        return build_template_feedback(metrics, alignment, language), True
@@ -1,23 +1,38 @@
-from fastapi import FastAPI, UploadFile, Form, HTTPException, File
+from fastapi import FastAPI, UploadFile, Form, HTTPException, File, Header, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import tempfile
+from fastapi.responses import JSONResponse, PlainTextResponse
+import asyncio
+import hashlib
 import os
 import logging
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
-from models import AnalysisResponse, SlideBySlideAlignment, SlideAlignmentDetail
+from models import AnalysisResponse, SlideBySlideAlignment, TranscriptData
+from models import CohortAnalysisResponse, CohortRecordingResult, CohortSlideSummary, CohortSummary
+from models import LibraryMatchResponse, ProgressReport, SessionList
 from config import settings
-from audio_utils import convert_webm_to_wav, cleanup_temp_file, get_audio_duration
+from audio_utils import convert_webm_to_wav, probe_audio_duration_ms, AudioProbeError
+from upload_utils import UploadTooLargeError, RequestSizeLimitMiddleware
+from scratch import ScratchBudgetExceeded, ScratchSpace
+from telemetry import stage, annotate_stage, registry as metrics_registry, TelemetryMiddleware
+from profiling import ProfilingMiddleware
+from resource_policy import configure_process
 from stt import transcribe_audio
-from metrics import calculate_metrics
-from alignment import align_transcript_to_outline
-from llm_feedback import generate_feedback, detect_language
+from metrics import calculate_metrics, update_metrics
+from alignment import align_transcript_to_outline, encode_outline, realign_window, OutlineEmbeddings
+from llm_feedback import generate_feedback_or_template, detect_language
 
 # NEW IMPORTS for slide-by-slide alignment
 from pptx_parser import extract_slides_structured
-from slide_alignment import analyze_slide_by_slide_alignment
-from talking_points import generate_talking_points_batch
+from slide_alignment import analyze_slide_by_slide_alignment, check_limiter, split_transcript_into_blocks
+from talking_points import generate_talking_points_batch, build_slide_alignment
+from timeline import build_slide_timeline
+from pipeline import PipelineGraph, run_pipeline, run_in_thread
+from singleflight import get_coalescer, content_key, AsyncMemo
+from worker_pool import SttPoolUnavailable, transcribe_in_pool, shutdown_stt_pool
+from session_store import get_session_store
+from splice import TranscriptSplice, seed_slide_memo, splice_transcript
+from deck_library import match_recording
 
 # Configure logging
 logging.basicConfig(
@@ -42,6 +57,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Opt-in per-request CPU/memory profiling (not installed unless enabled)
+if settings.PROFILE_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+# Per-stage latency metrics and Server-Timing header
+app.add_middleware(TelemetryMiddleware)
+
+# Reject oversize request bodies with 413 before they are fully received
+app.add_middleware(
+    RequestSizeLimitMiddleware,
+    default_limit=settings.MAX_REQUEST_SIZE * 1024 * 1024,
+    path_limits={"/api/analyze-cohort": settings.MAX_COHORT_REQUEST_SIZE * 1024 * 1024}
+)
+
 
 @app.get("/")
 async def root():
@@ -53,7 +82,11 @@ async def root():
         "endpoints": {
             "health": "/health",
             "analyze": "/analyze (POST)",
-            "analyze_pro": "/analyze-pro (POST) - with slide-by-slide alignment"
+            "analyze_pro": "/analyze-pro (POST) - with slide-by-slide alignment",
+            "analyze_cohort": "/analyze-cohort (POST) - many recordings against one deck",
+            "sessions": "/sessions, /sessions/{id}, /sessions/progress - stored practice runs",
+            "splice": "/sessions/{id}/splice (POST) - replace a time range with a re-recorded clip",
+            "metrics": "/metrics"
         }
     }
 
@@ -76,54 +109,289 @@ async def health_check():
 
 from file_utils import extract_text_from_pptx, extract_text_from_pdf
 
+
+# ============================================================================
+# SHARED PIPELINE STAGES
+# ============================================================================
+
+def check_audio_duration(audio_path: str) -> float:
+    """Probe the recording's duration and reject it if too long (seconds)"""
+    # Container metadata first, decode only as fallback
+    try:
+        duration_ms = probe_audio_duration_ms(
+            audio_path,
+            limit_ms=settings.MAX_AUDIO_DURATION * 1000
+        )
+    except AudioProbeError as e:
+        raise HTTPException(status_code=400, detail=f"Unreadable audio file: {str(e)}")
+    
+    annotate_stage(audio_seconds=duration_ms / 1000.0)
+    duration = duration_ms / 1000.0
+    if duration > settings.MAX_AUDIO_DURATION:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Audio too long ({duration}s). Maximum: {settings.MAX_AUDIO_DURATION}s"
+        )
+    return duration
+
+
+def decode_audio(audio_path: str, filename: str, duration: float, scratch: ScratchSpace) -> str:
+    """Convert the upload to 16 kHz mono WAV inside the request's scratch space"""
+    if filename.endswith('.wav'):
+        return audio_path
+    
+    logger.info("Converting audio to WAV format...")
+    wav_path = scratch.write_file(
+        lambda path: convert_webm_to_wav(audio_path, path),
+        ".wav",
+        expected_size=int(duration * 32000) + 44  # 16 kHz mono s16
+    )
+    scratch.account_file(wav_path)
+    return wav_path
+
+
+def transcribe_stage(wav_path: str) -> TranscriptData:
+    """Speech-to-text, annotating the span with the segment count (HTTP 503 if the STT pool is down)"""
+    try:
+        transcript = transcribe_audio(wav_path)
+    except SttPoolUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    annotate_stage(
+        segment_count=len(transcript.segments),
+        silence_removed_sec=transcript.silence.removed_sec if transcript.silence else 0.0
+    )
+    return transcript
+
+
+def add_audio_stages(
+    graph: PipelineGraph,
+    audio_path: str,
+    filename: str,
+    scratch: ScratchSpace,
+    use_process_pool: bool = False,
+    transcript: Optional[TranscriptData] = None
+) -> None:
+    """
+    Add duration_probe -> decode -> stt to a pipeline graph
+    
+    With use_process_pool, STT runs on the worker process pool (batch
+    endpoints) instead of the stage thread pool. A stored `transcript` of
+    the same audio replaces all three stages.
+    """
+    if transcript is not None:
+        graph.add("stt", lambda: transcript)
+        return
+    
+    graph.add(
+        "duration_probe",
+        lambda: check_audio_duration(audio_path)
+    )
+    graph.add(
+        "decode",
+        lambda duration_probe: decode_audio(audio_path, filename, duration_probe, scratch),
+        deps=["duration_probe"],
+        attributes=lambda duration_probe: {"audio_seconds": duration_probe}
+    )
+    
+    async def transcribe_pooled(decode, duration_probe):
+        try:
+            transcript = await transcribe_in_pool(decode)
+        except SttPoolUnavailable as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        annotate_stage(segment_count=len(transcript.segments))
+        return transcript
+    
+    graph.add(
+        "stt",
+        transcribe_pooled if use_process_pool else (lambda decode, duration_probe: transcribe_stage(decode)),
+        deps=["decode", "duration_probe"],
+        attributes=lambda decode, duration_probe: {"audio_seconds": duration_probe}
+    )
+
+
+def add_analysis_stages(
+    graph: PipelineGraph,
+    outline_stage: str,
+    outline: Optional[OutlineEmbeddings] = None,
+    splice: Optional[TranscriptSplice] = None,
+    previous: Optional[AnalysisResponse] = None,
+    deck_hash: Optional[str] = None
+) -> None:
+    """
+    Add metrics, outline encoding, embedding alignment and feedback
+    
+    Outline encoding only needs the outline, so it overlaps with decode/STT;
+    metrics and alignment only need the transcript, so they run side by side.
+    A pre-computed `outline` (shared by a batch) skips the encoding. With a
+    `splice` of the `previous` run's transcript, metrics and alignment are
+    updated for the changed window only. With a `deck_hash`, the outline
+    encoding is stored and reused across runs of the same deck.
+    """
+    graph.add(
+        "outline_encode",
+        (lambda **deps: outline) if outline is not None else (lambda **deps: encode_outline(deps[outline_stage], deck_hash)),
+        deps=[outline_stage]
+    )
+    
+    def metrics(stt):
+        if splice is None:
+            return calculate_metrics(stt)
+        return update_metrics(previous.metrics, splice.removed_text, splice.inserted_text, stt.duration)
+    
+    def embedding_alignment(stt, outline_encode, **deps):
+        if splice is None:
+            return align_transcript_to_outline(stt, deps[outline_stage], outline_encode)
+        return realign_window(
+            previous.alignment, stt, deps[outline_stage], outline_encode,
+            splice.first_idx, len(splice.removed), len(splice.inserted)
+        )
+    
+    graph.add(
+        "metrics",
+        metrics,
+        deps=["stt"],
+        attributes=lambda stt: {"segment_count": len(stt.segments)}
+    )
+    graph.add(
+        "embedding_alignment",
+        embedding_alignment,
+        deps=["stt", "outline_encode", outline_stage],
+        attributes=lambda stt, **deps: {"segment_count": len(stt.segments)}
+    )
+    
+    async def feedback_llm(stt, metrics, embedding_alignment, **deps):
+        # (feedback, used_fallback); see degraded_stages()
+        return await generate_feedback_or_template(deps[outline_stage], stt, metrics, embedding_alignment)
+    
+    graph.add(
+        "feedback_llm",
+        feedback_llm,
+        deps=["stt", "metrics", "embedding_alignment", outline_stage]
+    )
+
+
+def degraded_stages(results: Dict[str, Any]) -> List[str]:
+    """Names of the stages whose result came from a local fallback"""
+    stages = []
+    if results["feedback_llm"][1]:
+        stages.append("feedback_llm")
+    slides = results.get("slide_alignment", {}).get("slides", [])
+    if any(s.get("source", "llm") != "llm" for s in slides):
+        stages.append("slide_alignment")
+    if any(s.get("talking_points_fallback") for s in slides):
+        stages.append("talking_points")
+    return stages
+
+
+def resolve_user(user_id: Optional[str]) -> Optional[str]:
+    """User from the X-User-Id header (None if none)"""
+    user_id = (user_id or "").strip()
+    if len(user_id) > 128:
+        raise HTTPException(status_code=400, detail="X-User-Id too long (maximum 128 characters)")
+    return user_id or None
+
+
+def require_user(user_id: Optional[str]) -> str:
+    """User from the X-User-Id header (HTTP 401 if none: history is never shared)"""
+    user_id = resolve_user(user_id)
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="X-User-Id header required for session history")
+    return user_id
+
+
+async def find_prior_transcript(user_id: Optional[str], audio_sha256: str) -> Optional[TranscriptData]:
+    """Stored transcript of the same audio by the same user, if reuse is enabled"""
+    if not (user_id and settings.SESSION_STORE_ENABLED and settings.SESSION_REUSE_TRANSCRIPTS):
+        return None
+    try:
+        transcript = await run_in_thread(get_session_store().find_transcript, user_id, audio_sha256)
+    except Exception as e:
+        logger.warning(f"Session store lookup failed, transcribing again: {e}")
+        return None
+    if transcript is not None:
+        logger.info(f"Reusing stored transcript for audio {audio_sha256[:12]}")
+    return transcript
+
+
+async def record_session(
+    response: AnalysisResponse,
+    user_id: Optional[str],
+    variant: str,
+    deck_hash: str,
+    audio_sha256: str,
+    deck_name: Optional[str] = None,
+    outline_text: Optional[str] = None,
+    slides: Optional[List[Dict[str, str]]] = None
+) -> None:
+    """
+    Save the run to the session history and set response.session_id (never raises)
+    
+    Runs without a user are not stored.
+    """
+    if not (user_id and settings.SESSION_STORE_ENABLED):
+        return
+    try:
+        with stage("session_store"):
+            response.session_id = await run_in_thread(
+                get_session_store().save_session,
+                user_id, variant, deck_hash, audio_sha256, response, deck_name, outline_text, slides
+            )
+    except Exception as e:
+        logger.warning(f"Could not store session: {e}")
+
+
 @app.post("/api/analyze", response_model=AnalysisResponse)
 async def analyze_presentation(
     audio: UploadFile = File(..., description="Audio file (webm, wav, mp3)"),
     outline_text: Optional[str] = Form(None, description="Presentation outline/script"),
-    outline_file: Optional[UploadFile] = File(None, description="Presentation file (pptx, pdf)")
+    outline_file: Optional[UploadFile] = File(None, description="Presentation file (pptx, pdf)"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    user_id: Optional[str] = Header(None, alias="X-User-Id")
 ):
     """
     Analyze a presentation practice session (FREE version)
     
+    Identical concurrent submissions (same audio, outline and variant) share
+    one computation; a repeated Idempotency-Key replays the first response.
+    With an X-User-Id, the run is stored in the user's session history.
+    
     Args:
         audio: Audio recording of the practice (webm/wav/mp3)
         outline_text: What the presentation should cover (optional if file provided)
         outline_file: Presentation file (optional if text provided)
+        idempotency_key: Optional client key to make retries safe
+        user_id: Optional user the run belongs to (X-User-Id header)
         
     Returns:
         Complete analysis with transcript, metrics, alignment, and feedback
     """
+    user_id = resolve_user(user_id)
+    coalescer = get_coalescer()
+    replay = await coalescer.lookup_idempotent("free", idempotency_key)
+    if replay is not None:
+        return replay
     
-    temp_audio_path = None
-    converted_wav_path = None
-    temp_outline_path = None
+    # Private per-request workspace (no file name collisions between requests)
+    scratch = ScratchSpace()
+    scratch_handed_off = False
     
     try:
-        # Extract text from file if provided
-        final_outline_text = outline_text
+        temp_outline_path = None
+        suffix = None
         
         if outline_file:
             logger.info(f"Received outline file: {outline_file.filename}")
             suffix = os.path.splitext(outline_file.filename)[1].lower()
+            if suffix not in ('.pptx', '.pdf'):
+                raise HTTPException(status_code=400, detail="Unsupported file format. Use .pptx or .pdf")
             
-            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
-                content = await outline_file.read()
-                temp_file.write(content)
-                temp_outline_path = temp_file.name
-                
-            try:
-                if suffix == '.pptx':
-                    final_outline_text = extract_text_from_pptx(temp_outline_path)
-                elif suffix == '.pdf':
-                    final_outline_text = extract_text_from_pdf(temp_outline_path)
-                else:
-                    raise HTTPException(status_code=400, detail="Unsupported file format. Use .pptx or .pdf")
-            except Exception as e:
-                logger.error(f"File parsing error: {e}")
-                raise HTTPException(status_code=400, detail=f"Failed to parse presentation file: {str(e)}")
+            with stage("upload", kind="deck") as span:
+                stored_outline = await scratch.save_upload(outline_file, suffix=suffix)
+                span["bytes"] = stored_outline.size
+            temp_outline_path = stored_outline.path
         
-        # Validate inputs
-        if not final_outline_text or len(final_outline_text.strip()) < 20:
+        elif not outline_text or len(outline_text.strip()) < 20:
+            # Fail fast before accepting the audio upload
             raise HTTPException(
                 status_code=400,
                 detail="Outline text too short (minimum 20 characters) or file extraction failed"
@@ -131,60 +399,80 @@ async def analyze_presentation(
         
         logger.info(f"Received audio file: {audio.filename} ({audio.content_type})")
         
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as temp_file:
-            content = await audio.read()
-            temp_file.write(content)
-            temp_audio_path = temp_file.name
+        # Stream uploaded file to disk (bounded memory, hashed on the fly)
+        with stage("upload", kind="audio") as span:
+            stored_audio = await scratch.save_upload(audio, suffix=".webm")
+            span["bytes"] = stored_audio.size
         
-        logger.info(f"Audio saved to: {temp_audio_path}")
+        logger.info(
+            f"Audio saved to: {stored_audio.path} "
+            f"({stored_audio.size} bytes, sha256={stored_audio.sha256[:12]})"
+        )
         
-        # Check duration
-        duration = get_audio_duration(temp_audio_path)
-        if duration > settings.MAX_AUDIO_DURATION:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Audio too long ({duration}s). Maximum: {settings.MAX_AUDIO_DURATION}s"
-            )
+        deck_hash = stored_outline.sha256 if temp_outline_path else hashlib.sha256(outline_text.encode("utf-8")).hexdigest()
+        key = content_key("free", stored_audio.sha256, deck_hash, user_id or "")
         
-        # Convert to WAV if needed
-        if not audio.filename.endswith('.wav'):
-            logger.info("Converting audio to WAV format...")
-            converted_wav_path = convert_webm_to_wav(temp_audio_path)
-        else:
-            converted_wav_path = temp_audio_path
-        
-        # Step 1: Speech-to-Text
-        logger.info("Step 1/4: Transcribing audio...")
-        transcript = transcribe_audio(converted_wav_path)
-        
-        # Step 2: Calculate Metrics
-        logger.info("Step 2/4: Calculating speech metrics...")
-        metrics = calculate_metrics(transcript)
-        
-        # Step 3: Alignment Analysis
-        logger.info("Step 3/4: Analyzing content alignment...")
-        alignment = align_transcript_to_outline(transcript, final_outline_text)
-        
-        # Step 4: Generate Feedback
-        logger.info("Step 4/4: Generating AI feedback...")
-        feedback = generate_feedback(final_outline_text, transcript, metrics, alignment)
-        
-        # Build response (NO slide_alignment for free version)
-        response = AnalysisResponse(
-            transcript=transcript,
-            metrics=metrics,
-            alignment=alignment,
-            feedback=feedback,
-            slide_alignment=None  # Free version
-        )
+        def parse_outline() -> str:
+            final_outline_text = outline_text
+            if temp_outline_path:
+                try:
+                    if suffix == '.pptx':
+                        final_outline_text = extract_text_from_pptx(temp_outline_path)
+                    else:
+                        final_outline_text = extract_text_from_pdf(temp_outline_path)
+                except Exception as e:
+                    logger.error(f"File parsing error: {e}")
+                    raise HTTPException(status_code=400, detail=f"Failed to parse presentation file: {str(e)}")
+            
+            # Validate inputs
+            if not final_outline_text or len(final_outline_text.strip()) < 20:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Outline text too short (minimum 20 characters) or file extraction failed"
+                )
+            return final_outline_text
         
-        logger.info("Analysis complete!")
-        return response
+        async def analyze() -> AnalysisResponse:
+            try:
+                # Stage graph: deck parsing and outline encoding overlap with
+                # decode/STT; metrics and alignment run side by side after STT
+                prior_transcript = await find_prior_transcript(user_id, stored_audio.sha256)
+                graph = PipelineGraph()
+                graph.add("deck_parse", parse_outline)
+                add_audio_stages(graph, stored_audio.path, audio.filename, scratch, transcript=prior_transcript)
+                add_analysis_stages(graph, outline_stage="deck_parse", deck_hash=deck_hash)
+                
+                logger.info("Running analysis pipeline...")
+                results = await run_pipeline(graph)
+                
+                # Build response (NO slide_alignment for free version)
+                response = build_analysis_response(results, pro=False)
+                await record_session(
+                    response, user_id, "free", deck_hash, stored_audio.sha256,
+                    outline_file.filename if outline_file else None,
+                    outline_text=results["deck_parse"]
+                )
+                
+                logger.info("Analysis complete!")
+                return response
+            finally:
+                # The computation owns the workspace once it has started
+                scratch.cleanup()
+        
+        task, started = coalescer.start("free", key, analyze, idempotency_key)
+        scratch_handed_off = started
+        # Shielded: if this client disconnects, other waiters still get the result
+        return await asyncio.shield(task)
         
     except HTTPException:
         raise
     
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    except ScratchBudgetExceeded as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    
     except Exception as e:
         logger.error(f"Analysis failed: {str(e)}", exc_info=True)
         raise HTTPException(
@@ -193,38 +481,202 @@ async def analyze_presentation(
         )
     
     finally:
-        # Cleanup temporary files
-        if temp_audio_path:
-            cleanup_temp_file(temp_audio_path)
-        if converted_wav_path and converted_wav_path != temp_audio_path:
-            cleanup_temp_file(converted_wav_path)
-        if temp_outline_path:
-            cleanup_temp_file(temp_outline_path)
+        # Cleanup temporary files (unless a started computation owns them)
+        if not scratch_handed_off:
+            scratch.cleanup()
 
 
 # ============================================================================
 # NEW ENDPOINT: PRO VERSION WITH SLIDE-BY-SLIDE ALIGNMENT
 # ============================================================================
 
+async def find_prior_slide_results(
+    transcript_hash: str,
+    language: str,
+    slides_data: List[Dict[str, str]]
+) -> Dict[str, Dict[str, Any]]:
+    """Stored per-slide results for this transcript, by slide content hash"""
+    if not settings.SESSION_STORE_ENABLED:
+        return {}
+    hashes = [slide["content_hash"] for slide in slides_data if slide.get("content_hash")]
+    try:
+        return await run_in_thread(get_session_store().slide_results, transcript_hash, language, hashes)
+    except Exception as e:
+        logger.warning(f"Slide result lookup failed, analyzing all slides: {e}")
+        return {}
+
+
+async def record_slide_results(
+    transcript_hash: str,
+    language: str,
+    slides: List[Dict[str, Any]],
+    block_count: int
+) -> None:
+    """Keep per-slide results for re-runs with an edited deck (never raises)"""
+    if not settings.SESSION_STORE_ENABLED:
+        return
+    try:
+        await run_in_thread(get_session_store().save_slide_results, transcript_hash, language, slides, block_count)
+    except Exception as e:
+        logger.warning(f"Could not store slide results: {e}")
+
+def parse_deck_text(pptx_path: str) -> str:
+    """Raw text of a PPTX deck (HTTP 400 if it cannot be parsed)"""
+    try:
+        return extract_text_from_pptx(pptx_path)
+    except Exception as e:
+        logger.error(f"PPTX parsing error: {e}")
+        raise HTTPException(status_code=400, detail=f"Failed to parse PPTX: {str(e)}")
+
+
+def parse_deck_slides(pptx_path: str) -> List[Dict[str, str]]:
+    """Structured slides of a PPTX deck (HTTP 400 if none can be parsed)"""
+    try:
+        slides_data = extract_slides_structured(pptx_path)
+    except Exception as e:
+        logger.error(f"PPTX parsing error: {e}")
+        raise HTTPException(status_code=400, detail=f"Failed to parse PPTX: {str(e)}")
+    
+    if not slides_data:
+        raise HTTPException(status_code=400, detail="Failed to parse PPTX: No slides found in PPTX")
+    
+    annotate_stage(slide_count=len(slides_data))
+    logger.info(f"[PRO] Extracted {len(slides_data)} slides")
+    return slides_data
+
+
+async def slide_alignment_stage(
+    slides_data: List[Dict[str, str]],
+    outline_text: str,
+    transcript: TranscriptData,
+    memo: Optional[AsyncMemo] = None,
+    limiter: Optional[asyncio.Semaphore] = None
+) -> Dict[str, Any]:
+    """
+    Detect the language and classify every slide against the transcript
+    
+    Slides analyzed before against the same transcript (unchanged content
+    hash) reuse their stored results. `limiter` bounds the request's slide
+    check calls in flight (see check_limiter()).
+    """
+    language = detect_language(outline_text, transcript.text)
+    transcript_hash = hashlib.sha256(transcript.text.encode("utf-8")).hexdigest()
+    previous = await find_prior_slide_results(transcript_hash, language, slides_data)
+    
+    slides_analysis = await analyze_slide_by_slide_alignment(
+        slides_data,
+        transcript.text,
+        language,
+        memo=memo,
+        previous=previous,
+        limiter=limiter
+    )
+    return {
+        "language": language,
+        "slides": slides_analysis,
+        "transcript_hash": transcript_hash,
+        "block_count": len(split_transcript_into_blocks(transcript.text, block_size=3))
+    }
+
+
+async def talking_points_stage(
+    slide_alignment: Dict[str, Any],
+    memo: Optional[AsyncMemo] = None
+) -> SlideBySlideAlignment:
+    """Generate talking points for missing/partial slides and build the PRO result"""
+    language = slide_alignment["language"]
+    slides_with_suggestions = await generate_talking_points_batch(
+        slide_alignment["slides"],
+        language,
+        memo=memo
+    )
+    await record_slide_results(
+        slide_alignment["transcript_hash"],
+        language,
+        slides_with_suggestions,
+        slide_alignment["block_count"]
+    )
+    
+    return build_slide_alignment(slides_with_suggestions, language)
+
+
+def add_slide_stages(
+    graph: PipelineGraph,
+    memo: Optional[AsyncMemo] = None,
+    limiter: Optional[asyncio.Semaphore] = None
+) -> None:
+    """Add slide_alignment -> talking_points and slide_timeline (needs deck_parse, deck_text, stt)"""
+    
+    async def slide_alignment(deck_parse, deck_text, stt):
+        return await slide_alignment_stage(deck_parse, deck_text, stt, memo=memo, limiter=limiter)
+    
+    async def talking_points(slide_alignment):
+        return await talking_points_stage(slide_alignment, memo=memo)
+    
+    graph.add(
+        "slide_alignment",
+        slide_alignment,
+        deps=["deck_parse", "deck_text", "stt"],
+        attributes=lambda deck_parse, deck_text, stt: {"slide_count": len(deck_parse)}
+    )
+    graph.add(
+        "talking_points",
+        talking_points,
+        deps=["slide_alignment"],
+        attributes=lambda slide_alignment: {"slide_count": len(slide_alignment["slides"])}
+    )
+    graph.add(
+        "slide_timeline",
+        lambda deck_parse, stt: build_slide_timeline(deck_parse, stt),
+        deps=["deck_parse", "stt"]
+    )
+
+
+def build_analysis_response(results: Dict[str, Any], pro: bool) -> AnalysisResponse:
+    """Assemble the AnalysisResponse from pipeline results"""
+    degraded = degraded_stages(results)
+    return AnalysisResponse(
+        transcript=results["stt"],
+        metrics=results["metrics"],
+        alignment=results["embedding_alignment"],
+        feedback=results["feedback_llm"][0],
+        slide_alignment=results["talking_points"] if pro else None,  # PRO feature
+        slide_timeline=results["slide_timeline"] if pro else None,
+        degraded=bool(degraded),
+        degraded_stages=degraded
+    )
+
+
 @app.post("/api/analyze-pro", response_model=AnalysisResponse)
 async def analyze_presentation_pro(
     audio: UploadFile = File(..., description="Audio file (webm, wav, mp3)"),
-    outline_file: UploadFile = File(..., description="Presentation file (pptx REQUIRED for PRO)")
+    outline_file: UploadFile = File(..., description="Presentation file (pptx REQUIRED for PRO)"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    user_id: Optional[str] = Header(None, alias="X-User-Id")
 ):
     """
     Analyze a presentation practice session (PRO version with slide-by-slide alignment)
     
+    Coalesces identical submissions and stores the run like /api/analyze.
+    
     Args:
         audio: Audio recording of the practice (webm/wav/mp3)
         outline_file: PPTX presentation file (REQUIRED)
+        idempotency_key: Optional client key to make retries safe
+        user_id: Optional user the run belongs to (X-User-Id header)
         
     Returns:
         Complete analysis INCLUDING slide-by-slide alignment with talking points
     """
+    user_id = resolve_user(user_id)
+    coalescer = get_coalescer()
+    replay = await coalescer.lookup_idempotent("pro", idempotency_key)
+    if replay is not None:
+        return replay
     
-    temp_audio_path = None
-    converted_wav_path = None
-    temp_outline_path = None
+    # Private per-request workspace (no file name collisions between requests)
+    scratch = ScratchSpace()
+    scratch_handed_off = False
     
     try:
         # VALIDATE: Must be PPTX for PRO features
@@ -238,139 +690,477 @@ async def analyze_presentation_pro(
         
         # Save PPTX file
         suffix = os.path.splitext(outline_file.filename)[1].lower()
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
-            content = await outline_file.read()
-            temp_file.write(content)
-            temp_outline_path = temp_file.name
+        with stage("upload", kind="deck") as span:
+            stored_outline = await scratch.save_upload(outline_file, suffix=suffix)
+            span["bytes"] = stored_outline.size
+        temp_outline_path = stored_outline.path
+        
+        # Process audio
+        logger.info(f"[PRO] Received audio file: {audio.filename}")
+        
+        with stage("upload", kind="audio") as span:
+            stored_audio = await scratch.save_upload(audio, suffix=".webm")
+            span["bytes"] = stored_audio.size
         
         # Extract both: (1) raw text for existing analysis, (2) structured slides
-        try:
-            # For existing FREE features
-            outline_text = extract_text_from_pptx(temp_outline_path)
-            
-            # For NEW PRO slide-by-slide analysis
-            slides_data = extract_slides_structured(temp_outline_path)
-            
-            if not slides_data:
-                raise ValueError("No slides found in PPTX")
+        def parse_text() -> str:
+            return parse_deck_text(temp_outline_path)
+        
+        def parse_slides() -> List[Dict[str, str]]:
+            return parse_deck_slides(temp_outline_path)
+        
+        key = content_key("pro", stored_audio.sha256, stored_outline.sha256, user_id or "")
+        
+        async def analyze() -> AnalysisResponse:
+            try:
+                # Stage graph: deck parsing and outline encoding overlap with
+                # decode/STT; after STT, metrics, embedding alignment and the
+                # slide-by-slide analysis run concurrently, and only feedback waits
+                # for metrics + alignment
+                prior_transcript = await find_prior_transcript(user_id, stored_audio.sha256)
+                graph = PipelineGraph()
+                graph.add("deck_text", parse_text)
+                graph.add("deck_parse", parse_slides)
+                add_audio_stages(graph, stored_audio.path, audio.filename, scratch, transcript=prior_transcript)
+                add_analysis_stages(graph, outline_stage="deck_text", deck_hash=stored_outline.sha256)
+                add_slide_stages(graph)
                 
-            logger.info(f"[PRO] Extracted {len(slides_data)} slides")
-            
-        except Exception as e:
-            logger.error(f"PPTX parsing error: {e}")
-            raise HTTPException(status_code=400, detail=f"Failed to parse PPTX: {str(e)}")
+                logger.info("[PRO] Running analysis pipeline...")
+                results = await run_pipeline(graph)
+                
+                # Build response (WITH slide_alignment for PRO)
+                response = build_analysis_response(results, pro=True)
+                await record_session(
+                    response, user_id, "pro", stored_outline.sha256, stored_audio.sha256,
+                    outline_file.filename,
+                    outline_text=results["deck_text"],
+                    slides=results["deck_parse"]
+                )
+                
+                logger.info("[PRO] Analysis complete with slide-by-slide alignment!")
+                return response
+            finally:
+                # The computation owns the workspace once it has started
+                scratch.cleanup()
         
-        # Process audio
-        logger.info(f"[PRO] Received audio file: {audio.filename}")
+        task, started = coalescer.start("pro", key, analyze, idempotency_key)
+        scratch_handed_off = started
+        # Shielded: if this client disconnects, other waiters still get the result
+        return await asyncio.shield(task)
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".webm") as temp_file:
-            audio_content = await audio.read()
-            temp_file.write(audio_content)
-            temp_audio_path = temp_file.name
+    except HTTPException:
+        raise
+    
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    except ScratchBudgetExceeded as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    
+    except Exception as e:
+        logger.error(f"[PRO] Analysis failed: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail=f"PRO analysis failed: {str(e)}"
+        )
+    
+    finally:
+        # Cleanup temporary files (unless a started computation owns them)
+        if not scratch_handed_off:
+            scratch.cleanup()
+
+
+# ============================================================================
+# COHORT ENDPOINT: MANY RECORDINGS AGAINST ONE DECK
+# ============================================================================
+
+def summarize_cohort(
+    recordings: List[CohortRecordingResult],
+    slides_data: List[Dict[str, str]]
+) -> CohortSummary:
+    """Aggregate metrics and per-slide coverage over the successful recordings"""
+    results = [r.result for r in recordings if r.result is not None]
+    
+    def mean(values: List[float]) -> float:
+        return round(sum(values) / len(values), 1) if values else 0.0
+    
+    counts = {n: {"covered": 0, "partial": 0, "missing": 0} for n in range(1, len(slides_data) + 1)}
+    for result in results:
+        if result.slide_alignment:
+            for slide in result.slide_alignment.slides:
+                counts.setdefault(slide.slide_number, {"covered": 0, "partial": 0, "missing": 0})
+                counts[slide.slide_number][slide.status] += 1
+    
+    slides = [
+        CohortSlideSummary(
+            slide_number=n,
+            title=slides_data[n - 1].get('title', f'Slide {n}') if n <= len(slides_data) else f'Slide {n}',
+            **counts[n]
+        )
+        for n in sorted(counts)
+    ]
+    # Most missed slides first: where the class needs help
+    slides.sort(key=lambda s: (-s.missing, -s.partial, s.slide_number))
+    
+    return CohortSummary(
+        recording_count=len(recordings),
+        succeeded=len(results),
+        failed=len(recordings) - len(results),
+        avg_wpm=mean([r.metrics.wpm for r in results]),
+        avg_filler_count=mean([r.metrics.filler_count for r in results]),
+        avg_off_topic_rate=mean([
+            len(r.alignment.off_topic_segments) / len(r.alignment.items) * 100
+            for r in results if r.alignment.items
+        ]),
+        avg_slide_coverage=mean([r.slide_alignment.overall_coverage for r in results if r.slide_alignment]),
+        slides=slides
+    )
+
+
+@app.post("/api/analyze-cohort", response_model=CohortAnalysisResponse)
+async def analyze_cohort(
+    audios: List[UploadFile] = File(..., description="Audio recordings (webm, wav, mp3)"),
+    outline_file: UploadFile = File(..., description="Presentation file (pptx REQUIRED)")
+):
+    """
+    Analyze many recordings of the same PPTX deck (e.g. a whole class)
+    
+    The deck is parsed and embedded once, STT runs on the worker process
+    pool, and slide-level LLM answers and talking points are shared between
+    recordings. A recording that fails is reported in its own entry and
+    does not fail the batch.
+    
+    Args:
+        audios: Audio recordings (webm/wav/mp3), up to COHORT_MAX_RECORDINGS
+        outline_file: PPTX presentation file
         
-        # Check duration
-        duration = get_audio_duration(temp_audio_path)
-        if duration > settings.MAX_AUDIO_DURATION:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Audio too long ({duration}s). Maximum: {settings.MAX_AUDIO_DURATION}s"
-            )
+    Returns:
+        Per-recording PRO analyses plus a cohort summary
+    """
+    if not outline_file.filename.endswith('.pptx'):
+        raise HTTPException(status_code=400, detail="Cohort analysis requires a .pptx file")
+    if len(audios) > settings.COHORT_MAX_RECORDINGS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many recordings ({len(audios)}). Maximum: {settings.COHORT_MAX_RECORDINGS}"
+        )
+    
+    # One workspace for the batch, with a per-request budget per recording
+    scratch = ScratchSpace(budget_bytes=settings.SCRATCH_BUDGET_MB * 1024 * 1024 * len(audios))
+    
+    try:
+        with stage("upload", kind="deck") as span:
+            stored_outline = await scratch.save_upload(outline_file, suffix=".pptx")
+            span["bytes"] = stored_outline.size
         
-        # Convert to WAV if needed
-        if not audio.filename.endswith('.wav'):
-            logger.info("[PRO] Converting audio to WAV format...")
-            converted_wav_path = convert_webm_to_wav(temp_audio_path)
-        else:
-            converted_wav_path = temp_audio_path
+        stored_audios = []
+        for audio in audios:
+            with stage("upload", kind="audio") as span:
+                stored_audios.append(await scratch.save_upload(audio, suffix=".webm"))
+                span["bytes"] = stored_audios[-1].size
         
-        # Step 1: Speech-to-Text
-        logger.info("[PRO] Step 1/5: Transcribing audio...")
-        transcript = transcribe_audio(converted_wav_path)
+        logger.info(f"[COHORT] Received {len(audios)} recordings for {outline_file.filename}")
         
-        # Step 2: Calculate Metrics
-        logger.info("[PRO] Step 2/5: Calculating speech metrics...")
-        metrics = calculate_metrics(transcript)
+        # Deck work, done once for the whole cohort
+        deck = PipelineGraph()
+        deck.add("deck_text", lambda: parse_deck_text(stored_outline.path))
+        deck.add("deck_parse", lambda: parse_deck_slides(stored_outline.path))
+        deck.add("outline_encode", lambda deck_text: encode_outline(deck_text, stored_outline.sha256), deps=["deck_text"])
+        deck_results = await run_pipeline(deck)
         
-        # Step 3: Alignment Analysis (existing)
-        logger.info("[PRO] Step 3/5: Analyzing content alignment...")
-        alignment = align_transcript_to_outline(transcript, outline_text)
+        # Shared between recordings: identical slide checks and talking points,
+        # and one bound on slide check calls in flight for the whole cohort
+        memo = AsyncMemo()
+        limiter = check_limiter()
         
-        # Step 4: Generate Feedback (existing)
-        logger.info("[PRO] Step 4/5: Generating AI feedback...")
-        feedback = generate_feedback(outline_text, transcript, metrics, alignment)
+        async def analyze_recording(filename: str, audio_path: str) -> CohortRecordingResult:
+            graph = PipelineGraph()
+            graph.add("deck_text", lambda: deck_results["deck_text"])
+            graph.add("deck_parse", lambda: deck_results["deck_parse"])
+            add_audio_stages(graph, audio_path, filename, scratch, use_process_pool=True)
+            add_analysis_stages(graph, outline_stage="deck_text", outline=deck_results["outline_encode"])
+            add_slide_stages(graph, memo=memo, limiter=limiter)
+            
+            try:
+                results = await run_pipeline(graph)
+            except HTTPException as e:
+                return CohortRecordingResult(filename=filename, error=str(e.detail))
+            except Exception as e:
+                logger.error(f"[COHORT] Recording {filename} failed: {str(e)}", exc_info=True)
+                return CohortRecordingResult(filename=filename, error=str(e))
+            return CohortRecordingResult(filename=filename, result=build_analysis_response(results, pro=True))
         
-        # Step 5: NEW - Slide-by-Slide Alignment
-        logger.info("[PRO] Step 5/5: Analyzing slide-by-slide alignment...")
+        recordings = list(await asyncio.gather(*(
+            analyze_recording(audio.filename, stored.path)
+            for audio, stored in zip(audios, stored_audios)
+        )))
         
-        # Detect language
-        language = detect_language(outline_text, transcript.text)
+        logger.info(
+            f"[COHORT] Analysis complete: {sum(r.result is not None for r in recordings)}/{len(recordings)} "
+            f"succeeded, shared LLM answers reused {memo.hits}x ({memo.misses} computed)"
+        )
+        return CohortAnalysisResponse(
+            recordings=recordings,
+            summary=summarize_cohort(recordings, deck_results["deck_parse"]),
+            degraded=any(r.result is not None and r.result.degraded for r in recordings)
+        )
+    
+    except HTTPException:
+        raise
+    
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    except ScratchBudgetExceeded as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    
+    except Exception as e:
+        logger.error(f"[COHORT] Analysis failed: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Cohort analysis failed: {str(e)}"
+        )
+    
+    finally:
+        # Cleanup temporary files
+        scratch.cleanup()
+
+
+# ============================================================================
+# SESSION HISTORY
+# ============================================================================
+
+def require_session_store() -> None:
+    if not settings.SESSION_STORE_ENABLED:
+        raise HTTPException(status_code=404, detail="Session history is disabled")
+
+
+@app.get("/api/sessions", response_model=SessionList)
+async def list_sessions(
+    deck_hash: Optional[str] = Query(None, description="Only runs of this deck"),
+    limit: int = Query(20, ge=1),
+    user_id: Optional[str] = Header(None, alias="X-User-Id")
+):
+    """List the user's stored practice runs, newest first (no re-analysis)"""
+    require_session_store()
+    user_id = require_user(user_id)
+    sessions = await run_in_thread(
+        get_session_store().list_sessions,
+        user_id, deck_hash, min(limit, settings.SESSION_HISTORY_LIMIT)
+    )
+    return SessionList(user_id=user_id, sessions=sessions)
+
+
+@app.get("/api/sessions/progress", response_model=ProgressReport)
+async def session_progress(
+    deck_hash: Optional[str] = Query(None, description="Only runs of this deck"),
+    limit: int = Query(20, ge=2),
+    user_id: Optional[str] = Header(None, alias="X-User-Id")
+):
+    """WPM, filler-rate and coverage deltas over the user's latest runs"""
+    require_session_store()
+    return await run_in_thread(
+        get_session_store().progress,
+        require_user(user_id), deck_hash, min(limit, settings.SESSION_HISTORY_LIMIT)
+    )
+
+
+@app.post("/api/sessions/{session_id}/splice", response_model=AnalysisResponse)
+async def splice_session(
+    session_id: str,
+    audio: UploadFile = File(..., description="Re-recorded clip (webm, wav, mp3)"),
+    start_sec: float = Form(..., description="Start of the replaced range in the original take"),
+    end_sec: float = Form(..., description="End of the replaced range in the original take"),
+    user_id: Optional[str] = Header(None, alias="X-User-Id")
+):
+    """
+    Replace a time range of a stored run with a re-recorded clip
+    
+    Only the clip is transcribed; its segments are spliced into the stored
+    transcript and metrics, alignment and slide status are updated for the
+    changed window. The result is stored as a new session.
+    
+    Args:
+        session_id: The run to update
+        audio: Replacement recording for the range
+        start_sec: Start of the replaced range (seconds)
+        end_sec: End of the replaced range (seconds)
+        user_id: User the run belongs to (X-User-Id header, required)
         
-        # Analyze each slide
-        slides_analysis = analyze_slide_by_slide_alignment(
-            slides_data,
-            transcript.text,
-            language
+    Returns:
+        Complete analysis of the spliced take
+    """
+    require_session_store()
+    user_id = require_user(user_id)
+    store = get_session_store()
+    previous = await run_in_thread(store.get_session, user_id, session_id)
+    inputs = await run_in_thread(store.get_session_inputs, user_id, session_id)
+    if previous is None or inputs is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if not inputs["outline_text"] or (inputs["variant"] == "pro" and not inputs["slides"]):
+        raise HTTPException(
+            status_code=409,
+            detail="Session was stored without its deck; run a full analysis instead"
         )
+    if not 0 <= start_sec < end_sec or start_sec >= previous.transcript.duration:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid range {start_sec}-{end_sec}s (take is {previous.transcript.duration:.1f}s)"
+        )
+    pro = inputs["variant"] == "pro"
+    
+    scratch = ScratchSpace()
+    try:
+        with stage("upload", kind="audio") as span:
+            stored_clip = await scratch.save_upload(audio, suffix=".webm")
+            span["bytes"] = stored_clip.size
         
-        # Generate talking points for missing/partial slides
-        slides_with_suggestions = generate_talking_points_batch(
-            slides_analysis,
-            language
+        # Transcribe only the clip
+        clip_graph = PipelineGraph()
+        add_audio_stages(clip_graph, stored_clip.path, audio.filename, scratch)
+        clip_graph.add(
+            "splice",
+            lambda stt, duration_probe: splice_transcript(
+                previous.transcript, stt, start_sec, end_sec, duration_probe
+            ),
+            deps=["stt", "duration_probe"]
         )
+        splice = (await run_pipeline(clip_graph))["splice"]
         
-        # Calculate overall coverage
-        covered_count = sum(1 for s in slides_with_suggestions if s['status'] == 'covered')
-        overall_coverage = (covered_count / len(slides_with_suggestions)) * 100 if slides_with_suggestions else 0
-        
-        # Build SlideBySlideAlignment model
-        slide_alignment_details = [
-            SlideAlignmentDetail(
-                slide_number=s['slide_number'],
-                title=s['title'],
-                bullets=s['bullets'],
-                status=s['status'],
-                talking_points=s.get('talking_points', []),
-                needs_suggestion=s['needs_suggestion']
-            )
-            for s in slides_with_suggestions
-        ]
+        # Re-analyze the changed window against the stored deck
+        memo = AsyncMemo()
+        if pro:
+            previous_transcript_hash = hashlib.sha256(previous.transcript.text.encode("utf-8")).hexdigest()
+            stored_checks = await find_prior_slide_results(
+                previous_transcript_hash, previous.slide_alignment.language, inputs["slides"]
+            ) if previous.slide_alignment else {}
+            seed_slide_memo(memo, previous, inputs["slides"], stored_checks)
         
-        slide_alignment = SlideBySlideAlignment(
-            slides=slide_alignment_details,
-            overall_coverage=round(overall_coverage, 1),
-            language=language
+        graph = PipelineGraph()
+        graph.add("deck_text", lambda: inputs["outline_text"])
+        graph.add("stt", lambda: splice.transcript)
+        add_analysis_stages(
+            graph, outline_stage="deck_text", splice=splice, previous=previous, deck_hash=inputs["deck_hash"]
         )
+        if pro:
+            graph.add("deck_parse", lambda: inputs["slides"])
+            add_slide_stages(graph, memo=memo)
         
-        # Build response (WITH slide_alignment for PRO)
-        response = AnalysisResponse(
-            transcript=transcript,
-            metrics=metrics,
-            alignment=alignment,
-            feedback=feedback,
-            slide_alignment=slide_alignment  # PRO feature
-        )
+        results = await run_pipeline(graph)
+        response = build_analysis_response(results, pro=pro)
+        logger.info(f"Splice complete: {memo.hits} slide answers reused, {memo.misses} asked")
         
-        logger.info("[PRO] Analysis complete with slide-by-slide alignment!")
+        audio_key = hashlib.sha256(
+            f"{inputs['audio_sha256']}:{start_sec}:{end_sec}:{stored_clip.sha256}".encode("utf-8")
+        ).hexdigest()
+        await record_session(
+            response, user_id, inputs["variant"], inputs["deck_hash"], audio_key,
+            inputs["deck_name"],
+            outline_text=inputs["outline_text"],
+            slides=inputs["slides"]
+        )
         return response
         
     except HTTPException:
         raise
     
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    except ScratchBudgetExceeded as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    
     except Exception as e:
-        logger.error(f"[PRO] Analysis failed: {str(e)}", exc_info=True)
-        raise HTTPException(
-            status_code=500,
-            detail=f"PRO analysis failed: {str(e)}"
-        )
+        logger.error(f"Splice failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Splice failed: {str(e)}")
     
     finally:
-        # Cleanup temporary files
-        if temp_audio_path:
-            cleanup_temp_file(temp_audio_path)
-        if converted_wav_path and converted_wav_path != temp_audio_path:
-            cleanup_temp_file(converted_wav_path)
-        if temp_outline_path:
-            cleanup_temp_file(temp_outline_path)
+        scratch.cleanup()
+
+
+@app.get("/api/sessions/{session_id}", response_model=AnalysisResponse)
+async def get_session(
+    session_id: str,
+    user_id: Optional[str] = Header(None, alias="X-User-Id")
+):
+    """Full stored result of one run, exactly as it was returned"""
+    require_session_store()
+    response = await run_in_thread(get_session_store().get_session, require_user(user_id), session_id)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return response
+
+
+@app.post("/api/library/match", response_model=LibraryMatchResponse)
+async def match_library(
+    audio: UploadFile = File(..., description="Audio file (webm, wav, mp3)"),
+    limit: int = Query(5, ge=1, le=50),
+    user_id: Optional[str] = Header(None, alias="X-User-Id")
+):
+    """
+    Find which of the user's decks a recording belongs to
+    
+    Searches the decks of the user's stored runs (most recent
+    LIBRARY_MAX_DECKS); nothing is analyzed or stored.
+    
+    Args:
+        audio: Audio recording (webm/wav/mp3)
+        limit: Max decks returned
+        user_id: User whose library is searched (X-User-Id header, required)
+        
+    Returns:
+        Decks ranked by the share of segments they explain
+    """
+    require_session_store()
+    user_id = require_user(user_id)
+    scratch = ScratchSpace()
+    try:
+        with stage("upload", kind="audio") as span:
+            stored_audio = await scratch.save_upload(audio, suffix=".webm")
+            span["bytes"] = stored_audio.size
+        
+        prior_transcript = await find_prior_transcript(user_id, stored_audio.sha256)
+        graph = PipelineGraph()
+        add_audio_stages(graph, stored_audio.path, audio.filename, scratch, transcript=prior_transcript)
+        graph.add("library_match", lambda stt: match_recording(user_id, stt, limit), deps=["stt"])
+        return (await run_pipeline(graph))["library_match"]
+        
+    except HTTPException:
+        raise
+    
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    except ScratchBudgetExceeded as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    
+    except Exception as e:
+        logger.error(f"Library match failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Library match failed: {str(e)}")
+    
+    finally:
+        scratch.cleanup()
+
+
+@app.on_event("startup")
+def configure_inference_threads():
+    """Split the cores between concurrent Whisper/embedding calls"""
+    configure_process()
+
+
+@app.on_event("shutdown")
+def stop_worker_pools():
+    """Stop the STT worker processes"""
+    shutdown_stt_pool()
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus-style metrics (text exposition format)"""
+    return PlainTextResponse(
+        metrics_registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 
 @app.exception_handler(Exception)
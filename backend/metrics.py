@@ -1,8 +1,8 @@
 import re
-from typing import List, Dict
+from typing import List, Dict, Optional
 from collections import Counter
 import logging
-from models import SpeechMetrics, FillerWord, TranscriptData
+from models import SpeechMetrics, FillerWord, SilenceStats, TranscriptData
 from config import settings
 
 logger = logging.getLogger(__name__)
@@ -76,6 +76,54 @@ def count_words(text: str) -> int:
     return len(words)
 
 
+def build_metrics(
+    word_count: int,
+    filler_counts: Dict[str, int],
+    duration: float,
+    silence: Optional[SilenceStats] = None
+) -> SpeechMetrics:
+    """
+    Assemble SpeechMetrics from word and filler counts
+    
+    Args:
+        word_count: Total number of words
+        filler_counts: Filler word -> count
+        duration: Duration in seconds
+        silence: Silence statistics from the VAD pre-pass, if it ran
+        
+    Returns:
+        SpeechMetrics with fillers sorted by count, descending
+    """
+    total_fillers = sum(filler_counts.values())
+    
+    # Calculate WPM
+    wpm = calculate_wpm(word_count, duration)
+    
+    # Convert to FillerWord objects (sorted by count, descending)
+    filler_words = [
+        FillerWord(word=word, count=count)
+        for word, count in sorted(
+            filler_counts.items(),
+            key=lambda x: x[1],
+            reverse=True
+        )
+    ]
+    
+    logger.info(
+        f"Metrics calculated: {word_count} words, "
+        f"{wpm} WPM, {total_fillers} fillers"
+    )
+    
+    return SpeechMetrics(
+        duration_sec=round(duration, 1),
+        word_count=word_count,
+        wpm=wpm,
+        filler_count=total_fillers,
+        filler_words=filler_words,
+        silence=silence
+    )
+
+
 def calculate_metrics(transcript: TranscriptData) -> SpeechMetrics:
     """
     Calculate all speech metrics from transcript
@@ -92,39 +140,54 @@ def calculate_metrics(transcript: TranscriptData) -> SpeechMetrics:
         
         # Detect filler words
         filler_counts = detect_filler_words(transcript.text)
-        total_fillers = sum(filler_counts.values())
-        
-        # Calculate WPM
-        wpm = calculate_wpm(word_count, transcript.duration)
-        
-        # Convert to FillerWord objects (sorted by count, descending)
-        filler_words = [
-            FillerWord(word=word, count=count)
-            for word, count in sorted(
-                filler_counts.items(),
-                key=lambda x: x[1],
-                reverse=True
-            )
-        ]
-        
-        logger.info(
-            f"Metrics calculated: {word_count} words, "
-            f"{wpm} WPM, {total_fillers} fillers"
-        )
         
-        return SpeechMetrics(
-            duration_sec=round(transcript.duration, 1),
-            word_count=word_count,
-            wpm=wpm,
-            filler_count=total_fillers,
-            filler_words=filler_words
-        )
+        return build_metrics(word_count, filler_counts, transcript.duration, transcript.silence)
         
     except Exception as e:
         logger.error(f"Metrics calculation failed: {str(e)}")
         raise RuntimeError(f"Failed to calculate speech metrics: {str(e)}")
 
 
+def update_metrics(
+    previous: SpeechMetrics,
+    removed_text: str,
+    added_text: str,
+    duration: float
+) -> SpeechMetrics:
+    """
+    Metrics after part of the transcript was replaced
+    
+    Only the removed and added text are scanned; the counts of the rest
+    come from the previous metrics. Silence statistics are dropped, as they
+    no longer describe the spliced recording.
+    
+    Args:
+        previous: Metrics of the transcript before the change
+        removed_text: Text of the replaced segments
+        added_text: Text of the new segments
+        duration: New total duration in seconds
+        
+    Returns:
+        SpeechMetrics for the new transcript
+    """
+    try:
+        word_count = previous.word_count - count_words(removed_text) + count_words(added_text)
+        
+        filler_counts = Counter({f.word: f.count for f in previous.filler_words})
+        filler_counts.subtract(detect_filler_words(removed_text))
+        filler_counts.update(detect_filler_words(added_text))
+        
+        return build_metrics(
+            max(0, word_count),
+            {word: count for word, count in filler_counts.items() if count > 0},
+            duration
+        )
+        
+    except Exception as e:
+        logger.error(f"Metrics update failed: {str(e)}")
+        raise RuntimeError(f"Failed to update speech metrics: {str(e)}")
+
+
 def analyze_speaking_pace(wpm: float) -> str:
     """
     Analyze speaking pace quality
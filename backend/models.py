@@ -9,12 +9,25 @@ class TranscriptSegment(BaseModel):
     text: str = Field(description="Transcribed text")
 
 
+class SilenceStats(BaseModel):
+    """Silence removed by the VAD pre-pass (seconds of the original recording)"""
+    original_duration_sec: float
+    kept_duration_sec: float
+    removed_sec: float
+    leading_silence_sec: float = 0.0
+    trailing_silence_sec: float = 0.0
+    pause_count: int = Field(default=0, description="Pauses of at least VAD_MIN_SILENCE_MS between speech")
+    pause_total_sec: float = 0.0
+    longest_pause_sec: float = 0.0
+
+
 class TranscriptData(BaseModel):
     """Complete transcription result"""
     text: str = Field(description="Full transcript")
     segments: List[TranscriptSegment] = Field(description="Time-stamped segments")
     duration: float = Field(description="Total duration in seconds")
     language: str = Field(description="Detected language")
+    silence: Optional[SilenceStats] = Field(default=None, description="Set when silence was trimmed before STT")
 
 
 class FillerWord(BaseModel):
@@ -30,6 +43,19 @@ class SpeechMetrics(BaseModel):
     wpm: float = Field(description="Words per minute")
     filler_count: int
     filler_words: List[FillerWord]
+    silence: Optional[SilenceStats] = None
+
+
+class SectionMatch(BaseModel):
+    """One of a segment's closest outline sections"""
+    section_idx: int
+    score: float
+
+
+class SegmentMatch(BaseModel):
+    """One of an outline section's closest transcript segments"""
+    segment_idx: int
+    score: float
 
 
 class AlignmentItem(BaseModel):
@@ -38,12 +64,27 @@ class AlignmentItem(BaseModel):
     segment_text: str
     best_match: str
     similarity_score: float
+    section_idx: int = Field(default=-1, description="Index of the best matching outline section")
+    top_matches: List[SectionMatch] = Field(default=[], description="Closest sections, best first")
+
+
+class SectionCoverage(BaseModel):
+    """How one outline section was covered"""
+    section_idx: int
+    section: str
+    covered: bool = Field(description="Best match of at least one on-topic segment")
+    hit_count: int = Field(description="On-topic segments whose best match is this section")
+    best_score: float = Field(description="Highest similarity of any segment to this section")
+    top_segments: List[SegmentMatch] = Field(default=[], description="Closest segments, best first")
 
 
 class AlignmentResult(BaseModel):
     """Complete alignment analysis"""
     items: List[AlignmentItem]
     off_topic_segments: List[AlignmentItem]
+    sections: List[SectionCoverage] = Field(default=[], description="Per outline section coverage")
+    section_coverage: float = Field(default=0.0, description="Share of outline sections covered (0-100)")
+    uncovered_sections: List[int] = Field(default=[], description="Indices of sections never covered")
 
 
 class FeedbackTip(BaseModel):
@@ -74,6 +115,7 @@ class SlideAlignmentDetail(BaseModel):
     status: str = Field(description="covered | partial | missing")
     talking_points: List[str] = Field(default=[], description="Suggested talking points (if needed)")
     needs_suggestion: bool = Field(description="Whether this slide needs talking points")
+    source: str = Field(default="llm", description="llm | mixed | local (embedding fallback for some/all blocks)")
 
 
 class SlideBySlideAlignment(BaseModel):
@@ -83,6 +125,24 @@ class SlideBySlideAlignment(BaseModel):
     language: str = Field(description="Detected language (tr/en)")
 
 
+class SlideTimelineEntry(BaseModel):
+    """When one slide was presented"""
+    slide_number: int
+    title: str
+    start_sec: Optional[float] = Field(default=None, description="Start of the first segment on this slide")
+    end_sec: Optional[float] = Field(default=None, description="End of the last segment on this slide")
+    duration_sec: float = Field(default=0.0, description="Time spent on this slide")
+    segment_count: int
+    skipped: bool = Field(description="No segment was assigned to this slide")
+
+
+class SlideTimeline(BaseModel):
+    """Transcript segments aligned to slides in slide order (PRO feature)"""
+    slides: List[SlideTimelineEntry]
+    segment_slides: List[int] = Field(description="Slide number of every transcript segment")
+    skipped_slides: List[int] = Field(description="Slides with no segments")
+
+
 # ============================================================================
 # MAIN RESPONSE MODEL
 # ============================================================================
@@ -100,4 +160,133 @@ class AnalysisResponse(BaseModel):
     slide_alignment: Optional[SlideBySlideAlignment] = Field(
         default=None,
         description="Detailed slide-by-slide analysis (PRO feature)"
-    )
\ No newline at end of file
+    )
+    slide_timeline: Optional[SlideTimeline] = Field(
+        default=None,
+        description="Per-slide timing from an in-order alignment (PRO feature)"
+    )
+    # Set when the LLM was unavailable and local fallbacks were used
+    degraded: bool = Field(
+        default=False,
+        description="True if some results come from local fallbacks instead of the LLM"
+    )
+    degraded_stages: List[str] = Field(
+        default=[],
+        description="Stages answered by a fallback (feedback_llm, slide_alignment, talking_points)"
+    )
+    # Set when the run was saved to the session history
+    session_id: Optional[str] = Field(
+        default=None,
+        description="ID of the stored session (see /api/sessions)"
+    )
+
+# ============================================================================
+# COHORT (BATCH) MODELS
+# ============================================================================
+
+class CohortRecordingResult(BaseModel):
+    """Result for one recording of a cohort"""
+    filename: str
+    result: Optional[AnalysisResponse] = Field(default=None, description="Analysis (if it succeeded)")
+    error: Optional[str] = Field(default=None, description="Why the analysis failed (if it did)")
+
+
+class CohortSlideSummary(BaseModel):
+    """How one slide fared across the cohort"""
+    slide_number: int
+    title: str
+    covered: int = Field(description="Recordings that covered the slide")
+    partial: int = Field(description="Recordings that covered it partially")
+    missing: int = Field(description="Recordings that missed it")
+
+
+class CohortSummary(BaseModel):
+    """Aggregate statistics over the successful recordings"""
+    recording_count: int
+    succeeded: int
+    failed: int
+    avg_wpm: float
+    avg_filler_count: float
+    avg_off_topic_rate: float = Field(description="Mean share of off-topic segments (0-100)")
+    avg_slide_coverage: float = Field(description="Mean overall slide coverage (0-100)")
+    slides: List[CohortSlideSummary] = Field(description="Per-slide coverage counts, most missed first")
+
+
+class CohortAnalysisResponse(BaseModel):
+    """Per-recording results for one deck plus a cohort summary"""
+    recordings: List[CohortRecordingResult]
+    summary: CohortSummary
+    degraded: bool = Field(
+        default=False,
+        description="True if any recording used local fallbacks instead of the LLM"
+    )
+
+
+# ============================================================================
+# SESSION HISTORY MODELS
+# ============================================================================
+
+class SessionSummary(BaseModel):
+    """Headline numbers of one stored practice run"""
+    session_id: str
+    created_at: float = Field(description="Unix timestamp")
+    variant: str = Field(description="free | pro")
+    deck_hash: str
+    deck_name: Optional[str] = None
+    duration_sec: float
+    word_count: int
+    wpm: float
+    filler_count: int
+    filler_rate: float = Field(description="Filler words per minute")
+    off_topic_rate: float = Field(description="Share of off-topic segments (0-100)")
+    slide_coverage: Optional[float] = Field(default=None, description="Overall slide coverage (0-100, PRO only)")
+    degraded: bool = False
+
+
+class SessionList(BaseModel):
+    """A user's stored runs, newest first"""
+    user_id: str
+    sessions: List[SessionSummary]
+
+
+class ProgressDelta(BaseModel):
+    """Change between two runs (later minus earlier)"""
+    from_session: str
+    to_session: str
+    wpm: float
+    filler_rate: float
+    off_topic_rate: float
+    slide_coverage: Optional[float] = Field(default=None, description="Only if both runs were PRO")
+
+
+class ProgressReport(BaseModel):
+    """Trends over a user's runs, oldest first"""
+    user_id: str
+    deck_hash: Optional[str] = Field(default=None, description="Deck the report is limited to, if any")
+    runs: List[SessionSummary]
+    deltas: List[ProgressDelta] = Field(description="Run-to-run changes")
+    overall: Optional[ProgressDelta] = Field(default=None, description="First run to latest run")
+
+
+# ============================================================================
+# DECK LIBRARY
+# ============================================================================
+
+class DeckMatch(BaseModel):
+    """How well a recording matches one of the user's decks"""
+    deck_hash: str
+    deck_name: Optional[str] = None
+    match_rate: float = Field(description="Share of on-topic segments whose closest section is in this deck (0-100)")
+    mean_similarity: float = Field(description="Mean similarity of those segments to their closest section")
+    segment_hits: int
+    last_used: float = Field(description="Unix timestamp of the latest run with this deck")
+
+
+class LibraryMatchResponse(BaseModel):
+    """Which of the user's decks a recording belongs to, best first"""
+    user_id: str
+    deck_count: int = Field(description="Decks searched")
+    segment_count: int
+    on_topic_segments: int = Field(description="Segments close enough to some deck section")
+    matches: List[DeckMatch]
+    best_deck_hash: Optional[str] = None
@@ -0,0 +1,207 @@
+"""
+Pipeline Executor Module
+
+Runs the analysis as a small dependency graph of stages. Each stage names
+the stages whose results it needs; stages whose dependencies are satisfied
+run concurrently, so end-to-end latency approaches the critical path
+(upload -> decode -> STT -> slide analysis) instead of the sum of all steps.
+
+Synchronous stage functions run on a shared thread pool (model inference and
+parsing release the GIL for most of their work); async stage functions run
+on the event loop. Every stage is wrapped in telemetry.stage(), so metrics,
+Server-Timing and trace spans work unchanged.
+
+When a stage fails, the others are cancelled. Threads cannot be interrupted,
+so run_pipeline() waits for stage threads that have already started before
+it raises; callers can then delete the request's files safely.
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from config import settings
+from telemetry import stage
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Get or create the shared stage thread pool (singleton pattern)"""
+    global _executor
+    if _executor is None:
+        workers = settings.PIPELINE_THREADS or min(32, (os.cpu_count() or 1) + 4)
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pipeline")
+        logger.info(f"Pipeline executor started with {workers} threads")
+    return _executor
+
+
+async def run_in_thread(fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run a blocking function on the shared pool from async code
+
+    The current context is copied so the worker thread sees the request's
+    telemetry (run_in_executor does not propagate contextvars by itself).
+    """
+    ctx = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(ctx.run, fn, *args))
+
+
+async def await_to_completion(future: Future) -> Any:
+    """
+    Await a thread or process pool future, even when cancelled
+
+    If the awaiting task is cancelled, a call that has not started is
+    dropped, but one that is already running is waited for (it cannot be
+    interrupted) before CancelledError is re-raised. Use it for work that
+    reads files the caller deletes afterwards.
+    """
+    try:
+        return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        if not future.cancel():
+            await asyncio.wait([asyncio.wrap_future(future)])
+        raise
+
+
+class Stage:
+    """
+    One node of the pipeline graph
+
+    Args:
+        name: Stage name (also the telemetry stage name)
+        fn: Callable receiving the results of `deps` as keyword arguments
+        deps: Names of stages that must finish first
+        attributes: Optional callable mapping dependency results to span
+            attributes (input sizes), evaluated just before the stage runs
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[..., Any],
+        deps: Sequence[str] = (),
+        attributes: Optional[Callable[..., Dict[str, Any]]] = None
+    ):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.attributes = attributes
+
+
+class PipelineGraph:
+    """A set of stages with dependencies, validated as a DAG"""
+
+    def __init__(self):
+        self.stages: Dict[str, Stage] = {}
+
+    def add(
+        self,
+        name: str,
+        fn: Callable[..., Any],
+        deps: Sequence[str] = (),
+        attributes: Optional[Callable[..., Dict[str, Any]]] = None
+    ) -> "PipelineGraph":
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        self.stages[name] = Stage(name, fn, deps, attributes)
+        return self
+
+    def validate(self) -> List[str]:
+        """
+        Check dependencies and return a topological order
+
+        Raises:
+            ValueError: On unknown dependencies or cycles
+        """
+        for s in self.stages.values():
+            for dep in s.deps:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage '{s.name}' depends on unknown stage '{dep}'")
+
+        order: List[str] = []
+        state: Dict[str, int] = {}  # 1 = visiting, 2 = done
+
+        def visit(name: str) -> None:
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                raise ValueError(f"Cycle in pipeline graph at stage '{name}'")
+            state[name] = 1
+            for dep in self.stages[name].deps:
+                visit(dep)
+            state[name] = 2
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+
+async def _run_stage(s: Stage, results: Dict[str, Any]) -> Any:
+    kwargs = {dep: results[dep] for dep in s.deps}
+    attributes = s.attributes(**kwargs) if s.attributes else {}
+
+    if asyncio.iscoroutinefunction(s.fn):
+        with stage(s.name, **attributes):
+            return await s.fn(**kwargs)
+
+    def call() -> Any:
+        with stage(s.name, **attributes):
+            return s.fn(**kwargs)
+
+    ctx = contextvars.copy_context()
+    return await await_to_completion(get_executor().submit(ctx.run, call))
+
+
+async def run_pipeline(graph: PipelineGraph) -> Dict[str, Any]:
+    """
+    Execute every stage as soon as its dependencies are done
+
+    Args:
+        graph: Pipeline graph
+
+    Returns:
+        Dict of stage name -> result
+
+    Raises:
+        The first exception raised by any stage, once the other stages are
+        cancelled (those not started yet) or finished (threads already
+        running; their results are discarded)
+    """
+    graph.validate()
+    results: Dict[str, Any] = {}
+    pending = dict(graph.stages)
+    running: Dict[asyncio.Task, str] = {}
+
+    try:
+        while pending or running:
+            ready = [
+                s for s in pending.values()
+                if all(dep in results for dep in s.deps)
+            ]
+            for s in ready:
+                del pending[s.name]
+                running[asyncio.ensure_future(_run_stage(s, results))] = s.name
+
+            if not running:
+                raise RuntimeError(f"Pipeline stalled with pending stages: {list(pending)}")
+
+            done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = running.pop(task)
+                results[name] = task.result()  # re-raises stage errors
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+
+    return results
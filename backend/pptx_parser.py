@@ -5,6 +5,7 @@ Extracts structured slide data (titles, bullets) from PowerPoint files.
 This is different from file_utils.py which extracts raw text.
 """
 
+import hashlib
 import logging
 from typing import List, Dict
 from pptx import Presentation
@@ -12,6 +13,17 @@ from pptx import Presentation
 logger = logging.getLogger(__name__)
 
 
+def slide_content_hash(slide: Dict[str, str]) -> str:
+    """
+    Hash of a slide's title and bullets
+    
+    Identifies an unchanged slide across edited versions of a deck, so its
+    analysis can be reused when the rest of the deck changes.
+    """
+    content = f"{slide.get('title', '')}\x00{slide.get('bullets', '')}"
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
 def extract_slides_structured(pptx_path: str) -> List[Dict[str, str]]:
     """
     Extract structured slide data from PPTX file
@@ -20,13 +32,14 @@ def extract_slides_structured(pptx_path: str) -> List[Dict[str, str]]:
         pptx_path: Path to .pptx file
         
     Returns:
-        List of slides with 'title' and 'bullets' keys
+        List of slides with 'title', 'bullets' and 'content_hash' keys
         
     Example:
         [
             {
                 "title": "Introduction to Cloud",
-                "bullets": "• AWS services\n• Azure platform\n• Google Cloud"
+                "bullets": "• AWS services\n• Azure platform\n• Google Cloud",
+                "content_hash": "3f1a..."
             },
             ...
         ]
@@ -64,6 +77,7 @@ def extract_slides_structured(pptx_path: str) -> List[Dict[str, str]]:
                     "title": title or f"Slide {slide_num}",
                     "bullets": "\n".join(bullets)
                 }
+                slide_data["content_hash"] = slide_content_hash(slide_data)
                 slides_data.append(slide_data)
                 logger.debug(f"Slide {slide_num}: {title} ({len(bullets)} bullets)")
         
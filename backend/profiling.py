@@ -0,0 +1,193 @@
+"""
+Request Profiling Module
+
+Opt-in CPU and memory profiling of individual analysis requests. A request
+is profiled when it carries the profiling header (PROFILE_HEADER: 1) or is
+picked by PROFILE_SAMPLE_RATE. While it runs, a background thread samples
+the Python stacks of every other thread, and tracemalloc records
+allocations. Two files are written to PROFILE_DIR, keyed by request ID:
+
+    <request_id>.folded     collapsed stacks (flamegraph.pl / speedscope input)
+    <request_id>.alloc.txt  top allocation sites by size
+
+The middleware is only installed when PROFILE_ENABLED is set, so there is
+no per-request cost otherwise.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Optional
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from config import settings
+from telemetry import current_request
+
+logger = logging.getLogger(__name__)
+
+# tracemalloc is process-global; overlapping profiled requests share it
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+
+
+def _tracemalloc_acquire() -> bool:
+    """Start tracemalloc if needed; returns True if this caller owns tracing"""
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and tracemalloc.is_tracing():
+            return False  # someone else (e.g. PYTHONTRACEMALLOC) is tracing
+        if _tracemalloc_users == 0:
+            tracemalloc.start(settings.PROFILE_TRACEMALLOC_FRAMES)
+        _tracemalloc_users += 1
+        return True
+
+
+def _tracemalloc_release() -> None:
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0:
+            tracemalloc.stop()
+
+
+class StackSampler:
+    """
+    Wall-clock sampling profiler
+
+    Every interval the sampler records the current stack of each thread
+    (except itself) as a folded "outer;...;inner" string and counts how often
+    each stack was seen.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class RequestProfile:
+    """Profiler state for a single request"""
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.sampler = StackSampler(settings.PROFILE_INTERVAL_MS / 1000.0)
+        self.owns_tracemalloc = False
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+        self.peak_bytes = 0
+        self.started = 0.0
+        self.elapsed = 0.0
+
+    def start(self) -> None:
+        self.owns_tracemalloc = _tracemalloc_acquire()
+        if self.owns_tracemalloc:
+            tracemalloc.reset_peak()
+        self.started = time.perf_counter()
+        self.sampler.start()
+
+    def stop(self) -> None:
+        self.sampler.stop()
+        self.elapsed = time.perf_counter() - self.started
+        if self.owns_tracemalloc:
+            self.snapshot = tracemalloc.take_snapshot()
+            _, self.peak_bytes = tracemalloc.get_traced_memory()
+            _tracemalloc_release()
+
+    def write(self, directory: str) -> None:
+        """Write the folded stacks and allocation report (blocking)"""
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.request_id)
+
+        with open(f"{base}.folded", "w", encoding="utf-8") as f:
+            f.write(self.sampler.folded())
+
+        lines = [
+            f"request_id: {self.request_id}",
+            f"wall_time_s: {self.elapsed:.3f}",
+            f"stack_samples: {sum(self.sampler.samples.values())}",
+        ]
+        if self.snapshot is None:
+            lines.append("allocations: unavailable (tracemalloc in use elsewhere)")
+        else:
+            lines.append(f"peak_traced_bytes: {self.peak_bytes}")
+            lines.append("")
+            lines.append(f"Top {settings.PROFILE_TOP_ALLOCATIONS} allocation sites by size:")
+            stats = self.snapshot.statistics("traceback")
+            for stat in stats[:settings.PROFILE_TOP_ALLOCATIONS]:
+                lines.append(f"{stat.size / 1024:10.1f} KiB  {stat.count:8d} blocks")
+                lines.extend(f"    {line}" for line in stat.traceback.format())
+        with open(f"{base}.alloc.txt", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+        logger.info(f"Profile written: {base}.folded, {base}.alloc.txt")
+
+
+class ProfilingMiddleware:
+    """Profiles requests to the analysis endpoints on demand or by sampling"""
+
+    def __init__(self, app: ASGIApp, paths=("/api/analyze", "/api/analyze-pro")):
+        self.app = app
+        self.paths = set(paths)
+        self.header = settings.PROFILE_HEADER.lower().encode("latin-1")
+
+    def _should_profile(self, scope: Scope) -> bool:
+        if scope["type"] != "http" or scope.get("path") not in self.paths:
+            return False
+        for name, value in scope.get("headers", []):
+            if name == self.header:
+                return value.strip() in (b"1", b"true", b"yes")
+        return settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        request = current_request()
+        request_id = request.request_id if request is not None else f"req-{time.time_ns()}"
+        profile = RequestProfile(request_id)
+        logger.info(f"Profiling request {request_id} ({scope.get('path')})")
+
+        profile.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profile.stop()
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, profile.write, settings.PROFILE_DIR)
+            except OSError as e:
+                logger.warning(f"Failed to write profile for {request_id}: {e}")
@@ -0,0 +1,175 @@
+"""
+CPU Resource Policy Module
+
+By default every torch call starts as many intra-op threads as there are
+cores. With several requests running Whisper and the embedding model at
+once, N concurrent calls each start N threads, the CPU is oversubscribed
+and throughput collapses. The policy splits the cores instead:
+
+- API process: at most INFERENCE_SLOTS inference calls run at once
+  (inference_slot()), each with TORCH_INTRA_OP_THREADS threads, so
+  slots x threads stays at the core count
+- worker processes (STT pool, bulk CLI): each gets cores / workers
+  threads and, with CPU_AFFINITY, its own disjoint set of cores
+
+Leaving both settings at 0 uses min(4, cores) threads per call. Tune them
+for a node with benchmarks/concurrency.py.
+"""
+
+import contextlib
+import logging
+import os
+import threading
+from queue import Empty
+from typing import Any, Iterator, List, NamedTuple, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Thread pools of the numeric libraries torch and numpy may use; they read
+# these when first imported, so workers set them before importing torch
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+_slots: Optional[threading.BoundedSemaphore] = None
+_slots_lock = threading.Lock()
+
+
+def usable_cpus() -> List[int]:
+    """Cores this process may run on (respects taskset/cgroup affinity)"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+class InferencePolicy(NamedTuple):
+    """How the API process runs model inference"""
+    slots: int  # concurrent inference calls
+    intra_op_threads: int  # torch threads per call
+    inter_op_threads: int
+
+
+def inference_policy() -> InferencePolicy:
+    """
+    The API process policy from the settings
+
+    Whichever of INFERENCE_SLOTS and TORCH_INTRA_OP_THREADS is 0 is derived
+    from the other so that slots x threads matches the usable cores.
+    """
+    cores = len(usable_cpus())
+    slots = settings.INFERENCE_SLOTS
+    threads = settings.TORCH_INTRA_OP_THREADS
+    if not threads:
+        threads = max(1, cores // slots) if slots else min(4, cores)
+    if not slots:
+        slots = max(1, cores // threads)
+    if slots * threads > cores:
+        logger.warning(f"Inference policy oversubscribes: {slots} slots x {threads} threads on {cores} cores")
+    return InferencePolicy(slots, threads, settings.TORCH_INTER_OP_THREADS)
+
+
+def threads_per_process(processes: int) -> int:
+    """Torch threads each of `processes` workers may use without oversubscribing"""
+    return max(1, len(usable_cpus()) // max(1, processes))
+
+
+def set_torch_threads(intra_op: int, inter_op: Optional[int] = None) -> None:
+    """
+    Set torch intra-op (and inter-op) threads in this process
+
+    The inter-op pool can only be sized before torch first uses it, so a
+    late call only changes the intra-op threads. No-op without torch.
+    """
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(intra_op)
+    if inter_op:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError:
+            logger.debug("torch inter-op threads already fixed for this process")
+
+
+def cpu_sets(groups: int) -> List[List[int]]:
+    """Split the usable cores into `groups` disjoint, contiguous sets"""
+    cpus = usable_cpus()
+    groups = max(1, min(groups, len(cpus)))
+    size, extra = divmod(len(cpus), groups)
+    sets, start = [], 0
+    for i in range(groups):
+        end = start + size + (1 if i < extra else 0)
+        sets.append(cpus[start:end])
+        start = end
+    return sets
+
+
+def pin_to_cpus(cpus: List[int]) -> bool:
+    """Restrict this process to `cpus` (Linux only; returns False elsewhere)"""
+    if not cpus or not hasattr(os, "sched_setaffinity"):
+        return False
+    try:
+        os.sched_setaffinity(0, cpus)
+        return True
+    except OSError as e:
+        logger.warning(f"Could not pin process to CPUs {cpus}: {e}")
+        return False
+
+
+def worker_cpu_queue(mp_context: Any, workers: int) -> Optional[Any]:
+    """
+    Queue of per-worker core sets for init_worker_resources()
+
+    Returns:
+        A queue holding one core set per worker, or None without CPU_AFFINITY
+    """
+    if not settings.CPU_AFFINITY:
+        return None
+    queue = mp_context.Queue()
+    for cpus in cpu_sets(workers):
+        queue.put(cpus)
+    return queue
+
+
+def init_worker_resources(threads: int, cpu_queue: Optional[Any] = None) -> None:
+    """
+    Apply the policy in a freshly started worker process
+
+    Must run before torch is imported (pool initializer). Takes a core set
+    from `cpu_queue` if one is given; workers beyond the number of sets run
+    unpinned.
+    """
+    for var in _THREAD_ENV_VARS:
+        os.environ[var] = str(threads)
+    if cpu_queue is not None:
+        try:
+            cpus = cpu_queue.get_nowait()
+        except Empty:
+            cpus = None
+        if cpus and pin_to_cpus(cpus):
+            logger.info(f"Worker {os.getpid()} pinned to CPUs {cpus}")
+    set_torch_threads(threads, settings.TORCH_INTER_OP_THREADS)
+
+
+def configure_process() -> InferencePolicy:
+    """Apply the inference policy to the API process (call once at startup)"""
+    policy = inference_policy()
+    set_torch_threads(policy.intra_op_threads, policy.inter_op_threads)
+    logger.info(
+        f"Inference policy: {policy.slots} concurrent calls x {policy.intra_op_threads} "
+        f"intra-op threads ({policy.inter_op_threads} inter-op)"
+    )
+    return policy
+
+
+@contextlib.contextmanager
+def inference_slot() -> Iterator[None]:
+    """Hold one of the INFERENCE_SLOTS while running a model call"""
+    global _slots
+    if _slots is None:
+        with _slots_lock:
+            if _slots is None:
+                _slots = threading.BoundedSemaphore(inference_policy().slots)
+    with _slots:
+        yield
@@ -0,0 +1,237 @@
+"""
+Scratch Space Module
+
+Gives every request its own private workspace for uploads, converted audio
+and parsed decks. Small files live on a memory-backed filesystem (tmpfs)
+when one is available, large files go to the regular temp directory, and
+the whole workspace is removed in one step when the request finishes.
+
+tmpfs is small (Docker gives /dev/shm 64 MB by default), so a file only
+goes there while the tmpfs has room for it, and a write that still runs
+out of space there is redone on disk.
+"""
+
+import errno
+import itertools
+import logging
+import os
+import shutil
+import tempfile
+from typing import Callable, Optional, TypeVar
+
+from fastapi import UploadFile
+
+from config import settings
+from upload_utils import StoredUpload, UploadTooLargeError, max_upload_bytes, save_upload
+
+logger = logging.getLogger(__name__)
+
+# Candidate memory-backed directories, checked in order
+_MEMORY_DIRS = ("/dev/shm", "/run/shm")
+
+
+T = TypeVar("T")
+
+
+class ScratchBudgetExceeded(RuntimeError):
+    """Raised when a request writes more than its scratch byte budget"""
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        super().__init__(
+            f"Request needs more than its {budget_bytes // (1024 * 1024)} MB of working space "
+            f"(all uploads plus converted audio)"
+        )
+
+
+def is_out_of_space(error: BaseException) -> bool:
+    """Whether an error (or one it was raised from) is ENOSPC"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, OSError) and error.errno == errno.ENOSPC:
+            return True
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def _memory_base_dir() -> Optional[str]:
+    """Return a writable tmpfs directory, or None if there is none"""
+    if settings.SCRATCH_MEMORY_DIR:
+        candidates = (settings.SCRATCH_MEMORY_DIR,)
+    else:
+        candidates = _MEMORY_DIRS
+    for candidate in candidates:
+        if os.path.isdir(candidate) and os.access(candidate, os.W_OK):
+            return candidate
+    return None
+
+
+class ScratchSpace:
+    """
+    Per-request workspace with guaranteed cleanup and a byte budget
+
+    Usage:
+        with ScratchSpace() as scratch:
+            wav_path = scratch.path(".wav", expected_size=n_bytes)
+            ...
+    """
+
+    def __init__(self, budget_bytes: Optional[int] = None, prefix: str = "cm_"):
+        self.budget_bytes = (
+            budget_bytes if budget_bytes is not None
+            else settings.SCRATCH_BUDGET_MB * 1024 * 1024
+        )
+        self.used_bytes = 0
+        self._prefix = prefix
+        self._counter = itertools.count()
+        self._memory_dir: Optional[str] = None
+        self._disk_dir: Optional[str] = None
+
+        memory_base = _memory_base_dir()
+        if memory_base:
+            try:
+                self._memory_dir = tempfile.mkdtemp(prefix=prefix, dir=memory_base)
+            except OSError as e:
+                logger.warning(f"Memory-backed scratch unavailable ({e}), using disk")
+
+    @property
+    def remaining_bytes(self) -> int:
+        return max(self.budget_bytes - self.used_bytes, 0)
+
+    def _get_disk_dir(self) -> str:
+        if self._disk_dir is None:
+            self._disk_dir = tempfile.mkdtemp(prefix=self._prefix, dir=settings.SCRATCH_DISK_DIR or None)
+        return self._disk_dir
+
+    def _memory_has_room(self, nbytes: int) -> bool:
+        try:
+            stats = os.statvfs(self._memory_dir)
+        except (OSError, AttributeError):  # AttributeError: no statvfs (Windows)
+            return False
+        return nbytes <= stats.f_bavail * stats.f_frsize
+
+    def directory_for(self, expected_size: Optional[int] = None) -> str:
+        """
+        Pick the directory for a file of the given size
+
+        Files at or below SCRATCH_MEMORY_THRESHOLD go to tmpfs when available
+        and it currently has room for them; unknown or larger sizes go to disk.
+        """
+        threshold = settings.SCRATCH_MEMORY_THRESHOLD_MB * 1024 * 1024
+        if (
+            self._memory_dir
+            and expected_size is not None
+            and expected_size <= threshold
+            and self._memory_has_room(expected_size)
+        ):
+            return self._memory_dir
+        return self._get_disk_dir()
+
+    def in_memory(self, file_path: str) -> bool:
+        """Whether a workspace path lies on the tmpfs"""
+        return self._memory_dir is not None and os.path.dirname(file_path) == self._memory_dir
+
+    def path(self, suffix: str = "", expected_size: Optional[int] = None) -> str:
+        """
+        Reserve a unique file path inside this workspace
+
+        Args:
+            suffix: File suffix (e.g. ".wav")
+            expected_size: Expected file size in bytes, used for placement
+
+        Returns:
+            Absolute path that no other request can collide with
+        """
+        directory = self.directory_for(expected_size)
+        return os.path.join(directory, f"f{next(self._counter)}{suffix}")
+
+    def write_file(self, write: Callable[[str], T], suffix: str = "", expected_size: Optional[int] = None) -> T:
+        """
+        Let `write` create a file at a new workspace path, redoing it on disk
+        if the tmpfs runs out of space
+
+        Args:
+            write: Called with the path; returns whatever the caller needs
+            suffix: File suffix (e.g. ".wav")
+            expected_size: Expected file size in bytes, used for placement
+
+        Returns:
+            The result of `write`
+        """
+        file_path = self.path(suffix, expected_size)
+        try:
+            return write(file_path)
+        except Exception as e:
+            if not (self.in_memory(file_path) and is_out_of_space(e)):
+                raise
+            _remove_quietly(file_path)
+            logger.warning("Memory-backed scratch is full, writing to disk instead")
+            return write(os.path.join(self._get_disk_dir(), f"f{next(self._counter)}{suffix}"))
+
+    def account(self, nbytes: int) -> None:
+        """
+        Charge bytes against the budget
+
+        Raises:
+            ScratchBudgetExceeded: If the budget is exhausted
+        """
+        self.used_bytes += nbytes
+        if self.used_bytes > self.budget_bytes:
+            raise ScratchBudgetExceeded(self.budget_bytes)
+
+    def account_file(self, file_path: str) -> None:
+        """Charge the size of a file written into the workspace"""
+        self.account(os.path.getsize(file_path))
+
+    async def save_upload(self, upload: UploadFile, suffix: str = "") -> StoredUpload:
+        """
+        Stream an upload into the workspace, bounded by both the per-file
+        limit and the remaining budget
+
+        Raises:
+            UploadTooLargeError: If the file is over the per-file limit
+            ScratchBudgetExceeded: If it is within that limit but over the
+                remaining budget
+        """
+        file_limit = max_upload_bytes()
+        max_bytes = min(file_limit, self.remaining_bytes)
+        directory = self.directory_for(upload.size)
+        try:
+            try:
+                stored = await save_upload(upload, suffix=suffix, max_bytes=max_bytes, directory=directory)
+            except OSError as e:
+                if directory != self._memory_dir or not is_out_of_space(e):
+                    raise
+                logger.warning("Memory-backed scratch is full, writing upload to disk instead")
+                await upload.seek(0)
+                stored = await save_upload(upload, suffix=suffix, max_bytes=max_bytes, directory=self._get_disk_dir())
+        except UploadTooLargeError:
+            over_file_limit = upload.size is not None and upload.size > file_limit
+            if max_bytes < file_limit and not over_file_limit:
+                raise ScratchBudgetExceeded(self.budget_bytes)
+            raise
+        self.account(stored.size)
+        return stored
+
+    def cleanup(self) -> None:
+        """Remove every file in the workspace"""
+        for directory in (self._memory_dir, self._disk_dir):
+            if directory:
+                shutil.rmtree(directory, ignore_errors=True)
+                logger.debug(f"Cleaned up scratch dir: {directory}")
+        self._memory_dir = None
+        self._disk_dir = None
+
+    def __enter__(self) -> "ScratchSpace":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.cleanup()
+
+
+def _remove_quietly(file_path: str) -> None:
+    try:
+        os.remove(file_path)
+    except OSError:
+        pass
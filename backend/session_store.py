@@ -0,0 +1,510 @@
+"""
+Session History Module
+
+Keeps every practice run in a local SQLite database so users can look back
+at earlier runs and see their progress without re-running the pipeline.
+
+Runs are only stored for a known user (X-User-Id) and are addressed by a
+random session ID, so IDs cannot be guessed or enumerated.
+
+Each run is one row: the headline numbers (WPM, filler rate, off-topic
+rate, slide coverage) as plain columns, so listing and trend queries never
+touch the bulky parts, and the transcript, metrics, alignment, slide
+results and feedback as zlib-compressed JSON blobs. Rows are indexed by
+user, deck hash and time, and by user and audio hash so a re-sent
+recording can reuse its stored transcript instead of running STT again.
+
+Per-slide results (alignment checks and talking points) are kept in a
+second table keyed by transcript hash, slide content hash and language, so
+re-running the same recording against an edited deck only analyzes the
+slides that were added or changed. Results that came from local fallbacks
+are not kept, so those slides are asked to the LLM again next time.
+
+SQLite calls block; call them through pipeline.run_in_thread() from async
+code.
+"""
+
+import json
+import logging
+import secrets
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+from config import settings
+from models import (
+    AlignmentResult, AnalysisResponse, Feedback, ProgressDelta, ProgressReport,
+    SessionSummary, SlideBySlideAlignment, SpeechMetrics, TranscriptData
+)
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    public_id TEXT,
+    user_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    variant TEXT NOT NULL,
+    deck_hash TEXT NOT NULL,
+    deck_name TEXT,
+    audio_sha256 TEXT NOT NULL,
+    duration_sec REAL NOT NULL,
+    word_count INTEGER NOT NULL,
+    wpm REAL NOT NULL,
+    filler_count INTEGER NOT NULL,
+    filler_rate REAL NOT NULL,
+    off_topic_rate REAL NOT NULL,
+    slide_coverage REAL,
+    degraded INTEGER NOT NULL,
+    transcript BLOB NOT NULL,
+    metrics BLOB NOT NULL,
+    alignment BLOB NOT NULL,
+    slides BLOB,
+    feedback BLOB NOT NULL,
+    extra BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_user_deck_time ON sessions (user_id, deck_hash, created_at);
+CREATE INDEX IF NOT EXISTS sessions_user_time ON sessions (user_id, created_at);
+CREATE INDEX IF NOT EXISTS sessions_user_audio ON sessions (user_id, audio_sha256);
+CREATE TABLE IF NOT EXISTS slide_results (
+    transcript_hash TEXT NOT NULL,
+    slide_hash TEXT NOT NULL,
+    language TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    result BLOB NOT NULL,
+    PRIMARY KEY (transcript_hash, slide_hash, language)
+);
+"""
+
+# Per-slide fields worth keeping (the rest depends on the slide's position)
+_SLIDE_RESULT_FIELDS = ("alignment_details", "source", "talking_points", "talking_points_fallback")
+
+_SUMMARY_COLUMNS = (
+    "public_id, created_at, variant, deck_hash, deck_name, duration_sec, word_count, wpm, "
+    "filler_count, filler_rate, off_topic_rate, slide_coverage, degraded"
+)
+
+
+def new_session_id() -> str:
+    """Random, unguessable ID of a stored run"""
+    return secrets.token_urlsafe(16)
+
+
+def _add_public_ids(conn: sqlite3.Connection) -> None:
+    """Give runs stored before random session IDs existed one"""
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(sessions)")}
+    with conn:
+        if "public_id" not in columns:
+            conn.execute("ALTER TABLE sessions ADD COLUMN public_id TEXT")
+        rows = conn.execute("SELECT id FROM sessions WHERE public_id IS NULL").fetchall()
+        conn.executemany(
+            "UPDATE sessions SET public_id = ? WHERE id = ?",
+            [(new_session_id(), row["id"]) for row in rows]
+        )
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS sessions_public_id ON sessions (public_id)")
+
+
+def _pack(model: Any) -> bytes:
+    return zlib.compress(model.model_dump_json().encode("utf-8"))
+
+
+def _unpack(blob: bytes) -> str:
+    return zlib.decompress(blob).decode("utf-8")
+
+
+def _summary_from_row(row: sqlite3.Row) -> SessionSummary:
+    return SessionSummary(
+        session_id=row["public_id"],
+        created_at=row["created_at"],
+        variant=row["variant"],
+        deck_hash=row["deck_hash"],
+        deck_name=row["deck_name"],
+        duration_sec=row["duration_sec"],
+        word_count=row["word_count"],
+        wpm=row["wpm"],
+        filler_count=row["filler_count"],
+        filler_rate=row["filler_rate"],
+        off_topic_rate=row["off_topic_rate"],
+        slide_coverage=row["slide_coverage"],
+        degraded=bool(row["degraded"])
+    )
+
+
+def headline_numbers(response: AnalysisResponse) -> Dict[str, Any]:
+    """
+    The per-run numbers used for listing and progress
+
+    Args:
+        response: Complete analysis result
+
+    Returns:
+        Dict with the summary columns of a session row
+    """
+    metrics = response.metrics
+    items = response.alignment.items
+    minutes = metrics.duration_sec / 60 if metrics.duration_sec > 0 else 0.0
+    return {
+        "duration_sec": metrics.duration_sec,
+        "word_count": metrics.word_count,
+        "wpm": metrics.wpm,
+        "filler_count": metrics.filler_count,
+        "filler_rate": round(metrics.filler_count / minutes, 2) if minutes else 0.0,
+        "off_topic_rate": round(len(response.alignment.off_topic_segments) / len(items) * 100, 1) if items else 0.0,
+        "slide_coverage": response.slide_alignment.overall_coverage if response.slide_alignment else None,
+    }
+
+
+def progress_delta(earlier: SessionSummary, later: SessionSummary) -> ProgressDelta:
+    """Change from one run to a later one"""
+    coverage = None
+    if earlier.slide_coverage is not None and later.slide_coverage is not None:
+        coverage = round(later.slide_coverage - earlier.slide_coverage, 1)
+    return ProgressDelta(
+        from_session=earlier.session_id,
+        to_session=later.session_id,
+        wpm=round(later.wpm - earlier.wpm, 1),
+        filler_rate=round(later.filler_rate - earlier.filler_rate, 2),
+        off_topic_rate=round(later.off_topic_rate - earlier.off_topic_rate, 1),
+        slide_coverage=coverage
+    )
+
+
+class SessionStore:
+    """
+    SQLite-backed history of analysis runs
+
+    A connection is opened per call (cheap for SQLite) so the store can be
+    used from any pipeline thread; WAL mode lets reads run during writes.
+
+    Args:
+        path: Database file (":memory:" is not supported, use a temp file)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript(_SCHEMA)
+                    _add_public_ids(conn)
+                    self._initialized = True
+        return conn
+
+    def save_session(
+        self,
+        user_id: str,
+        variant: str,
+        deck_hash: str,
+        audio_sha256: str,
+        response: AnalysisResponse,
+        deck_name: Optional[str] = None,
+        outline_text: Optional[str] = None,
+        slides: Optional[List[Dict[str, str]]] = None
+    ) -> str:
+        """
+        Store one run
+
+        Args:
+            user_id: Who practiced
+            variant: Endpoint variant ("free" or "pro")
+            deck_hash: Hash of the deck file or outline text
+            audio_sha256: Hash of the uploaded audio
+            response: The analysis result
+            deck_name: Original deck file name, if any
+            outline_text: Outline the run was analyzed against (kept so the
+                run can be updated later without the deck, e.g. splicing)
+            slides: Structured slides of a PRO run
+
+        Returns:
+            The new (random) session ID
+        """
+        numbers = headline_numbers(response)
+        extra = {
+            "hitl_focus_options": response.hitl_focus_options,
+            "degraded_stages": response.degraded_stages,
+            "slide_timeline": response.slide_timeline.model_dump() if response.slide_timeline else None,
+            "outline_text": outline_text,
+            "slides": slides,
+        }
+        row = {
+            "public_id": new_session_id(),
+            "user_id": user_id,
+            "created_at": time.time(),
+            "variant": variant,
+            "deck_hash": deck_hash,
+            "deck_name": deck_name,
+            "audio_sha256": audio_sha256,
+            **numbers,
+            "degraded": int(response.degraded),
+            "transcript": _pack(response.transcript),
+            "metrics": _pack(response.metrics),
+            "alignment": _pack(response.alignment),
+            "slides": _pack(response.slide_alignment) if response.slide_alignment else None,
+            "feedback": _pack(response.feedback),
+            "extra": zlib.compress(json.dumps(extra, ensure_ascii=False).encode("utf-8")),
+        }
+        columns = ", ".join(row)
+        placeholders = ", ".join(f":{name}" for name in row)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(f"INSERT INTO sessions ({columns}) VALUES ({placeholders})", row)
+            return row["public_id"]
+        finally:
+            conn.close()
+
+    def list_sessions(
+        self,
+        user_id: str,
+        deck_hash: Optional[str] = None,
+        limit: int = 100
+    ) -> List[SessionSummary]:
+        """A user's runs, newest first (summary columns only)"""
+        query = f"SELECT {_SUMMARY_COLUMNS} FROM sessions WHERE user_id = ?"
+        params: List[Any] = [user_id]
+        if deck_hash:
+            query += " AND deck_hash = ?"
+            params.append(deck_hash)
+        query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit)
+
+        conn = self._connect()
+        try:
+            return [_summary_from_row(row) for row in conn.execute(query, params)]
+        finally:
+            conn.close()
+
+    def get_session(self, user_id: str, session_id: str) -> Optional[AnalysisResponse]:
+        """The full stored result of one run (None if not found for this user)"""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT public_id, degraded, transcript, metrics, alignment, slides, feedback, extra "
+                "FROM sessions WHERE public_id = ? AND user_id = ?",
+                (session_id, user_id)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+
+        extra = json.loads(_unpack(row["extra"]))
+        return AnalysisResponse(
+            transcript=TranscriptData.model_validate_json(_unpack(row["transcript"])),
+            metrics=SpeechMetrics.model_validate_json(_unpack(row["metrics"])),
+            alignment=AlignmentResult.model_validate_json(_unpack(row["alignment"])),
+            feedback=Feedback.model_validate_json(_unpack(row["feedback"])),
+            slide_alignment=SlideBySlideAlignment.model_validate_json(_unpack(row["slides"])) if row["slides"] else None,
+            degraded=bool(row["degraded"]),
+            session_id=row["public_id"],
+            hitl_focus_options=extra["hitl_focus_options"],
+            degraded_stages=extra["degraded_stages"],
+            slide_timeline=extra.get("slide_timeline")
+        )
+
+    def get_session_inputs(self, user_id: str, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        What a run was analyzed against (None if not found for this user)
+
+        Returns:
+            Dict with variant, deck_hash, deck_name, audio_sha256,
+            outline_text and slides (the last two may be None)
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT variant, deck_hash, deck_name, audio_sha256, extra "
+                "FROM sessions WHERE public_id = ? AND user_id = ?",
+                (session_id, user_id)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+
+        extra = json.loads(_unpack(row["extra"]))
+        return {
+            "variant": row["variant"],
+            "deck_hash": row["deck_hash"],
+            "deck_name": row["deck_name"],
+            "audio_sha256": row["audio_sha256"],
+            "outline_text": extra.get("outline_text"),
+            "slides": extra.get("slides"),
+        }
+
+    def find_transcript(self, user_id: str, audio_sha256: str) -> Optional[TranscriptData]:
+        """Transcript of the latest run of the same audio by this user, if any"""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT transcript FROM sessions WHERE user_id = ? AND audio_sha256 = ? "
+                "ORDER BY created_at DESC LIMIT 1",
+                (user_id, audio_sha256)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return TranscriptData.model_validate_json(_unpack(row["transcript"]))
+
+    def progress(
+        self,
+        user_id: str,
+        deck_hash: Optional[str] = None,
+        limit: int = 100
+    ) -> ProgressReport:
+        """
+        WPM, filler and coverage trends over a user's latest runs
+
+        Computed from the summary columns only; nothing is re-analyzed.
+
+        Args:
+            user_id: Whose runs
+            deck_hash: Limit to runs of one deck (all decks if None)
+            limit: How many of the latest runs to include
+
+        Returns:
+            ProgressReport with runs oldest first and run-to-run deltas
+        """
+        runs = list(reversed(self.list_sessions(user_id, deck_hash, limit)))
+        deltas = [progress_delta(a, b) for a, b in zip(runs, runs[1:])]
+        return ProgressReport(
+            user_id=user_id,
+            deck_hash=deck_hash,
+            runs=runs,
+            deltas=deltas,
+            overall=progress_delta(runs[0], runs[-1]) if len(runs) > 1 else None
+        )
+
+    def list_decks(self, user_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        The decks a user has practiced with, most recently used first
+
+        Args:
+            user_id: Whose decks
+            limit: How many decks to return
+
+        Returns:
+            Dicts with deck_hash, deck_name, last_used, run_count and the
+            outline_text of the latest run (None for runs stored without it)
+        """
+        conn = self._connect()
+        try:
+            # SQLite takes the bare columns from the row holding MAX(created_at)
+            rows = conn.execute(
+                "SELECT deck_hash, deck_name, extra, MAX(created_at) AS last_used, COUNT(*) AS run_count "
+                "FROM sessions WHERE user_id = ? GROUP BY deck_hash ORDER BY last_used DESC LIMIT ?",
+                (user_id, limit)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [
+            {
+                "deck_hash": row["deck_hash"],
+                "deck_name": row["deck_name"],
+                "last_used": row["last_used"],
+                "run_count": row["run_count"],
+                "outline_text": json.loads(_unpack(row["extra"])).get("outline_text"),
+            }
+            for row in rows
+        ]
+
+    def slide_results(
+        self,
+        transcript_hash: str,
+        language: str,
+        slide_hashes: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Stored per-slide results for a transcript
+
+        Args:
+            transcript_hash: Hash of the transcript text
+            language: Analysis language
+            slide_hashes: Content hashes of the deck's slides
+
+        Returns:
+            {slide hash: result} for the slides that have one
+        """
+        if not slide_hashes:
+            return {}
+        unique = sorted(set(slide_hashes))
+        placeholders = ", ".join("?" for _ in unique)
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT slide_hash, result FROM slide_results "
+                f"WHERE transcript_hash = ? AND language = ? AND slide_hash IN ({placeholders})",
+                [transcript_hash, language, *unique]
+            ).fetchall()
+        finally:
+            conn.close()
+        return {row["slide_hash"]: json.loads(_unpack(row["result"])) for row in rows}
+
+    def save_slide_results(
+        self,
+        transcript_hash: str,
+        language: str,
+        slides: List[Dict[str, Any]],
+        block_count: int
+    ) -> int:
+        """
+        Keep the per-slide results of an analysis for later re-runs
+
+        Only complete LLM answers are kept: reused slides, slides answered
+        (partly) by a local fallback and slides without one check per
+        transcript block (`block_count`) are skipped.
+
+        Returns:
+            Number of slides stored
+        """
+        now = time.time()
+        rows = [
+            (
+                transcript_hash,
+                slide["content_hash"],
+                language,
+                now,
+                zlib.compress(json.dumps(
+                    {field: slide.get(field) for field in _SLIDE_RESULT_FIELDS},
+                    ensure_ascii=False
+                ).encode("utf-8"))
+            )
+            for slide in slides
+            if slide.get("content_hash")
+            and not slide.get("reused")
+            and slide.get("source") == "llm"
+            and len(slide.get("alignment_details") or []) == block_count
+            and not slide.get("talking_points_fallback")
+        ]
+        if not rows:
+            return 0
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO slide_results VALUES (?, ?, ?, ?, ?)", rows)
+        finally:
+            conn.close()
+        return len(rows)
+
+
+_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    """Get or create the session store (singleton pattern)"""
+    global _store
+    if _store is None:
+        _store = SessionStore(settings.SESSION_DB_PATH)
+        logger.info(f"Session store: {settings.SESSION_DB_PATH}")
+    return _store
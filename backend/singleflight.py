@@ -0,0 +1,292 @@
+"""
+Request Coalescing Module
+
+Double-clicks and client retries send the same audio and deck several times
+at once. Identical analyses are coalesced: the first request starts the
+computation and later ones attach to it and get the same response.
+
+- content key: hash of the audio bytes, the outline and the endpoint variant;
+  only joins a computation that is still running (a finished analysis is
+  never replayed by content, so a deliberate re-run gets a fresh result)
+- Idempotency-Key header: a client-chosen key; a repeat within
+  COALESCE_RESULT_TTL_SEC gets the stored response back without new work
+
+The computation runs as its own task, so it finishes (and its result can
+be shared) even if the request that started it disconnects. Coalescing is
+per process; with several workers, duplicates are only merged when they
+land on the same worker.
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from config import settings
+from telemetry import COALESCED
+
+logger = logging.getLogger(__name__)
+
+
+def content_key(variant: str, audio_sha256: str, outline: str, user_id: str = "") -> str:
+    """
+    Key identifying an analysis by its inputs
+
+    Args:
+        variant: Endpoint variant (e.g. "free", "pro")
+        audio_sha256: Hash of the uploaded audio bytes
+        outline: Outline text, or the hash of the uploaded deck
+        user_id: Owner of the run (each user's run is stored as their own session)
+
+    Returns:
+        Hex digest
+    """
+    outline_hash = hashlib.sha256(outline.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{variant}:{user_id}:{audio_sha256}:{outline_hash}".encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """Small LRU cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        if self.ttl <= 0 or self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class SingleFlight:
+    """
+    Runs at most one computation per key at a time
+
+    All state lives on the event loop thread, so no locking is needed.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def start(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Tuple[asyncio.Task, bool]:
+        """
+        Join the computation for `key`, starting it if none is running
+
+        Returns:
+            (task, True if this call started it)
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            return task, False
+
+        task = asyncio.ensure_future(factory())
+        self._inflight[key] = task
+
+        def forget(done: asyncio.Task) -> None:
+            if self._inflight.get(key) is done:
+                del self._inflight[key]
+
+        task.add_done_callback(forget)
+        return task, True
+
+    def alias(self, alias_key: str, task: asyncio.Task) -> None:
+        """Make `task` also reachable under a second key while it runs"""
+        if alias_key in self._inflight:
+            return
+        self._inflight[alias_key] = task
+
+        def forget(done: asyncio.Task) -> None:
+            if self._inflight.get(alias_key) is done:
+                del self._inflight[alias_key]
+
+        task.add_done_callback(forget)
+
+    def get(self, key: str) -> Optional[asyncio.Task]:
+        return self._inflight.get(key)
+
+
+class AsyncMemo:
+    """
+    Remembers the results of async calls by key, coalescing concurrent calls
+
+    Used to share identical work (e.g. slide-level LLM answers) between the
+    recordings of one batch, or to feed in answers stored from an earlier
+    run (seed). Failed calls are not remembered.
+    """
+
+    def __init__(self):
+        self._results: Dict[Any, asyncio.Future] = {}
+        self._batches: Set[asyncio.Future] = set()  # running get_or_run_many() calls
+        self.hits = 0
+        self.misses = 0
+
+    def seed(self, key: Any, value: Any) -> None:
+        """Remember an already known result (call from the event loop)"""
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(value)
+        self._results[key] = future
+
+    async def get_or_run(self, key: Any, factory: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._results.get(key)
+        if future is not None:
+            self.hits += 1
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        future = asyncio.ensure_future(factory())
+        self._results[key] = future
+        try:
+            return await asyncio.shield(future)
+        except Exception:
+            if self._results.get(key) is future:
+                del self._results[key]
+            raise
+
+    async def get_or_run_many(
+        self,
+        keys: List[Any],
+        factory: Callable[[List[int]], Awaitable[List[Any]]]
+    ) -> List[Any]:
+        """
+        Results for several keys, the unknown ones answered by one call
+
+        `factory` receives the positions of the keys that are neither known
+        nor in flight and returns their results in that order; it may return
+        an exception for a key it could not answer. Like
+        asyncio.gather(return_exceptions=True), a key whose call failed
+        holds the exception instead of a result (and is not remembered).
+        """
+        loop = asyncio.get_running_loop()
+        futures = [self._results.get(key) for key in keys]
+        missing = [i for i, future in enumerate(futures) if future is None]
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+
+        for i in missing:
+            futures[i] = self._results[keys[i]] = loop.create_future()
+
+        def fail(i: int, error: BaseException) -> None:
+            if self._results.get(keys[i]) is futures[i]:
+                del self._results[keys[i]]
+            if isinstance(error, asyncio.CancelledError):
+                futures[i].cancel()
+            else:
+                futures[i].set_exception(error)
+
+        async def run() -> None:
+            try:
+                values = await factory(missing)
+                if len(values) != len(missing):
+                    raise ValueError(f"Expected {len(missing)} results, got {len(values)}")
+            except BaseException as e:
+                for i in missing:
+                    fail(i, e)
+                if not isinstance(e, Exception):
+                    raise
+                return
+            for i, value in zip(missing, values):
+                if isinstance(value, BaseException):
+                    fail(i, value)
+                else:
+                    futures[i].set_result(value)
+
+        if missing:
+            batch = asyncio.ensure_future(run())
+            self._batches.add(batch)
+            batch.add_done_callback(self._batches.discard)
+        return list(await asyncio.gather(*(asyncio.shield(f) for f in futures), return_exceptions=True))
+
+
+class AnalysisCoalescer:
+    """Single-flight by content, plus a short-lived result cache for Idempotency-Key retries"""
+
+    def __init__(self):
+        self.flights = SingleFlight()
+        self.results = TTLCache(settings.COALESCE_RESULT_TTL_SEC, settings.COALESCE_MAX_ENTRIES)
+
+    @staticmethod
+    def _idempotency_key(variant: str, idempotency_key: str) -> str:
+        return f"idem:{variant}:{idempotency_key}"
+
+    async def lookup_idempotent(self, variant: str, idempotency_key: Optional[str]) -> Optional[Any]:
+        """
+        Response for a repeated Idempotency-Key, if one is known
+
+        Waits for the computation if the first request is still running;
+        returns None when the key is new (the caller then runs normally).
+        """
+        if not idempotency_key:
+            return None
+        key = self._idempotency_key(variant, idempotency_key)
+
+        cached = self.results.get(key)
+        if cached is not None:
+            COALESCED.inc(variant=variant, via="idempotency_cache")
+            return cached
+
+        task = self.flights.get(key)
+        if task is not None:
+            COALESCED.inc(variant=variant, via="idempotency_inflight")
+            return await asyncio.shield(task)
+        return None
+
+    def start(
+        self,
+        variant: str,
+        key: str,
+        factory: Callable[[], Awaitable[Any]],
+        idempotency_key: Optional[str] = None
+    ) -> Tuple[asyncio.Task, bool]:
+        """
+        Join the running computation for a content key, or start it
+
+        The response is kept for replay only under `idempotency_key`
+        (see lookup_idempotent()).
+
+        Returns:
+            (task, started); `started` is True only if `factory` was called
+            (the caller then hands its resources over)
+        """
+        task, started = self.flights.start(key, factory)
+        if not started:
+            COALESCED.inc(variant=variant, via="inflight")
+            logger.info(f"Attached to in-flight analysis {key[:12]}")
+
+        if idempotency_key:
+            idem = self._idempotency_key(variant, idempotency_key)
+            self.flights.alias(idem, task)
+            task.add_done_callback(lambda t: self._store(idem, t))
+        return task, started
+
+    def _store(self, key: str, task: asyncio.Task) -> None:
+        if task.cancelled() or task.exception() is not None:
+            return
+        self.results.set(key, task.result())
+
+
+_coalescer: Optional[AnalysisCoalescer] = None
+
+
+def get_coalescer() -> AnalysisCoalescer:
+    """Get or create the process-wide coalescer (singleton pattern)"""
+    global _coalescer
+    if _coalescer is None:
+        _coalescer = AnalysisCoalescer()
+    return _coalescer
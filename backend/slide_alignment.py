@@ -3,28 +3,31 @@ Slide-by-Slide Alignment Module
 
 This module analyzes alignment between presentation slides and spoken content.
 It identifies which slides were covered, partially covered, or missed entirely.
+
+Slides are classified by the LLM. Blocks whose check failed are classified
+locally by embedding similarity instead (source="mixed"); when the LLM is
+unavailable (circuit open) or more than SLIDE_FALLBACK_FAILURE_RATIO of a
+slide's checks failed, the whole slide is classified locally
+(source="local").
+
+When the same transcript is re-analyzed against an edited deck, results of
+slides whose content hash is unchanged are passed in as `previous` and
+reused; only added or edited slides are checked again.
 """
 
+import asyncio
 import logging
-from typing import List, Dict, Any
-import google.generativeai as genai
+from typing import List, Dict, Any, Optional
+from alignment import encode_texts
 from config import settings
+from gemini_gateway import GeminiResponseError, generate_json, get_gateway
+from pipeline import run_in_thread
+from pptx_parser import slide_content_hash
+from singleflight import AsyncMemo
+from telemetry import add_to_stage, annotate_stage, LLM_FALLBACKS
 
 logger = logging.getLogger(__name__)
 
-# Singleton Gemini model
-_gemini_model = None
-
-
-def get_gemini_model():
-    """Initialize and return Gemini model (singleton pattern)"""
-    global _gemini_model
-    if _gemini_model is None:
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        _gemini_model = genai.GenerativeModel(settings.GEMINI_MODEL)
-        logger.info(f"Gemini model initialized for slide alignment: {settings.GEMINI_MODEL}")
-    return _gemini_model
-
 
 def split_transcript_into_blocks(transcript_text: str, block_size: int = 3) -> List[str]:
     """
@@ -52,25 +55,34 @@ def split_transcript_into_blocks(transcript_text: str, block_size: int = 3) -> L
     return blocks
 
 
-def check_alignment_for_slide(
+_INVALID_CHECK = {"alignment": "none", "reason": "Invalid response from AI"}
+
+
+async def check_alignment_for_blocks(
     slide_title: str,
     slide_bullets: str,
-    spoken_block: str,
+    spoken_blocks: List[str],
     language: str = 'en'
-) -> Dict[str, Any]:
+) -> List[Dict[str, Any]]:
     """
-    Check if a spoken block aligns with a slide's content
+    Check which spoken blocks align with a slide's content (one LLM call)
     
     Args:
         slide_title: Slide title
         slide_bullets: Key points from slide
-        spoken_block: Block of transcript text
+        spoken_blocks: Blocks of transcript text (at most
+            SLIDE_CHECK_BATCH_BLOCKS keep the answer short)
         language: Target language ('tr' or 'en')
         
     Returns:
-        Dict with alignment status and reason
-        Example: {"alignment": "high", "reason": "..."}
+        One dict with alignment status and reason per block, in order
+        Example: [{"alignment": "high", "reason": "..."}, ...]
+        
+    Raises:
+        Gateway errors (incl. CircuitOpenError), so the caller can fall back;
+        GeminiResponseError if the answer is not one entry per block
     """
+    numbered = "\n".join(f'[{n}] "{block}"' for n, block in enumerate(spoken_blocks, start=1))
     if language == 'tr':
         prompt = f"""Sen bir sunum analiz asistanısın.
 
@@ -78,16 +90,15 @@ SLAYT:
 Başlık: {slide_title}
 Ana Noktalar: {slide_bullets}
 
-KONUŞULAN BÖLÜM:
-"{spoken_block}"
+KONUŞULAN BÖLÜMLER:
+{numbered}
 
-SORU: Konuşulan bölüm, bu slaydın ana fikriyle örtüşüyor mu?
+SORU: Her konuşulan bölüm, bu slaydın ana fikriyle örtüşüyor mu?
 
-SADECE JSON formatında yanıt ver:
-{{
-  "alignment": "high | partial | none",
-  "reason": "kısa açıklama"
-}}
+SADECE JSON formatında, her bölüm için sırayla bir nesne ile yanıt ver:
+[
+  {{"part": 1, "alignment": "high | partial | none", "reason": "kısa açıklama"}}
+]
 
 KURALLAR:
 - high = konuşulan bölüm slaydın konusunu açıkça işliyor
@@ -101,16 +112,15 @@ SLIDE:
 Title: {slide_title}
 Key Points: {slide_bullets}
 
-SPOKEN PART:
-"{spoken_block}"
+SPOKEN PARTS:
+{numbered}
 
-QUESTION: Does the spoken part align with this slide's main idea?
+QUESTION: Does each spoken part align with this slide's main idea?
 
-Answer ONLY in JSON format:
-{{
-  "alignment": "high | partial | none",
-  "reason": "short explanation"
-}}
+Answer ONLY in JSON format, with one object per spoken part, in order:
+[
+  {{"part": 1, "alignment": "high | partial | none", "reason": "short explanation"}}
+]
 
 RULES:
 - high = spoken part clearly addresses the slide's topic
@@ -118,31 +128,83 @@ RULES:
 - none = completely different topic or slide not mentioned
 """
     
-    try:
-        model = get_gemini_model()
-        
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.1,  # Low temp for consistent classification
-                max_output_tokens=200,
-                response_mime_type="application/json"
-            )
+    add_to_stage(prompt_chars=len(prompt), llm_calls=1)
+    
+    result = await generate_json(
+        prompt,
+        caller="slide_alignment",
+        temperature=0.1,  # Low temp for consistent classification
+        max_output_tokens=100 + 80 * len(spoken_blocks),
+        deadline=settings.LLM_CHECK_DEADLINE_SEC
+    )
+    
+    if not isinstance(result, list) or len(result) != len(spoken_blocks):
+        raise GeminiResponseError(
+            f"Expected {len(spoken_blocks)} alignment answers, got: {str(result)[:200]}"
         )
+    
+    # Validate each answer (ordered by "part" when the model numbered them)
+    by_part = {r["part"]: r for r in result if isinstance(r, dict) and isinstance(r.get("part"), int)}
+    if sorted(by_part) != list(range(1, len(spoken_blocks) + 1)):
+        by_part = dict(enumerate(result, start=1))
+    checks = []
+    for n in range(1, len(spoken_blocks) + 1):
+        answer = by_part[n]
+        if not isinstance(answer, dict) or answer.get("alignment") not in ["high", "partial", "none"]:
+            logger.warning(f"Invalid alignment response: {answer}")
+            checks.append(dict(_INVALID_CHECK))
+        else:
+            checks.append({"alignment": answer["alignment"], "reason": answer.get("reason", "")})
+    return checks
+
+
+def check_limiter() -> asyncio.Semaphore:
+    """
+    Bound on the slide check calls one request has in flight
+
+    Shared by all recordings of a request (cohorts), so a single request
+    cannot take the whole Gemini burst (GEMINI_BURST) at once.
+    """
+    return asyncio.Semaphore(max(1, min(settings.SLIDE_CHECKS_IN_FLIGHT, settings.GEMINI_BURST)))
+
+
+def classify_slides_locally(
+    slides: List[Dict[str, str]],
+    blocks: List[str],
+    language: str = 'en'
+) -> List[List[Dict[str, Any]]]:
+    """
+    Classify slides against transcript blocks by embedding similarity (no LLM)
+    
+    Args:
+        slides: Slides with 'title' and 'bullets' keys
+        blocks: Transcript blocks
+        language: Target language (for the reason text)
         
-        import json
-        result = json.loads(response.text.strip())
-        
-        # Validate response
-        if "alignment" not in result or result["alignment"] not in ["high", "partial", "none"]:
-            logger.warning(f"Invalid alignment response: {result}")
-            return {"alignment": "none", "reason": "Invalid response from AI"}
-        
-        return result
-        
-    except Exception as e:
-        logger.error(f"Alignment check failed: {e}")
-        return {"alignment": "none", "reason": f"Error: {str(e)}"}
+    Returns:
+        For each slide, one {"alignment", "reason"} dict per block, in the
+        same shape as check_alignment_for_blocks()
+    """
+    if not slides or not blocks:
+        return [[] for _ in slides]
+    
+    slide_texts = [f"{s.get('title', '')}\n{s.get('bullets', '')}".strip() for s in slides]
+    similarity = encode_texts(slide_texts) @ encode_texts(blocks).T
+    
+    reason = "Yerel benzerlik" if language == 'tr' else "Local similarity"
+    results = []
+    for row in similarity:
+        checks = []
+        for score in row:
+            if score >= settings.SLIDE_FALLBACK_HIGH_THRESHOLD:
+                level = "high"
+            elif score >= settings.SIMILARITY_THRESHOLD:
+                level = "partial"
+            else:
+                level = "none"
+            checks.append({"alignment": level, "reason": f"{reason} {float(score):.2f}"})
+        results.append(checks)
+    return results
 
 
 def determine_slide_status(alignment_results: List[Dict[str, Any]]) -> str:
@@ -173,18 +235,32 @@ def determine_slide_status(alignment_results: List[Dict[str, Any]]) -> str:
     return "missing"
 
 
-def analyze_slide_by_slide_alignment(
+async def analyze_slide_by_slide_alignment(
     slides_data: List[Dict[str, str]],
     transcript_text: str,
-    language: str = 'en'
+    language: str = 'en',
+    memo: Optional[AsyncMemo] = None,
+    previous: Optional[Dict[str, Dict[str, Any]]] = None,
+    limiter: Optional[asyncio.Semaphore] = None
 ) -> List[Dict[str, Any]]:
     """
     Analyze alignment for each slide against the full transcript
     
+    Each LLM call judges up to SLIDE_CHECK_BATCH_BLOCKS blocks against one
+    slide, and at most SLIDE_CHECKS_IN_FLIGHT calls run at once (`limiter`),
+    so a long transcript does not flood the shared rate limit.
+    
     Args:
         slides_data: List of slides with 'title' and 'bullets' keys
         transcript_text: Full transcript text
         language: Target language
+        memo: Optional memo shared between analyses of the same deck;
+            identical slide/block checks are then asked only once
+        previous: Optional earlier results for this transcript and language,
+            by slide content hash; those with one check per block are not
+            checked again and keep their talking points
+        limiter: Optional check_limiter() shared by the analyses of one
+            request (one is made per call otherwise)
         
     Returns:
         List of slide analysis results
@@ -196,7 +272,10 @@ def analyze_slide_by_slide_alignment(
                 "title": "Introduction",
                 "status": "covered",  # covered | partial | missing
                 "alignment_details": [...],
-                "needs_suggestion": False
+                "needs_suggestion": False,
+                "source": "llm",  # llm | mixed | local (embedding fallback for some/all blocks)
+                "content_hash": "3f1a...",
+                "reused": False  # True if taken from `previous`
             },
             ...
         ]
@@ -206,25 +285,105 @@ def analyze_slide_by_slide_alignment(
     # Split transcript into blocks
     blocks = split_transcript_into_blocks(transcript_text, block_size=3)
     logger.info(f"Transcript split into {len(blocks)} blocks")
+    annotate_stage(block_count=len(blocks))
     
-    results = []
+    limiter = limiter or check_limiter()
+    batch_size = max(1, settings.SLIDE_CHECK_BATCH_BLOCKS)
     
-    for idx, slide in enumerate(slides_data, start=1):
-        slide_title = slide.get('title', f'Slide {idx}')
-        slide_bullets = slide.get('bullets', '')
+    async def check_slide(slide_title: str, slide_bullets: str) -> List[Optional[Dict[str, Any]]]:
+        # Check alignment against all transcript blocks in batches; failed
+        # checks are None (classified locally below)
+        async def check_batch(batch: List[str]) -> List[Dict[str, Any]]:
+            async with limiter:
+                return await check_alignment_for_blocks(slide_title, slide_bullets, batch, language)
         
-        logger.info(f"Analyzing Slide {idx}: {slide_title}")
+        async def check_all(positions: List[int]) -> List[Any]:
+            # Blocks answered or asked already (memo) are not in `positions`
+            batches = [positions[k:k + batch_size] for k in range(0, len(positions), batch_size)]
+            answers = await asyncio.gather(
+                *(check_batch([blocks[i] for i in batch]) for batch in batches),
+                return_exceptions=True
+            )
+            checks: List[Any] = []
+            for batch, answer in zip(batches, answers):
+                checks.extend(answer if isinstance(answer, list) else [answer] * len(batch))
+            return checks
         
-        # Check alignment against all transcript blocks
-        alignment_checks = []
-        for block in blocks:
-            check_result = check_alignment_for_slide(
-                slide_title,
-                slide_bullets,
-                block,
-                language
+        if memo is None:
+            checks = await check_all(list(range(len(blocks))))
+        else:
+            # Per-block keys, so answers are shared (and seeded) block by block
+            checks = await memo.get_or_run_many(
+                [("alignment", slide_title, slide_bullets, block, language) for block in blocks],
+                check_all
             )
-            alignment_checks.append(check_result)
+        errors = [c for c in checks if isinstance(c, BaseException)]
+        if errors:
+            logger.warning(f"{len(errors)}/{len(checks)} alignment checks failed for '{slide_title}': {errors[0]}")
+        return [None if isinstance(c, BaseException) else c for c in checks]
+    
+    titles = [slide.get('title', f'Slide {idx}') for idx, slide in enumerate(slides_data, start=1)]
+    hashes = [slide.get('content_hash') or slide_content_hash(slide) for slide in slides_data]
+    
+    # Unchanged slides keep their earlier result if it has one check per
+    # block (anything else cannot be matched to this transcript's blocks);
+    # the rest are checked
+    previous = previous or {}
+    reused_idx = {
+        i for i, h in enumerate(hashes)
+        if h in previous and len(previous[h].get("alignment_details") or []) == len(blocks)
+    }
+    pending_idx = [i for i in range(len(slides_data)) if i not in reused_idx]
+    if reused_idx:
+        logger.info(f"Reusing results for {len(reused_idx)}/{len(slides_data)} unchanged slides")
+        annotate_stage(reused_slides=len(reused_idx))
+    
+    all_checks: List[List[Optional[Dict[str, Any]]]] = [
+        previous[h]["alignment_details"] if i in reused_idx else [None] * len(blocks)
+        for i, h in enumerate(hashes)
+    ]
+    if pending_idx and get_gateway().breaker.is_open():
+        logger.warning("LLM circuit open; classifying changed slides locally")
+    elif pending_idx:
+        pending_checks = await asyncio.gather(*(
+            check_slide(titles[i], slides_data[i].get('bullets', ''))
+            for i in pending_idx
+        ))
+        for i, checks in zip(pending_idx, pending_checks):
+            all_checks[i] = checks
+    
+    # Local fallback for the blocks the LLM could not classify; a slide with
+    # too many failed checks is classified locally as a whole
+    sources = {}
+    for i in pending_idx:
+        failed = sum(1 for c in all_checks[i] if c is None)
+        if not failed:
+            sources[i] = "llm"
+        elif failed == len(blocks) or failed > settings.SLIDE_FALLBACK_FAILURE_RATIO * len(blocks):
+            sources[i] = "local"
+        else:
+            sources[i] = "mixed"
+    fallback_idx = [i for i in pending_idx if sources[i] != "llm"]
+    if fallback_idx:
+        local_count = sum(1 for i in fallback_idx if sources[i] == "local")
+        LLM_FALLBACKS.inc(len(fallback_idx), stage="slide_alignment")
+        annotate_stage(local_fallback_slides=local_count, mixed_fallback_slides=len(fallback_idx) - local_count)
+        local_checks = await run_in_thread(
+            classify_slides_locally,
+            [slides_data[i] for i in fallback_idx],
+            blocks,
+            language
+        )
+        for i, checks in zip(fallback_idx, local_checks):
+            if sources[i] == "local":
+                all_checks[i] = checks
+            else:
+                all_checks[i] = [c if c is not None else local for c, local in zip(all_checks[i], checks)]
+    
+    results = []
+    
+    for idx, (slide, slide_title, alignment_checks) in enumerate(zip(slides_data, titles, all_checks), start=1):
+        slide_bullets = slide.get('bullets', '')
         
         # Determine overall status
         status = determine_slide_status(alignment_checks)
@@ -236,8 +395,16 @@ def analyze_slide_by_slide_alignment(
             "bullets": slide_bullets,
             "status": status,  # covered | partial | missing
             "alignment_details": alignment_checks,
-            "needs_suggestion": status in ["partial", "missing"]
+            "needs_suggestion": status in ["partial", "missing"],
+            "source": sources.get(idx - 1, "llm"),
+            "content_hash": hashes[idx - 1],
+            "reused": (idx - 1) in reused_idx
         }
+        if (idx - 1) in reused_idx:
+            earlier = previous[hashes[idx - 1]]
+            slide_result["source"] = earlier.get("source", "llm")
+            slide_result["talking_points"] = list(earlier.get("talking_points", []))
+            slide_result["talking_points_fallback"] = earlier.get("talking_points_fallback", False)
         
         results.append(slide_result)
         logger.info(f"Slide {idx} status: {status}")
@@ -0,0 +1,154 @@
+"""
+Transcript Splice Module
+
+When a presenter re-records one section of a take, only the replacement
+clip is transcribed. Its segments are spliced into the stored transcript in
+place of the replaced time range, later segments are shifted by the change
+in length, and the analysis is updated for the changed window only:
+
+- metrics: metrics.update_metrics() rescans only the removed and added text
+- alignment: alignment.realign_window() encodes only the new segments
+- slides: the memo used by the slide stages is seeded with the stored
+  per-block checks and talking points, so only transcript blocks whose text
+  changed are sent to the LLM (blocks are groups of sentences counted from
+  the start, so blocks after the window are reused only when the number of
+  sentences changed by a multiple of the block size)
+"""
+
+import logging
+from typing import Any, Dict, List, NamedTuple
+
+from models import AnalysisResponse, TranscriptData, TranscriptSegment
+from singleflight import AsyncMemo
+from slide_alignment import split_transcript_into_blocks
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptSplice(NamedTuple):
+    """A transcript with one time range replaced"""
+    transcript: TranscriptData
+    first_idx: int  # index of the first replaced (and first inserted) segment
+    removed: List[TranscriptSegment]
+    inserted: List[TranscriptSegment]  # clip segments, already shifted
+
+    @property
+    def removed_text(self) -> str:
+        return " ".join(seg.text for seg in self.removed)
+
+    @property
+    def inserted_text(self) -> str:
+        return " ".join(seg.text for seg in self.inserted)
+
+
+def _midpoint(segment: TranscriptSegment) -> float:
+    return (segment.start + segment.end) / 2
+
+
+def splice_transcript(
+    original: TranscriptData,
+    clip: TranscriptData,
+    start_sec: float,
+    end_sec: float,
+    clip_duration: float
+) -> TranscriptSplice:
+    """
+    Replace the [start_sec, end_sec) range of a transcript with a clip
+
+    Segments whose midpoint falls inside the range are replaced; the clip's
+    segments are moved to start at start_sec and the segments after the
+    range are shifted by clip_duration - (end_sec - start_sec).
+
+    Args:
+        original: Stored transcript of the whole take
+        clip: Transcript of the replacement clip (timestamps from 0)
+        start_sec: Start of the replaced range in the original take
+        end_sec: End of the replaced range in the original take
+        clip_duration: Length of the replacement audio in seconds
+
+    Returns:
+        TranscriptSplice with the new transcript and the changed window
+
+    Raises:
+        ValueError: If the range is empty or outside the take
+    """
+    if not 0 <= start_sec < end_sec:
+        raise ValueError(f"Invalid splice range: {start_sec}-{end_sec}s")
+    if start_sec >= original.duration:
+        raise ValueError(f"Splice starts after the end of the take ({original.duration:.1f}s)")
+
+    segments = original.segments
+    first = next((i for i, seg in enumerate(segments) if _midpoint(seg) >= start_sec), len(segments))
+    last = first
+    while last < len(segments) and _midpoint(segments[last]) < end_sec:
+        last += 1
+
+    shift = clip_duration - (min(end_sec, original.duration) - start_sec)
+
+    def moved(segment: TranscriptSegment, offset: float) -> TranscriptSegment:
+        return TranscriptSegment(
+            start=round(segment.start + offset, 3),
+            end=round(segment.end + offset, 3),
+            text=segment.text
+        )
+
+    inserted = [moved(seg, start_sec) for seg in clip.segments]
+    new_segments = segments[:first] + inserted + [moved(seg, shift) for seg in segments[last:]]
+
+    logger.info(
+        f"Spliced {start_sec:.1f}-{end_sec:.1f}s: {last - first} segments replaced "
+        f"by {len(inserted)}, later segments shifted {shift:+.1f}s"
+    )
+
+    transcript = TranscriptData(
+        text=" ".join(seg.text for seg in new_segments).strip(),
+        segments=new_segments,
+        duration=max(0.0, original.duration + shift),
+        language=original.language
+    )
+    return TranscriptSplice(transcript, first, list(segments[first:last]), inserted)
+
+
+def seed_slide_memo(
+    memo: AsyncMemo,
+    previous: AnalysisResponse,
+    slides: List[Dict[str, str]],
+    stored_checks: Dict[str, Dict[str, Any]]
+) -> int:
+    """
+    Feed an earlier run's slide answers into the memo used by the slide stages
+
+    Args:
+        memo: Memo passed to the slide stages (must be used on this loop)
+        previous: The earlier run
+        slides: Its structured slides (with content_hash)
+        stored_checks: SessionStore.slide_results() of its transcript
+
+    Returns:
+        Number of seeded alignment checks
+    """
+    if previous.slide_alignment is None:
+        return 0
+    language = previous.slide_alignment.language
+    blocks = split_transcript_into_blocks(previous.transcript.text, block_size=3)
+
+    seeded = 0
+    for slide in slides:
+        stored = stored_checks.get(slide.get("content_hash", ""))
+        # Checks are stored in block order; an incomplete set cannot be
+        # matched to its blocks
+        if not stored or len(stored["alignment_details"]) != len(blocks):
+            continue
+        for block, check in zip(blocks, stored["alignment_details"]):
+            memo.seed(("alignment", slide["title"], slide.get("bullets", ""), block, language), check)
+            seeded += 1
+
+    # Talking points only depend on the slide; template ones are not reused
+    if "talking_points" not in previous.degraded_stages:
+        for detail in previous.slide_alignment.slides:
+            if detail.talking_points:
+                memo.seed(
+                    ("talking_points", detail.title, detail.bullets, language),
+                    (detail.talking_points, False)
+                )
+    return seeded
@@ -2,12 +2,21 @@
 from __future__ import annotations
 
 import logging
-from typing import List
+import re
+import time
+from collections import Counter
+from typing import List, NamedTuple, Tuple, Union
 
+import numpy as np
 import whisper  # openai-whisper
 
-from config import WHISPER_MODEL, WHISPER_DEVICE
+from audio_utils import AudioProbeError, decode_audio_pcm, probe_audio_duration_ms
+from config import WHISPER_MODEL, WHISPER_DEVICE, settings
 from models import TranscriptData, TranscriptSegment
+from resource_policy import inference_slot
+from telemetry import record_model_load
+from vad import SAMPLE_RATE, split_points, trim_silence
+from worker_pool import SttPoolUnavailable, stt_process_count, transcribe_chunks
 
 logger = logging.getLogger(__name__)
 
@@ -27,58 +36,232 @@ def get_whisper_model():
             logger.warning(f"Unsupported WHISPER_DEVICE='{WHISPER_DEVICE}', falling back to 'cpu'")
             device = "cpu"
 
+        start = time.perf_counter()
         _whisper_model = whisper.load_model(WHISPER_MODEL, device=device)
+        record_model_load(f"whisper-{WHISPER_MODEL}", time.perf_counter() - start)
         logger.info("Whisper model loaded successfully")
 
     return _whisper_model
 
 
-def transcribe_audio(audio_path: str) -> TranscriptData:
+class ChunkTranscript(NamedTuple):
+    """Whisper output for one piece of audio"""
+    segments: List[TranscriptSegment]  # times relative to the start of the piece
+    language: str
+
+
+def transcribe_segments(audio: Union[str, np.ndarray]) -> ChunkTranscript:
+    """
+    Run Whisper on an audio file or on 16 kHz mono float32 samples
+
+    Args:
+        audio: File path or samples
+
+    Returns:
+        ChunkTranscript with the non-empty segments and detected language
+    """
+    model = get_whisper_model()
+
+    # openai-whisper:
+    # - fp16 Windows CPU'da çalışmaz -> fp16=False
+    # - segments result["segments"] içinde gelir
+    # - language result["language"] döner (auto-detect)
+    with inference_slot():
+        result = model.transcribe(
+            audio,
+            fp16=False,
+            language=None,  # auto-detect
+            verbose=False,
+        )
+
+    segments: List[TranscriptSegment] = []
+    for seg in result.get("segments", []) or []:
+        text = (seg.get("text") or "").strip()
+        start = float(seg.get("start") or 0.0)
+        end = float(seg.get("end") or 0.0)
+
+        if text:
+            segments.append(TranscriptSegment(start=start, end=end, text=text))
+
+    return ChunkTranscript(segments, result.get("language") or "unknown")
+
+
+def _normalized_words(text: str) -> List[str]:
+    return [re.sub(r"[^\w']", "", word.lower()) for word in text.split()]
+
+
+def strip_repeated_words(previous: str, text: str, max_words: int = 8) -> str:
+    """
+    Drop the leading words of `text` that repeat the end of `previous`
+
+    Neighbouring chunks share STT_CHUNK_OVERLAP_SEC of audio, so a phrase
+    at a cut can be transcribed twice. Repeats of a single word are kept
+    (they are as likely to be the speaker's).
+    """
+    tail = _normalized_words(previous)[-max_words:]
+    words = text.split()
+    head = _normalized_words(text)[:max_words]
+    for n in range(min(len(tail), len(head)), 1, -1):
+        if tail[-n:] == head[:n]:
+            return " ".join(words[n:])
+    return text
+
+
+def stitch_chunks(
+    chunks: List[ChunkTranscript],
+    windows: List[Tuple[float, float]],
+    cuts: List[float]
+) -> List[TranscriptSegment]:
+    """
+    Join chunk transcripts into one segment list on a common timeline
+
+    Args:
+        chunks: Transcripts of the chunk windows, in order
+        windows: (start, end) seconds of audio each chunk was given
+        cuts: Chunk boundaries in seconds ([0, cut_1, ..., end]); a chunk
+            keeps the segments whose midpoint lies between its cuts
+
+    Returns:
+        Segments with global timestamps, in order, without boundary repeats
+    """
+    segments: List[TranscriptSegment] = []
+    for i, (chunk, (window_start, _)) in enumerate(zip(chunks, windows)):
+        last_chunk = i == len(chunks) - 1
+        first_of_chunk = True
+        for seg in chunk.segments:
+            start = seg.start + window_start
+            end = seg.end + window_start
+            midpoint = (start + end) / 2
+            if midpoint < cuts[i] or (midpoint >= cuts[i + 1] and not last_chunk):
+                continue
+
+            text = seg.text
+            if segments:
+                if first_of_chunk:
+                    text = strip_repeated_words(segments[-1].text, text)
+                    if not text:
+                        continue
+                start = max(start, segments[-1].end)
+            first_of_chunk = False
+            segments.append(TranscriptSegment(start=round(start, 3), end=round(max(start, end), 3), text=text))
+    return segments
+
+
+def long_audio_chunk_count(duration: float) -> int:
+    """Chunks for the long-audio mode (1 = transcribe in one call)"""
+    if not settings.STT_LONG_AUDIO_SEC or duration <= settings.STT_LONG_AUDIO_SEC:
+        return 1
+    return max(1, min(stt_process_count(), int(duration // settings.STT_CHUNK_MIN_SEC)))
+
+
+def _may_need_chunks(audio_path: str) -> bool:
+    """Whether the file could be long enough for the long-audio mode (decode only then)"""
+    if not settings.STT_LONG_AUDIO_SEC:
+        return False
+    try:
+        duration_ms = probe_audio_duration_ms(audio_path)
+    except AudioProbeError:
+        return True  # let the decode report the problem
+    return long_audio_chunk_count(duration_ms / 1000) > 1
+
+
+def transcribe_long_audio(pcm: np.ndarray, n_chunks: int) -> ChunkTranscript:
+    """
+    Transcribe long audio as concurrent chunks on the STT process pool
+
+    The audio is cut at pauses into `n_chunks` parts of about equal length;
+    each worker transcribes its part plus STT_CHUNK_OVERLAP_SEC on either
+    side, and the parts are stitched back on the global timeline.
+
+    Args:
+        pcm: 16 kHz mono float32 samples
+        n_chunks: Number of chunks (normally the pool size)
+
+    Returns:
+        ChunkTranscript of the whole audio; the language is the one detected
+        for most of the audio
+    """
+    points = split_points(pcm, n_chunks)
+    overlap = int(settings.STT_CHUNK_OVERLAP_SEC * SAMPLE_RATE)
+    bounds = [(max(0, a - overlap), min(len(pcm), b + overlap)) for a, b in zip(points, points[1:])]
+    logger.info(
+        f"Long audio: {len(pcm) / SAMPLE_RATE:.0f}s in {len(bounds)} chunks "
+        f"({', '.join(f'{(b - a) / SAMPLE_RATE:.0f}s' for a, b in zip(points, points[1:]))})"
+    )
+
+    chunks = transcribe_chunks([pcm[a:b] for a, b in bounds])
+
+    cuts = [p / SAMPLE_RATE for p in points]
+    windows = [(a / SAMPLE_RATE, b / SAMPLE_RATE) for a, b in bounds]
+    segments = stitch_chunks(chunks, windows, cuts)
+
+    spoken: Counter = Counter()
+    for chunk, start, end in zip(chunks, cuts, cuts[1:]):
+        spoken[chunk.language] += end - start
+    if len(spoken) > 1:
+        logger.warning(f"Chunks detected different languages: {dict(spoken)}")
+    return ChunkTranscript(segments, spoken.most_common(1)[0][0])
+
+
+def transcribe_audio(audio_path: str, parallel: bool = True) -> TranscriptData:
     """
     Transcribe audio file to text with timestamps (openai-whisper)
 
+    With VAD_ENABLED, long silences are cut out of the decoded audio before
+    Whisper sees it; segment timestamps are mapped back to the original
+    recording and the removed silence is reported in `silence`.
+
+    Audio longer than STT_LONG_AUDIO_SEC (after trimming) is split at
+    pauses and transcribed concurrently on the STT process pool. The file
+    is only decoded to PCM here when one of the two can apply; otherwise
+    Whisper reads it directly.
+
     Args:
         audio_path: Path to WAV audio file
+        parallel: Allow the long-audio mode (False inside pool workers)
 
     Returns:
         TranscriptData with full text, segments, and metadata
 
     Raises:
+        SttPoolUnavailable: If the long-audio mode has no working STT pool
         RuntimeError: If transcription fails
     """
     try:
-        model = get_whisper_model()
-
         logger.info(f"Transcribing audio: {audio_path}")
 
-        # openai-whisper:
-        # - fp16 Windows CPU'da çalışmaz -> fp16=False
-        # - segments result["segments"] içinde gelir
-        # - language result["language"] döner (auto-detect)
-        result = model.transcribe(
-            audio_path,
-            fp16=False,
-            language=None,  # auto-detect
-            verbose=False,
-        )
-
-        segments: List[TranscriptSegment] = []
-        full_text_parts: List[str] = []
+        audio: Union[str, np.ndarray] = audio_path
+        vad = None
+        if settings.VAD_ENABLED or (parallel and _may_need_chunks(audio_path)):
+            audio = decode_audio_pcm(audio_path)
+        if settings.VAD_ENABLED:
+            vad = trim_silence(audio)
+            audio = vad.audio
 
-        for seg in result.get("segments", []) or []:
-            text = (seg.get("text") or "").strip()
-            start = float(seg.get("start") or 0.0)
-            end = float(seg.get("end") or 0.0)
+        n_chunks = 1
+        if parallel and not isinstance(audio, str):
+            n_chunks = long_audio_chunk_count(len(audio) / SAMPLE_RATE)
+        if n_chunks > 1:
+            result = transcribe_long_audio(audio, n_chunks)
+        else:
+            result = transcribe_segments(audio)
 
-            if text:
-                segments.append(TranscriptSegment(start=start, end=end, text=text))
-                full_text_parts.append(text)
+        segments = result.segments
+        if vad is not None and vad.stats.removed_sec > 0:
+            segments = [
+                TranscriptSegment(
+                    start=vad.offsets.to_original(seg.start),
+                    end=vad.offsets.to_original(seg.end, end=True),
+                    text=seg.text
+                )
+                for seg in segments
+            ]
 
-        full_text = " ".join(full_text_parts).strip()
+        full_text = " ".join(seg.text for seg in segments).strip()
 
         # duration: son segment end (yoksa 0)
         duration = segments[-1].end if segments else 0.0
-        language = result.get("language") or "unknown"
+        language = result.language
 
         logger.info(
             f"Transcription complete: {len(segments)} segments, "
@@ -91,8 +274,11 @@ def transcribe_audio(audio_path: str) -> TranscriptData:
             segments=segments,
             duration=duration,
             language=language,
+            silence=vad.stats if vad else None,
         )
 
+    except SttPoolUnavailable:
+        raise
     except Exception as e:
         logger.exception("Transcription failed")
         raise RuntimeError(f"Speech-to-text failed: {str(e)}") from e
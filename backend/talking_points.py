@@ -5,34 +5,25 @@ Generates professional, actionable talking points for slides that weren't
 adequately covered in the presentation.
 """
 
+import asyncio
 import logging
-from typing import List, Dict, Any
-import google.generativeai as genai
+from typing import List, Dict, Any, Optional, Tuple
 from config import settings
+from models import SlideAlignmentDetail, SlideBySlideAlignment
+from gemini_gateway import generate_json
+from singleflight import AsyncMemo
+from telemetry import add_to_stage, LLM_FALLBACKS
 
 logger = logging.getLogger(__name__)
 
-# Singleton Gemini model
-_gemini_model = None
 
-
-def get_gemini_model():
-    """Initialize and return Gemini model (singleton pattern)"""
-    global _gemini_model
-    if _gemini_model is None:
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        _gemini_model = genai.GenerativeModel(settings.GEMINI_MODEL)
-        logger.info(f"Gemini model initialized for talking points: {settings.GEMINI_MODEL}")
-    return _gemini_model
-
-
-def generate_talking_points_for_slide(
+async def request_talking_points(
     slide_title: str,
     slide_bullets: str,
     language: str = 'en'
 ) -> List[str]:
     """
-    Generate 2-3 suggested talking points for a slide
+    Ask the LLM for 2-3 suggested talking points for a slide
     
     Args:
         slide_title: Slide title
@@ -41,6 +32,9 @@ def generate_talking_points_for_slide(
         
     Returns:
         List of 2-3 talking point suggestions (strings)
+        
+    Raises:
+        Gateway errors (incl. CircuitOpenError); see suggest_talking_points()
     """
     if language == 'tr':
         prompt = f"""Sen bir profesyonel sunum koçusun.
@@ -97,86 +91,189 @@ Answer ONLY in JSON format:
 }}
 """
     
-    try:
-        model = get_gemini_model()
-        
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.5,  # Medium creativity
-                max_output_tokens=500,
-                response_mime_type="application/json"
-            )
-        )
-        
-        import json
-        result = json.loads(response.text.strip())
-        
-        talking_points = result.get("talking_points", [])
-        
-        # Validate and limit to 3
-        if not talking_points or len(talking_points) < 2:
-            logger.warning(f"Invalid talking points response: {result}")
-            return [
-                "Focus on the key message of this slide.",
-                "Explain why this topic matters to your audience.",
-                "Connect this point to your overall presentation theme."
-            ] if language == 'en' else [
-                "Bu slaydın ana mesajına odaklanın.",
-                "Bu konunun neden önemli olduğunu açıklayın.",
-                "Bu noktayı genel sunum temanızla ilişkilendirin."
-            ]
-        
-        return talking_points[:3]  # Max 3 points
-        
-    except Exception as e:
-        logger.error(f"Talking points generation failed: {e}")
-        # Fallback generic points
+    add_to_stage(prompt_chars=len(prompt), llm_calls=1)
+    
+    result = await generate_json(
+        prompt,
+        caller="talking_points",
+        temperature=0.5,  # Medium creativity
+        max_output_tokens=500,
+        deadline=settings.LLM_CHECK_DEADLINE_SEC
+    )
+    
+    talking_points = result.get("talking_points", [])
+    
+    # Validate and limit to 3
+    if not talking_points or len(talking_points) < 2:
+        logger.warning(f"Invalid talking points response: {result}")
         return [
-            "Address the main topic clearly and concisely.",
-            "Provide specific examples or evidence.",
-            "Explain the relevance to your audience."
+            "Focus on the key message of this slide.",
+            "Explain why this topic matters to your audience.",
+            "Connect this point to your overall presentation theme."
         ] if language == 'en' else [
-            "Ana konuyu net ve öz bir şekilde ele alın.",
+            "Bu slaydın ana mesajına odaklanın.",
+            "Bu konunun neden önemli olduğunu açıklayın.",
+            "Bu noktayı genel sunum temanızla ilişkilendirin."
+        ]
+    
+    return talking_points[:3]  # Max 3 points
+
+
+def template_talking_points(slide_title: str, slide_bullets: str, language: str = 'en') -> List[str]:
+    """
+    Build talking points from the slide's own bullets (no LLM)
+    
+    Used when the LLM is unavailable; falls back to generic advice for
+    slides without bullets.
+    """
+    bullets = [b.strip(" \t•-*") for b in slide_bullets.splitlines()]
+    bullets = [b for b in bullets if b][:3]
+    
+    if language == 'tr':
+        points = [f"Şu noktayı açıkça belirtin: {b}." for b in bullets]
+        generic = [
+            f"\"{slide_title}\" konusunun ana mesajını net ve öz bir şekilde ele alın.",
             "Spesifik örnekler veya kanıtlar sunun.",
             "Dinleyicileriniz için önemini açıklayın."
         ]
+    else:
+        points = [f"Make this point explicitly: {b}." for b in bullets]
+        generic = [
+            f"Address the main message of \"{slide_title}\" clearly and concisely.",
+            "Provide specific examples or evidence.",
+            "Explain the relevance to your audience."
+        ]
+    
+    # Always return at least two points
+    return (points + generic)[:max(2, len(points))]
 
 
-def generate_talking_points_batch(
-    slides_analysis: List[Dict[str, Any]],
+async def suggest_talking_points(
+    slide_title: str,
+    slide_bullets: str,
     language: str = 'en'
+) -> Tuple[List[str], bool]:
+    """
+    Talking points from the LLM, or from the slide bullets if it fails
+    
+    Returns:
+        (talking points, True if the template fallback was used)
+    """
+    try:
+        return await request_talking_points(slide_title, slide_bullets, language), False
+    except Exception as e:
+        logger.error(f"Talking points generation failed, using template: {e}")
+        LLM_FALLBACKS.inc(stage="talking_points")
+        return template_talking_points(slide_title, slide_bullets, language), True
+
+
+async def generate_talking_points_for_slide(
+    slide_title: str,
+    slide_bullets: str,
+    language: str = 'en'
+) -> List[str]:
+    """
+    Generate 2-3 suggested talking points for a slide (never raises)
+    
+    Args:
+        slide_title: Slide title
+        slide_bullets: Key points from slide
+        language: Target language ('tr' or 'en')
+        
+    Returns:
+        List of 2-3 talking point suggestions (strings)
+    """
+    talking_points, _ = await suggest_talking_points(slide_title, slide_bullets, language)
+    return talking_points
+
+
+async def generate_talking_points_batch(
+    slides_analysis: List[Dict[str, Any]],
+    language: str = 'en',
+    memo: Optional[AsyncMemo] = None
 ) -> List[Dict[str, Any]]:
     """
     Generate talking points for all slides that need suggestions
     
+    Slides are processed concurrently (paced by the Gemini gateway). Slides
+    reused from an earlier run already carry their talking points and are
+    skipped.
+    
     Args:
         slides_analysis: Results from analyze_slide_by_slide_alignment()
         language: Target language
+        memo: Optional memo shared between analyses of the same deck, so
+            each slide's talking points are generated once
         
     Returns:
-        Enhanced slides_analysis with talking_points added
+        Enhanced slides_analysis with talking_points added; slides whose
+        points came from the template fallback get talking_points_fallback=True
     """
     logger.info("Generating talking points for slides needing suggestions...")
     
-    enhanced_results = []
-    
-    for slide in slides_analysis:
+    async def enhance(slide: Dict[str, Any]) -> Dict[str, Any]:
+        if slide.get("reused") and "talking_points" in slide:
+            return slide
+        
         # Only generate for partial/missing slides
         if slide.get("needs_suggestion", False):
             logger.info(f"Generating talking points for Slide {slide['slide_number']}: {slide['title']}")
             
-            talking_points = generate_talking_points_for_slide(
-                slide['title'],
-                slide['bullets'],
-                language
-            )
+            def suggest():
+                return suggest_talking_points(slide['title'], slide['bullets'], language)
             
-            slide['talking_points'] = talking_points
+            if memo is None:
+                suggestion = await suggest()
+            else:
+                suggestion = await memo.get_or_run(
+                    ("talking_points", slide['title'], slide['bullets'], language),
+                    suggest
+                )
+            # Copy: memoized lists are shared between recordings
+            slide['talking_points'] = list(suggestion[0])
+            slide['talking_points_fallback'] = suggestion[1]
         else:
             slide['talking_points'] = []
-        
-        enhanced_results.append(slide)
+            slide['talking_points_fallback'] = False
+        return slide
+    
+    enhanced_results = list(await asyncio.gather(*(enhance(slide) for slide in slides_analysis)))
     
     logger.info("Talking points generation complete")
-    return enhanced_results
\ No newline at end of file
+    return enhanced_results
+
+
+def build_slide_alignment(slides_with_suggestions: List[Dict[str, Any]], language: str) -> SlideBySlideAlignment:
+    """
+    Build the SlideBySlideAlignment result from analyzed slides
+    
+    Args:
+        slides_with_suggestions: Results from generate_talking_points_batch()
+        language: Target language
+        
+    Returns:
+        SlideBySlideAlignment with overall coverage
+    """
+    # Calculate overall coverage
+    covered_count = sum(1 for s in slides_with_suggestions if s['status'] == 'covered')
+    overall_coverage = (covered_count / len(slides_with_suggestions)) * 100 if slides_with_suggestions else 0
+    
+    # Build SlideBySlideAlignment model
+    slide_alignment_details = [
+        SlideAlignmentDetail(
+            slide_number=s['slide_number'],
+            title=s['title'],
+            bullets=s['bullets'],
+            status=s['status'],
+            talking_points=s.get('talking_points', []),
+            needs_suggestion=s['needs_suggestion'],
+            source=s.get('source', 'llm')
+        )
+        for s in slides_with_suggestions
+    ]
+    
+    return SlideBySlideAlignment(
+        slides=slide_alignment_details,
+        overall_coverage=round(overall_coverage, 1),
+        language=language
+    )
@@ -0,0 +1,422 @@
+"""
+Telemetry Module
+
+In-process Prometheus-style metrics (counters, gauges, histograms) for the
+analysis pipeline, a stage timer used around every pipeline step, and an
+ASGI middleware that tracks in-flight requests and adds a Server-Timing
+header to every response.
+
+Metrics are per process; with several uvicorn workers each worker exposes
+its own /metrics and the scraper aggregates them.
+"""
+
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from tracing import emit_trace
+
+logger = logging.getLogger(__name__)
+
+LabelValues = Tuple[str, ...]
+
+# Latency buckets in seconds: sub-millisecond CPU stages up to multi-minute STT
+DEFAULT_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> ([count per bucket], sum, count)
+        self._series: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total, n = self._series.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._series[key] = (counts, total + value, n + 1)
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, (counts, total, n) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    le = _format_labels(self.label_names, key, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{le} {cumulative}")
+                inf = _format_labels(self.label_names, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{inf} {n}")
+                lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {n}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric and renders the text exposition format"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_DURATION = registry.register(Histogram(
+    "cm_stage_duration_seconds", "Wall time of each pipeline stage", ["stage"]
+))
+STAGE_ERRORS = registry.register(Counter(
+    "cm_stage_errors_total", "Pipeline stages that raised", ["stage"]
+))
+REQUEST_DURATION = registry.register(Histogram(
+    "cm_request_duration_seconds", "End-to-end request latency", ["path"]
+))
+REQUESTS_TOTAL = registry.register(Counter(
+    "cm_requests_total", "Completed HTTP requests", ["path", "status"]
+))
+REQUESTS_IN_FLIGHT = registry.register(Gauge(
+    "cm_requests_in_flight", "Requests currently being handled"
+))
+QUEUE_DEPTH = registry.register(Gauge(
+    "cm_queue_depth", "Requests accepted but not yet running a pipeline stage"
+))
+GEMINI_CALLS = registry.register(Counter(
+    "cm_gemini_calls_total", "Gemini generate_content calls", ["caller", "outcome"]
+))
+GEMINI_RETRIES = registry.register(Counter(
+    "cm_gemini_retries_total", "Gemini calls retried after an error", ["caller"]
+))
+GEMINI_RATE_LIMITED = registry.register(Counter(
+    "cm_gemini_rate_limited_total", "Gemini calls rejected with 429 ResourceExhausted", ["caller"]
+))
+GEMINI_HEDGES = registry.register(Counter(
+    "cm_gemini_hedges_total", "Hedge requests issued and hedges that answered first", ["caller", "outcome"]
+))
+GEMINI_DEADLINE_EXCEEDED = registry.register(Counter(
+    "cm_gemini_deadline_exceeded_total", "Gemini calls abandoned at their deadline", ["caller"]
+))
+CIRCUIT_STATE = registry.register(Gauge(
+    "cm_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ["breaker"]
+))
+LLM_FALLBACKS = registry.register(Counter(
+    "cm_llm_fallbacks_total", "Stages answered by a local fallback instead of the LLM", ["stage"]
+))
+COALESCED = registry.register(Counter(
+    "cm_coalesced_requests_total", "Requests answered by an identical computation", ["variant", "via"]
+))
+MODEL_LOAD_SECONDS = registry.register(Gauge(
+    "cm_model_load_seconds", "Time taken to load each model in this process", ["model"]
+))
+
+
+# ============================================================================
+# PER-REQUEST STATE
+# ============================================================================
+
+class RequestTelemetry:
+    """Mutable per-request record shared between middleware and handlers"""
+
+    def __init__(self, path: str, request_id: Optional[str] = None):
+        self.path = path
+        self.request_id = request_id or uuid.uuid4().hex
+        self.started_at = time.time()
+        self.timings: List[Tuple[str, float]] = []  # (stage, milliseconds)
+        self.spans: List[Dict[str, Any]] = []
+        self.queued = True
+        self._lock = threading.Lock()
+
+    def add_timing(self, stage: str, duration_ms: float) -> None:
+        with self._lock:
+            self.timings.append((stage, duration_ms))
+
+    def add_span(self, span: Dict[str, Any]) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def leave_queue(self) -> None:
+        with self._lock:
+            if not self.queued:
+                return
+            self.queued = False
+        QUEUE_DEPTH.dec()
+
+    def server_timing_header(self) -> str:
+        with self._lock:
+            return ", ".join(f"{stage};dur={ms:.1f}" for stage, ms in self.timings)
+
+
+_current_request: contextvars.ContextVar[Optional[RequestTelemetry]] = contextvars.ContextVar(
+    "current_request_telemetry", default=None
+)
+
+
+# Attributes of the innermost open stage span (input sizes etc.)
+_current_span: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+    "current_stage_span", default=None
+)
+
+
+def current_request() -> Optional[RequestTelemetry]:
+    """Telemetry record of the request being handled, if any"""
+    return _current_request.get()
+
+
+@contextmanager
+def stage(name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Time a pipeline stage
+
+    Records the duration in the stage histogram (and the error counter if
+    the block raises), appends it to the request's Server-Timing header and
+    adds a span (start, end, attributes, outcome) to the request trace.
+
+    Usage:
+        with stage("stt", audio_seconds=duration) as span:
+            transcript = transcribe_audio(path)
+            span["segment_count"] = len(transcript.segments)
+    """
+    request = _current_request.get()
+    if request is not None:
+        request.leave_queue()
+
+    span_attributes: Dict[str, Any] = dict(attributes)
+    token = _current_span.set(span_attributes)
+    started_at = time.time()
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield span_attributes
+    except BaseException as e:
+        STAGE_ERRORS.inc(stage=name)
+        outcome = f"error:{type(e).__name__}"
+        raise
+    finally:
+        _current_span.reset(token)
+        elapsed = time.perf_counter() - start
+        STAGE_DURATION.observe(elapsed, stage=name)
+        if request is not None:
+            request.add_timing(name, elapsed * 1000)
+            request.add_span({
+                "stage": name,
+                "start": round(started_at, 6),
+                "end": round(started_at + elapsed, 6),
+                "duration_ms": round(elapsed * 1000, 3),
+                "outcome": outcome,
+                "attributes": span_attributes,
+            })
+
+
+def annotate_stage(**attributes: Any) -> None:
+    """Set attributes on the current stage span (no-op outside a stage)"""
+    span = _current_span.get()
+    if span is not None:
+        span.update(attributes)
+
+
+def add_to_stage(**amounts: float) -> None:
+    """Increment numeric attributes on the current stage span (e.g. prompt_chars)"""
+    span = _current_span.get()
+    if span is not None:
+        for key, amount in amounts.items():
+            span[key] = span.get(key, 0) + amount
+
+
+def record_gemini_call(caller: str, outcome: str) -> None:
+    """Count a Gemini call: outcome is 'ok', 'error', 'rate_limited', 'throttled' or 'circuit_open'"""
+    GEMINI_CALLS.inc(caller=caller, outcome=outcome)
+    if outcome == "rate_limited":
+        GEMINI_RATE_LIMITED.inc(caller=caller)
+
+
+def record_model_load(model: str, seconds: float) -> None:
+    MODEL_LOAD_SECONDS.set(seconds, model=model)
+    logger.info(f"Model {model} loaded in {seconds:.2f}s")
+
+
+# ============================================================================
+# ASGI MIDDLEWARE
+# ============================================================================
+
+class TelemetryMiddleware:
+    """
+    Tracks in-flight requests and latency, assigns a request ID (taken from
+    X-Request-ID when the client sends a valid one), and adds Server-Timing
+    and X-Request-ID headers to every response
+    """
+
+    def __init__(self, app: ASGIApp, skip_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        path = scope.get("path", "")
+        if scope["type"] != "http" or path in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id":
+                # Keep client-supplied IDs short and filesystem-safe
+                candidate = value.decode("latin-1")[:64]
+                if candidate and all(c.isalnum() or c in "-_" for c in candidate):
+                    request_id = candidate
+                break
+
+        request = RequestTelemetry(path, request_id)
+        token = _current_request.set(request)
+        REQUESTS_IN_FLIGHT.inc()
+        QUEUE_DEPTH.inc()
+        start = time.perf_counter()
+        status = "500"
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+                total_ms = (time.perf_counter() - start) * 1000
+                timing = request.server_timing_header()
+                timing = f"{timing}, total;dur={total_ms:.1f}" if timing else f"total;dur={total_ms:.1f}"
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timing.encode("latin-1")))
+                headers.append((b"x-request-id", request.request_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            # Label by route template (/api/sessions/{session_id}) to keep
+            # cardinality bounded; unmatched paths share one label
+            route = scope.get("route")
+            path_label = getattr(route, "path", None) or "unmatched"
+            elapsed = time.perf_counter() - start
+            request.leave_queue()
+            REQUESTS_IN_FLIGHT.dec()
+            REQUESTS_TOTAL.inc(path=path_label, status=status)
+            REQUEST_DURATION.observe(elapsed, path=path_label)
+            _current_request.reset(token)
+            if request.spans:
+                emit_trace({
+                    "request_id": request.request_id,
+                    "path": path_label,
+                    "status": int(status) if status.isdigit() else status,
+                    "start": round(request.started_at, 6),
+                    "duration_ms": round(elapsed * 1000, 3),
+                    "spans": request.spans,
+                })
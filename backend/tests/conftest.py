@@ -0,0 +1,6 @@
+"""Make the flat backend modules importable (tests run from the repo root or backend/)"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
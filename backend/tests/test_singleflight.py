@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+
+import singleflight
+from singleflight import AnalysisCoalescer, AsyncMemo, TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(singleflight.time, "monotonic", fake)
+    return fake
+
+
+def test_ttl_cache_expiry(clock):
+    cache = TTLCache(ttl=10, max_entries=4)
+    cache.set("a", 1)
+
+    clock.now += 9.9
+    assert cache.get("a") == 1
+    clock.now += 0.1
+    assert cache.get("a") is None
+
+
+def test_ttl_cache_evicts_least_recently_used(clock):
+    cache = TTLCache(ttl=10, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+@pytest.mark.parametrize("ttl, max_entries", [(0, 4), (10, 0)])
+def test_ttl_cache_disabled(clock, ttl, max_entries):
+    cache = TTLCache(ttl=ttl, max_entries=max_entries)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+def test_get_or_run_many_answers_missing_keys_once():
+    calls = []
+
+    async def scenario():
+        memo = AsyncMemo()
+        memo.seed("known", "K")
+        release = asyncio.Event()
+
+        def factory(keys):
+            async def answer(positions):
+                calls.append([keys[i] for i in positions])
+                await release.wait()
+                return [keys[i].upper() for i in positions]
+            return answer
+
+        first_keys = ["a", "known", "b"]
+        second_keys = ["b", "c"]
+        first = asyncio.ensure_future(memo.get_or_run_many(first_keys, factory(first_keys)))
+        await asyncio.sleep(0)
+        # "b" is in flight: the second call only asks for "c" and waits for "b"
+        second = asyncio.ensure_future(memo.get_or_run_many(second_keys, factory(second_keys)))
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(first, second)
+
+        again = await memo.get_or_run_many(["a", "c"], factory(["a", "c"]))
+        return results, again, memo
+
+    (first, second), again, memo = asyncio.run(scenario())
+
+    assert first == ["A", "K", "B"]
+    assert second == ["B", "C"]
+    assert again == ["A", "C"]
+    assert calls == [["a", "b"], ["c"]]
+    assert (memo.hits, memo.misses) == (4, 3)
+
+
+def test_get_or_run_many_does_not_remember_failures():
+    calls = []
+
+    async def scenario():
+        memo = AsyncMemo()
+
+        async def partly_failing(positions):
+            calls.append(list(positions))
+            return ["ok", ValueError("no answer")][:len(positions)]
+
+        first = await memo.get_or_run_many(["a", "b"], partly_failing)
+
+        async def broken(positions):
+            calls.append(list(positions))
+            raise RuntimeError("down")
+
+        second = await memo.get_or_run_many(["a", "b", "c"], broken)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+
+    assert first[0] == "ok" and isinstance(first[1], ValueError)
+    # "a" is remembered; "b" failed before and is asked again with "c"
+    assert second[0] == "ok"
+    assert all(isinstance(r, RuntimeError) for r in second[1:])
+    assert calls == [[0, 1], [1, 2]]
+
+
+def test_coalescer_shares_running_analysis_and_replays_idempotent_result(clock):
+    runs = []
+
+    async def scenario():
+        coalescer = AnalysisCoalescer()
+
+        async def analyze():
+            runs.append(1)
+            await asyncio.sleep(0)
+            return {"score": 7}
+
+        task, started = coalescer.start("full", "key-1", analyze, idempotency_key="idem-1")
+        joined, joined_started = coalescer.start("full", "key-1", analyze)
+        inflight = await coalescer.lookup_idempotent("full", "idem-1")
+        await task
+
+        cached = await coalescer.lookup_idempotent("full", "idem-1")
+        unknown = await coalescer.lookup_idempotent("full", "idem-2")
+        return started, joined is task, joined_started, inflight, cached, unknown
+
+    started, same_task, joined_started, inflight, cached, unknown = asyncio.run(scenario())
+
+    assert started and same_task and not joined_started
+    assert runs == [1]
+    assert inflight == cached == {"score": 7}
+    assert unknown is None
@@ -0,0 +1,78 @@
+import pytest
+
+from models import TranscriptData, TranscriptSegment
+from splice import splice_transcript
+
+
+def _transcript(*segments) -> TranscriptData:
+    segs = [TranscriptSegment(start=start, end=end, text=text) for start, end, text in segments]
+    return TranscriptData(
+        text=" ".join(seg.text for seg in segs),
+        segments=segs,
+        duration=segs[-1].end if segs else 0.0,
+        language="en"
+    )
+
+
+def _spans(transcript: TranscriptData):
+    return [(seg.start, seg.end, seg.text) for seg in transcript.segments]
+
+
+ORIGINAL = _transcript(
+    (0.0, 10.0, "intro"),
+    (10.0, 20.0, "old part one"),
+    (20.0, 30.0, "old part two"),
+    (30.0, 40.0, "closing"),
+)
+
+
+def test_longer_clip_shifts_later_segments():
+    clip = _transcript((0.0, 12.0, "new part"), (12.0, 25.0, "with more detail"))
+
+    result = splice_transcript(ORIGINAL, clip, 10.0, 30.0, clip_duration=25.0)
+
+    assert _spans(result.transcript) == [
+        (0.0, 10.0, "intro"),
+        (10.0, 22.0, "new part"),
+        (22.0, 35.0, "with more detail"),
+        (35.0, 45.0, "closing"),
+    ]
+    assert result.transcript.duration == pytest.approx(45.0)
+    assert result.transcript.text == "intro new part with more detail closing"
+    assert result.first_idx == 1
+    assert result.removed_text == "old part one old part two"
+    assert result.inserted_text == "new part with more detail"
+
+
+def test_shorter_clip_moves_later_segments_back():
+    clip = _transcript((0.0, 4.5, "short"))
+
+    result = splice_transcript(ORIGINAL, clip, 20.0, 30.0, clip_duration=4.5)
+
+    assert _spans(result.transcript)[2:] == [(20.0, 24.5, "short"), (24.5, 34.5, "closing")]
+    assert result.transcript.duration == pytest.approx(34.5)
+
+
+def test_segments_are_assigned_by_midpoint():
+    # Midpoints 15 (inside [15, 25)) and 25 (outside): only the first is replaced
+    clip = _transcript((0.0, 10.0, "replacement"))
+
+    result = splice_transcript(ORIGINAL, clip, 15.0, 25.0, clip_duration=10.0)
+
+    assert [seg.text for seg in result.removed] == ["old part one"]
+    assert _spans(result.transcript)[1:3] == [(15.0, 25.0, "replacement"), (20.0, 30.0, "old part two")]
+
+
+def test_range_past_the_end_is_clamped():
+    clip = _transcript((0.0, 3.0, "new ending"))
+
+    result = splice_transcript(ORIGINAL, clip, 30.0, 99.0, clip_duration=3.0)
+
+    assert _spans(result.transcript)[-1] == (30.0, 33.0, "new ending")
+    assert result.transcript.duration == pytest.approx(33.0)
+
+
+@pytest.mark.parametrize("start_sec, end_sec", [(10.0, 10.0), (-1.0, 5.0), (40.0, 50.0)])
+def test_invalid_ranges(start_sec, end_sec):
+    with pytest.raises(ValueError):
+        splice_transcript(ORIGINAL, _transcript((0.0, 1.0, "x")), start_sec, end_sec, clip_duration=1.0)
@@ -0,0 +1,57 @@
+from models import TranscriptSegment
+from stt import ChunkTranscript, stitch_chunks, strip_repeated_words
+
+
+def test_strip_repeated_words():
+    assert strip_repeated_words("so today we talk about", "talk about the results") == "the results"
+    # Case and punctuation do not matter; the original words are returned
+    assert strip_repeated_words("Today we talk, About.", "talk about Results!") == "Results!"
+    assert strip_repeated_words("we talk about", "we talk about") == ""
+    # A single repeated word may be the speaker's own
+    assert strip_repeated_words("it was very", "very good") == "very good"
+    assert strip_repeated_words("something else", "next part") == "next part"
+
+
+def test_stitch_overlapping_chunks():
+    cuts = [0.0, 60.0, 120.0]
+    windows = [(0.0, 61.0), (59.0, 120.0)]
+    chunks = [
+        ChunkTranscript([
+            TranscriptSegment(start=0.0, end=30.0, text="hello everyone"),
+            TranscriptSegment(start=55.0, end=60.5, text="today we talk about"),
+            # Past the cut: the next chunk owns it
+            TranscriptSegment(start=60.2, end=61.0, text="about slides"),
+        ], "en"),
+        ChunkTranscript([
+            # Inside the overlap, repeating the end of the previous chunk
+            TranscriptSegment(start=0.5, end=1.5, text="talk about the results"),
+            TranscriptSegment(start=10.0, end=20.0, text="next part"),
+        ], "en"),
+    ]
+
+    segments = stitch_chunks(chunks, windows, cuts)
+
+    assert [(s.start, s.end, s.text) for s in segments] == [
+        (0.0, 30.0, "hello everyone"),
+        (55.0, 60.5, "today we talk about"),
+        (60.5, 60.5, "the results"),
+        (69.0, 79.0, "next part"),
+    ]
+
+
+def test_stitch_drops_fully_repeated_segment():
+    cuts = [0.0, 30.0, 60.0]
+    windows = [(0.0, 31.0), (29.0, 60.0)]
+    chunks = [
+        ChunkTranscript([TranscriptSegment(start=25.0, end=29.8, text="thank you all")], "en"),
+        ChunkTranscript([
+            TranscriptSegment(start=0.8, end=1.4, text="you all"),
+            TranscriptSegment(start=2.0, end=5.0, text="questions please"),
+        ], "en"),
+    ]
+
+    segments = stitch_chunks(chunks, windows, cuts)
+
+    assert [s.text for s in segments] == ["thank you all", "questions please"]
+    assert segments[1].start == 31.0
+    assert all(a.end <= b.start for a, b in zip(segments, segments[1:]))
@@ -0,0 +1,38 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from timeline import monotonic_alignment
+
+
+def _score(similarity: np.ndarray, path, skip_penalty: float) -> float:
+    n_slides = similarity.shape[1]
+    total = sum(similarity[i, k] for i, k in enumerate(path))
+    return total - skip_penalty * (n_slides - len(set(path)))
+
+
+def _brute_force(similarity: np.ndarray, skip_penalty: float) -> float:
+    n_segments, n_slides = similarity.shape
+    return max(
+        _score(similarity, path, skip_penalty)
+        for path in itertools.combinations_with_replacement(range(n_slides), n_segments)
+    )
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("skip_penalty", [0.0, 0.15, 1.0])
+def test_matches_brute_force(seed, skip_penalty):
+    rng = np.random.default_rng(seed)
+    similarity = rng.random((rng.integers(1, 7), rng.integers(1, 6)))
+
+    path = monotonic_alignment(similarity, skip_penalty)
+
+    assert len(path) == similarity.shape[0]
+    assert np.all(np.diff(path) >= 0)
+    assert _score(similarity, path, skip_penalty) == pytest.approx(_brute_force(similarity, skip_penalty))
+
+
+def test_empty_inputs():
+    assert monotonic_alignment(np.zeros((0, 3)), 0.1).shape == (0,)
+    assert list(monotonic_alignment(np.zeros((2, 0)), 0.1)) == [0, 0]
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from vad import SAMPLE_RATE, OffsetMap, trim_silence
+
+
+def test_offset_map_spans():
+    offsets = OffsetMap([(1.0, 3.0), (5.0, 6.0), (10.0, 12.0)])
+
+    assert offsets.to_original(0.0) == pytest.approx(1.0)
+    assert offsets.to_original(1.5) == pytest.approx(2.5)
+    assert offsets.to_original(2.5) == pytest.approx(5.5)
+    assert offsets.to_original(4.5) == pytest.approx(11.5)
+    # A joint belongs to the later span for a start, the earlier one for an end
+    assert offsets.to_original(2.0) == pytest.approx(5.0)
+    assert offsets.to_original(2.0, end=True) == pytest.approx(3.0)
+    assert offsets.to_original(3.0, end=True) == pytest.approx(6.0)
+
+
+def test_offset_map_without_spans_is_identity():
+    assert OffsetMap([]).to_original(4.2) == 4.2
+
+
+def _recording(rng: np.random.Generator, parts):
+    """Concatenate (seconds, is_speech) parts: loud noise for speech, near-silence otherwise"""
+    chunks = []
+    for seconds, is_speech in parts:
+        n = int(seconds * SAMPLE_RATE)
+        amplitude = 0.3 if is_speech else 1e-4
+        chunks.append((rng.uniform(-1, 1, n) * amplitude).astype(np.float32))
+    return np.concatenate(chunks)
+
+
+def test_trim_silence_round_trip():
+    rng = np.random.default_rng(0)
+    pcm = _recording(rng, [(1.5, False), (2.0, True), (3.0, False), (1.0, True), (2.0, False)])
+
+    result = trim_silence(pcm)
+
+    assert result.stats.removed_sec > 0
+    assert len(result.audio) < len(pcm)
+    # Every trimmed sample maps back to the same sample of the original
+    for k in rng.integers(0, len(result.audio), 500):
+        original = result.offsets.to_original(k / SAMPLE_RATE)
+        assert pcm[int(round(original * SAMPLE_RATE))] == result.audio[k]
+    # Speech stays where it was
+    assert 1.5 - 0.5 < result.offsets.to_original(0.0) <= 1.5
+    end = result.offsets.to_original(len(result.audio) / SAMPLE_RATE, end=True)
+    assert 7.5 <= end < 7.5 + 0.5
+
+
+def test_trim_silence_keeps_continuous_speech():
+    pcm = _recording(np.random.default_rng(1), [(3.0, True)])
+
+    result = trim_silence(pcm)
+
+    assert result.audio is pcm
+    assert result.offsets.to_original(1.25) == pytest.approx(1.25)
@@ -0,0 +1,155 @@
+"""
+Slide Timeline Module
+
+Presentations follow slide order, so instead of matching every transcript
+segment to its best slide independently, segments are aligned to slides as
+a monotonic sequence (Viterbi-style dynamic programming over the segment x
+slide similarity matrix): each segment stays on the current slide or moves
+forward, and every slide jumped over costs TIMELINE_SKIP_PENALTY.
+
+The result gives each slide its start/end time and time spent, and lists
+the skipped slides. Everything runs locally in NumPy in O(segments x slides)
+time; no LLM calls.
+"""
+
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from alignment import encode_texts
+from config import settings
+from models import SlideTimeline, SlideTimelineEntry, TranscriptData
+from telemetry import annotate_stage
+
+logger = logging.getLogger(__name__)
+
+
+def monotonic_alignment(similarity: np.ndarray, skip_penalty: float) -> np.ndarray:
+    """
+    Best monotonic assignment of rows (segments) to columns (slides)
+
+    Maximizes the summed similarity of the assignment minus skip_penalty
+    per slide never visited (including slides before the first and after
+    the last visited one), subject to the slide index never decreasing.
+
+    With score[i, k] the best total for segments 0..i ending on slide k:
+
+        score[i, k] = sim[i, k] + max(score[i-1, k],
+                                      max_{j<k} score[i-1, j] - p * (k - j - 1))
+
+    The inner max is a running maximum of score[i-1, j] + p * j, so each
+    row costs O(slides).
+
+    Args:
+        similarity: (segments, slides) similarity matrix
+        skip_penalty: Cost of each skipped slide (similarity units)
+
+    Returns:
+        Slide index for every segment (non-decreasing)
+    """
+    n_segments, n_slides = similarity.shape
+    if n_segments == 0 or n_slides == 0:
+        return np.zeros(n_segments, dtype=np.int64)
+
+    slide_idx = np.arange(n_slides)
+    back = np.zeros((n_segments, n_slides), dtype=np.int64)
+
+    # Slides before the first one visited are skipped
+    score = similarity[0] - skip_penalty * slide_idx
+    back[0] = slide_idx
+
+    for i in range(1, n_segments):
+        # Best earlier slide j < k by score[j] + p * j (prefix max, shifted by one)
+        keyed = score + skip_penalty * slide_idx
+        prefix_best = np.maximum.accumulate(keyed)
+        prefix_arg = _running_argmax(keyed)
+
+        move = np.full(n_slides, -np.inf)
+        move[1:] = prefix_best[:-1] - skip_penalty * (slide_idx[1:] - 1)
+        move_from = np.zeros(n_slides, dtype=np.int64)
+        move_from[1:] = prefix_arg[:-1]
+
+        stay_better = score >= move
+        back[i] = np.where(stay_better, slide_idx, move_from)
+        score = similarity[i] + np.where(stay_better, score, move)
+
+    # Slides after the last one visited are skipped too
+    final = score - skip_penalty * (n_slides - 1 - slide_idx)
+
+    path = np.empty(n_segments, dtype=np.int64)
+    path[-1] = int(np.argmax(final))
+    for i in range(n_segments - 1, 0, -1):
+        path[i - 1] = back[i, path[i]]
+    return path
+
+
+def _running_argmax(values: np.ndarray) -> np.ndarray:
+    """Index of the maximum of values[:k + 1] for every k"""
+    best = np.maximum.accumulate(values)
+    is_new_max = values >= best
+    idx = np.where(is_new_max, np.arange(len(values)), 0)
+    return np.maximum.accumulate(idx)
+
+
+def build_slide_timeline(
+    slides: List[Dict[str, str]],
+    transcript: TranscriptData,
+    skip_penalty: Optional[float] = None
+) -> SlideTimeline:
+    """
+    Align transcript segments to slides in order and time each slide
+
+    Args:
+        slides: Structured slides ('title', 'bullets')
+        transcript: Transcript with timed segments
+        skip_penalty: Cost per skipped slide (TIMELINE_SKIP_PENALTY if None)
+
+    Returns:
+        SlideTimeline with per-slide times and the skipped slides
+    """
+    if skip_penalty is None:
+        skip_penalty = settings.TIMELINE_SKIP_PENALTY
+    segments = transcript.segments
+
+    if slides and segments:
+        slide_texts = [f"{s.get('title', '')}\n{s.get('bullets', '')}".strip() for s in slides]
+        slide_vectors = encode_texts(slide_texts)
+        segment_vectors = encode_texts([seg.text for seg in segments])
+        path = monotonic_alignment(segment_vectors @ slide_vectors.T, skip_penalty)
+    else:
+        path = np.zeros(0, dtype=np.int64)
+
+    annotate_stage(segment_count=len(segments), slide_count=len(slides))
+
+    entries = []
+    for k, slide in enumerate(slides):
+        assigned = np.flatnonzero(path == k)
+        if len(assigned):
+            start = segments[assigned[0]].start
+            end = segments[assigned[-1]].end
+            entries.append(SlideTimelineEntry(
+                slide_number=k + 1,
+                title=slide.get('title', f'Slide {k + 1}'),
+                start_sec=round(start, 2),
+                end_sec=round(end, 2),
+                duration_sec=round(end - start, 2),
+                segment_count=len(assigned),
+                skipped=False
+            ))
+        else:
+            entries.append(SlideTimelineEntry(
+                slide_number=k + 1,
+                title=slide.get('title', f'Slide {k + 1}'),
+                segment_count=0,
+                skipped=True
+            ))
+
+    skipped = [e.slide_number for e in entries if e.skipped]
+    logger.info(f"Slide timeline: {len(slides) - len(skipped)}/{len(slides)} slides visited")
+
+    return SlideTimeline(
+        slides=entries,
+        segment_slides=[int(k) + 1 for k in path],
+        skipped_slides=skipped
+    )
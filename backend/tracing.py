@@ -0,0 +1,92 @@
+"""
+Request Trace Log Module
+
+Writes one JSON line per request (request ID, status, timing and every
+stage span with its input sizes and outcome) to TRACE_FILE. Records are
+handed to a background thread through a bounded queue, so request handling
+never waits on disk; if the queue is full the record is dropped and counted.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+from typing import Any, Dict, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class TraceWriter:
+    """Background JSON-lines writer"""
+
+    def __init__(self, path: str, max_queue: int = 10000):
+        self.path = path
+        self.dropped = 0
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+        self._thread.start()
+
+    def emit(self, record: Dict[str, Any]) -> None:
+        """Queue a record without blocking; drops it when the queue is full"""
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Flush queued records and stop the writer thread"""
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                record = self._queue.get()
+                if record is _STOP:
+                    break
+                try:
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                except (TypeError, ValueError) as e:
+                    logger.warning(f"Dropping unserializable trace record: {e}")
+                    continue
+                # Flush once the burst is written rather than per record
+                if self._queue.empty():
+                    f.flush()
+
+
+_writer: Optional[TraceWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_trace_writer() -> Optional[TraceWriter]:
+    """Get or create the trace writer (None when tracing is disabled)"""
+    global _writer
+    if not settings.TRACE_ENABLED:
+        return None
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = TraceWriter(settings.TRACE_FILE, settings.TRACE_QUEUE_SIZE)
+                atexit.register(_writer.close)
+                logger.info(f"Request traces -> {settings.TRACE_FILE}")
+    return _writer
+
+
+def emit_trace(record: Dict[str, Any]) -> None:
+    """Queue a trace record if tracing is enabled"""
+    writer = get_trace_writer()
+    if writer is not None:
+        writer.emit(record)
@@ -0,0 +1,190 @@
+"""
+Upload Ingestion Module
+
+Streams multipart uploads to disk in fixed-size chunks, hashing them on the
+fly and enforcing size limits, so per-request memory stays bounded no matter
+how large the upload is.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Dict, NamedTuple, Optional
+
+from fastapi import HTTPException, UploadFile
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload crosses its configured size limit"""
+
+    def __init__(self, limit_bytes: int):
+        self.limit_bytes = limit_bytes
+        super().__init__(
+            f"Upload exceeds maximum size of {limit_bytes // (1024 * 1024)} MB"
+        )
+
+
+class StoredUpload(NamedTuple):
+    """An upload that has been streamed to disk"""
+    path: str
+    sha256: str
+    size: int
+
+
+def max_upload_bytes() -> int:
+    """Per-file upload limit in bytes (settings.MAX_FILE_SIZE is in MB)"""
+    return settings.MAX_FILE_SIZE * 1024 * 1024
+
+
+async def save_upload(
+    upload: UploadFile,
+    suffix: str = "",
+    max_bytes: Optional[int] = None,
+    directory: Optional[str] = None
+) -> StoredUpload:
+    """
+    Stream an uploaded file to a temporary file in chunks
+
+    The SHA-256 of the content is computed while streaming, so callers get a
+    stable cache key without a second pass over the data.
+
+    Args:
+        upload: FastAPI UploadFile
+        suffix: Suffix for the temporary file (e.g. ".webm")
+        max_bytes: Size limit in bytes (defaults to settings.MAX_FILE_SIZE)
+        directory: Directory for the temporary file (defaults to system temp)
+
+    Returns:
+        StoredUpload with path, hex digest and size in bytes
+
+    Raises:
+        UploadTooLargeError: As soon as the stream crosses max_bytes
+    """
+    limit = max_bytes if max_bytes is not None else max_upload_bytes()
+
+    # Reject immediately when the multipart part already reports its size
+    if upload.size is not None and upload.size > limit:
+        raise UploadTooLargeError(limit)
+
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+    hasher = hashlib.sha256()
+    size = 0
+
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await upload.read(settings.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    raise UploadTooLargeError(limit)
+                hasher.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+
+    logger.debug(f"Stored upload {upload.filename} -> {path} ({size} bytes)")
+    return StoredUpload(path=path, sha256=hasher.hexdigest(), size=size)
+
+
+class _BodyTooLarge(HTTPException):
+    """Raised from the wrapped receive channel; surfaces as a 413 response"""
+
+    def __init__(self, limit_bytes: int):
+        super().__init__(
+            status_code=413,
+            detail=f"Request body too large. Maximum: {limit_bytes // (1024 * 1024)} MB"
+        )
+
+
+class RequestSizeLimitMiddleware:
+    """
+    ASGI middleware that rejects request bodies over a byte limit with 413
+
+    The limit is checked against Content-Length up front and against the
+    running byte count while the body streams in, so oversize uploads are cut
+    off before the multipart parser spools them. The error raised from the
+    receive channel is an HTTPException, so it passes through form parsing
+    and FastAPI's exception handling as a regular 413.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        default_limit: int,
+        path_limits: Optional[Dict[str, int]] = None
+    ):
+        self.app = app
+        self.default_limit = default_limit
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope.get("method") not in ("POST", "PUT", "PATCH"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.path_limits.get(scope.get("path", ""), self.default_limit)
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    if int(value) > limit:
+                        await self._reject(send, limit)
+                        return
+                except ValueError:
+                    pass
+                break
+
+        received = 0
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise _BodyTooLarge(limit)
+            return message
+
+        async def tracking_send(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except _BodyTooLarge:
+            if response_started:
+                raise
+            await self._reject(send, limit)
+
+    @staticmethod
+    async def _reject(send: Send, limit: int) -> None:
+        logger.warning(f"Rejected request body over {limit} bytes")
+        body = (
+            b'{"detail":"Request body too large. Maximum: '
+            + str(limit // (1024 * 1024)).encode()
+            + b' MB"}'
+        )
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,213 @@
+"""
+Voice Activity Detection Module
+
+Practice recordings start and end with silence and have long pauses in
+between; Whisper spends decode time on all of it. Before STT, an energy
+VAD marks the decoded PCM frames that carry speech, and the silences of
+at least VAD_MIN_SILENCE_MS are cut out (VAD_PAD_MS of audio is kept
+around speech, so joined spans still have a short pause between them).
+
+The speech threshold adapts to the recording: VAD_THRESHOLD_DB above the
+noise floor (10th percentile of frame energy), but never above the middle
+of the floor-to-speech range. Recordings without a clear gap between the
+two are not trimmed.
+
+An OffsetMap turns times in the trimmed audio back into times in the
+original recording, so transcript timestamps are unaffected, and the
+removed-silence statistics go to the metrics stage.
+"""
+
+import logging
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
+
+from config import settings
+from models import SilenceStats
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+
+class OffsetMap:
+    """Maps times in the trimmed audio back to the original recording"""
+
+    def __init__(self, spans: List[Tuple[float, float]]):
+        """
+        Args:
+            spans: Kept (start, end) spans in original seconds, in order
+        """
+        self.original_starts = np.array([start for start, _ in spans], dtype=np.float64)
+        lengths = np.array([end - start for start, end in spans], dtype=np.float64)
+        self.trimmed_ends = np.cumsum(lengths)
+        self.trimmed_starts = self.trimmed_ends - lengths
+
+    def to_original(self, t: float, end: bool = False) -> float:
+        """
+        Original time of trimmed time `t`
+
+        A time exactly at the joint of two spans belongs to the later span
+        for a start and to the earlier span for an end (end=True).
+        """
+        if len(self.trimmed_starts) == 0:
+            return t
+        if end:
+            i = int(np.searchsorted(self.trimmed_ends, t, side="left"))
+        else:
+            i = int(np.searchsorted(self.trimmed_starts, t, side="right")) - 1
+        i = min(max(i, 0), len(self.trimmed_starts) - 1)
+        offset = min(max(t - self.trimmed_starts[i], 0.0), self.trimmed_ends[i] - self.trimmed_starts[i])
+        return float(self.original_starts[i] + offset)
+
+
+class VadResult(NamedTuple):
+    """trim_silence() result"""
+    audio: np.ndarray  # PCM with the silences cut out
+    offsets: OffsetMap
+    stats: SilenceStats
+
+
+def frame_energy_db(pcm: np.ndarray, frame_len: int) -> np.ndarray:
+    """RMS energy of consecutive frames in dBFS (a partial last frame counts as a frame)"""
+    n_frames = -(-len(pcm) // frame_len)
+    padded = np.zeros(n_frames * frame_len, dtype=np.float32)
+    padded[:len(pcm)] = pcm
+    rms = np.sqrt(np.mean(padded.reshape(n_frames, frame_len) ** 2, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-5))
+
+
+def _runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """(start, end) index ranges of the True runs of a boolean array"""
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return list(zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()))
+
+
+def speech_frames(energy_db: np.ndarray, frame_ms: int) -> np.ndarray:
+    """
+    Frames to keep: speech, padded, with short silences filled in
+
+    Args:
+        energy_db: frame_energy_db() result
+        frame_ms: Frame length in milliseconds
+
+    Returns:
+        Boolean mask (all True if speech and silence cannot be told apart)
+    """
+    if len(energy_db) == 0:
+        return np.zeros(0, dtype=bool)
+    floor = np.percentile(energy_db, 10)
+    speech_level = np.percentile(energy_db, 95)
+    spread = speech_level - floor
+    if spread < settings.VAD_THRESHOLD_DB:
+        return np.ones(len(energy_db), dtype=bool)
+
+    mask = energy_db > floor + min(settings.VAD_THRESHOLD_DB, spread / 2)
+    if not mask.any():
+        return np.ones(len(energy_db), dtype=bool)
+
+    # Keep VAD_PAD_MS of context on both sides of every speech frame
+    pad = settings.VAD_PAD_MS // frame_ms
+    if pad:
+        mask = np.convolve(mask, np.ones(2 * pad + 1), mode="same") > 0
+
+    # Only silences of at least VAD_MIN_SILENCE_MS are cut
+    min_frames = max(1, settings.VAD_MIN_SILENCE_MS // frame_ms)
+    for start, end in _runs(~mask):
+        if end - start < min_frames:
+            mask[start:end] = True
+    return mask
+
+
+def silence_stats(spans: List[Tuple[float, float]], duration: float) -> SilenceStats:
+    """Statistics of what lies outside the kept spans (all in seconds)"""
+    if not spans:
+        return SilenceStats(
+            original_duration_sec=round(duration, 2),
+            kept_duration_sec=0.0,
+            removed_sec=round(duration, 2),
+            leading_silence_sec=round(duration, 2)
+        )
+    pauses = [b[0] - a[1] for a, b in zip(spans, spans[1:])]
+    kept = sum(end - start for start, end in spans)
+    return SilenceStats(
+        original_duration_sec=round(duration, 2),
+        kept_duration_sec=round(kept, 2),
+        removed_sec=round(duration - kept, 2),
+        leading_silence_sec=round(spans[0][0], 2),
+        trailing_silence_sec=round(duration - spans[-1][1], 2),
+        pause_count=len(pauses),
+        pause_total_sec=round(sum(pauses), 2),
+        longest_pause_sec=round(max(pauses, default=0.0), 2)
+    )
+
+
+def trim_silence(pcm: np.ndarray, sample_rate: int = SAMPLE_RATE) -> VadResult:
+    """
+    Cut the long silences out of mono PCM
+
+    Args:
+        pcm: Mono float32 samples in [-1, 1]
+        sample_rate: Samples per second
+
+    Returns:
+        VadResult with the trimmed audio (the input itself if nothing was
+        cut), the offset map and the silence statistics
+    """
+    frame_ms = settings.VAD_FRAME_MS
+    frame_len = sample_rate * frame_ms // 1000
+    duration = len(pcm) / sample_rate
+
+    mask = speech_frames(frame_energy_db(pcm, frame_len), frame_ms)
+    sample_spans = [(start * frame_len, min(end * frame_len, len(pcm))) for start, end in _runs(mask)]
+    spans = [(start / sample_rate, end / sample_rate) for start, end in sample_spans]
+    stats = silence_stats(spans, duration)
+
+    if len(sample_spans) == 1 and sample_spans[0] == (0, len(pcm)):
+        audio = pcm
+    else:
+        audio = np.concatenate([pcm[start:end] for start, end in sample_spans]) if sample_spans else pcm[:0]
+
+    logger.info(
+        f"VAD: kept {stats.kept_duration_sec:.1f}s of {duration:.1f}s "
+        f"({stats.pause_count} pauses, {stats.leading_silence_sec:.1f}s leading, "
+        f"{stats.trailing_silence_sec:.1f}s trailing silence removed)"
+    )
+    return VadResult(audio, OffsetMap(spans), stats)
+
+
+def split_points(pcm: np.ndarray, n_chunks: int, sample_rate: int = SAMPLE_RATE) -> List[int]:
+    """
+    Cut PCM into about equal chunks at its quietest moments
+
+    Each cut is placed at the lowest energy (averaged over VAD_MIN_SILENCE_MS)
+    within a quarter chunk of its equal-split position, so cuts fall into
+    pauses rather than words whenever there is one nearby.
+
+    Args:
+        pcm: Mono float32 samples
+        n_chunks: Number of chunks wanted
+        sample_rate: Samples per second
+
+    Returns:
+        Sample indices [0, cut_1, ..., len(pcm)], strictly increasing
+    """
+    frame_len = sample_rate * settings.VAD_FRAME_MS // 1000
+    energy = frame_energy_db(pcm, frame_len) if len(pcm) else np.zeros(0)
+    n_chunks = max(1, min(n_chunks, len(energy)))
+    window = max(1, settings.VAD_MIN_SILENCE_MS // settings.VAD_FRAME_MS)
+    smoothed = np.convolve(energy, np.ones(window) / window, mode="same")
+
+    chunk_frames = len(energy) / n_chunks
+    radius = int(chunk_frames / 4)
+    points = [0]
+    for k in range(1, n_chunks):
+        target = int(round(k * chunk_frames))
+        lo = max(target - radius, points[-1] // frame_len + 1)
+        hi = min(target + radius + 1, len(energy))
+        if lo >= hi:
+            continue
+        frame = lo + int(np.argmin(smoothed[lo:hi]))
+        points.append(min(frame * frame_len + frame_len // 2, len(pcm) - 1))
+    points.append(len(pcm))
+    return points
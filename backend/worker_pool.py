@@ -0,0 +1,159 @@
+"""
+STT Worker Pool Module
+
+Whisper inference holds the GIL for much of its work, so transcribing many
+recordings at once on the stage thread pool serializes them. Batch
+workloads (cohorts) send STT to a pool of worker processes instead. Each
+worker loads the Whisper model once, when it starts, and limits torch to
+its share of the cores so the workers do not oversubscribe the CPU (and,
+with CPU_AFFINITY, is pinned to its own cores; see resource_policy.py).
+
+The same pool transcribes the chunks of long recordings in parallel
+(stt.transcribe_long_audio()).
+
+If a worker dies (e.g. killed for using too much memory), the pool is
+broken for good; it is then replaced and the work retried once, and
+SttPoolUnavailable is raised if the new pool breaks too.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, List, Optional
+
+import numpy as np
+
+from config import settings
+from models import TranscriptData
+from pipeline import await_to_completion
+from resource_policy import init_worker_resources, threads_per_process, worker_cpu_queue
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+class SttPoolUnavailable(RuntimeError):
+    """Raised when the STT worker pool broke again after being restarted"""
+
+
+def stt_process_count() -> int:
+    """Number of STT worker processes (STT_PROCESSES, or half the cores)"""
+    return settings.STT_PROCESSES or max(1, (os.cpu_count() or 1) // 2)
+
+
+def _init_worker(threads: int, cpu_queue: Optional[Any]) -> None:
+    """Runs once in each worker: apply the CPU policy and load the model"""
+    init_worker_resources(threads, cpu_queue)
+
+    from stt import get_whisper_model
+    get_whisper_model()
+
+
+def _transcribe_in_worker(wav_path: str) -> TranscriptData:
+    from stt import transcribe_audio
+    return transcribe_audio(wav_path, parallel=False)
+
+
+def _transcribe_chunk_in_worker(pcm: np.ndarray) -> Any:
+    from stt import transcribe_segments
+    return transcribe_segments(pcm)
+
+
+def get_stt_pool() -> ProcessPoolExecutor:
+    """Get or create the STT process pool (singleton pattern)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = stt_process_count()
+            threads = threads_per_process(workers)
+            # spawn: forking a process that already runs torch/uvicorn threads is unsafe
+            context = multiprocessing.get_context("spawn")
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(threads, worker_cpu_queue(context, workers)),
+            )
+            logger.info(f"STT process pool started: {workers} workers x {threads} threads")
+        return _pool
+
+
+def _replace_broken_pool(pool: ProcessPoolExecutor, error: BrokenProcessPool, retry: bool) -> None:
+    """
+    Drop a broken pool so the next get_stt_pool() starts a new one
+
+    Raises:
+        SttPoolUnavailable: If the failed call was already the retry
+    """
+    global _pool
+    with _pool_lock:
+        # Calls that shared the broken pool all get here; only the first resets it
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+    if not retry:
+        raise SttPoolUnavailable("Speech-to-text workers are unavailable (worker process crashed)") from error
+    logger.warning(f"STT worker pool broke ({error}); restarting it and retrying")
+
+
+async def transcribe_in_pool(wav_path: str) -> TranscriptData:
+    """
+    Transcribe a WAV file on the STT process pool
+
+    Args:
+        wav_path: Path to a 16 kHz mono WAV file (must stay until done; if
+            the caller is cancelled, a worker already reading it finishes
+            first)
+
+    Returns:
+        TranscriptData
+
+    Raises:
+        SttPoolUnavailable: If the pool broke twice
+        RuntimeError: If transcription fails in the worker
+    """
+    for attempt in range(2):
+        pool = get_stt_pool()
+        try:
+            return await await_to_completion(pool.submit(_transcribe_in_worker, wav_path))
+        except BrokenProcessPool as e:
+            _replace_broken_pool(pool, e, retry=attempt == 0)
+
+
+def transcribe_chunks(chunks: List[np.ndarray]) -> List[Any]:
+    """
+    Transcribe audio chunks concurrently on the STT process pool
+
+    Blocks until all chunks are done, so call it from a worker thread.
+
+    Args:
+        chunks: 16 kHz mono float32 samples per chunk
+
+    Returns:
+        One stt.ChunkTranscript per chunk, in order (segment times relative to
+        the chunk)
+
+    Raises:
+        SttPoolUnavailable: If the pool broke twice
+        RuntimeError: If transcription fails in a worker
+    """
+    for attempt in range(2):
+        pool = get_stt_pool()
+        try:
+            return list(pool.map(_transcribe_chunk_in_worker, chunks))
+        except BrokenProcessPool as e:
+            _replace_broken_pool(pool, e, retry=attempt == 0)
+
+
+def shutdown_stt_pool() -> None:
+    """Stop the worker processes (e.g. on application shutdown)"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
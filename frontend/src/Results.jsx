@@ -486,6 +486,13 @@ const Results = ({ data, onBack, audioFile }) => {
                     </div>
                 </header>
 
+                {/* Degraded mode notice (AI unavailable, local fallback used) */}
+                {data?.degraded && (
+                    <div className="bg-amber-50 border border-amber-200 text-amber-800 p-4 rounded-xl mb-6 text-sm font-medium">
+                        AI coaching was temporarily unavailable, so parts of this report were generated locally from your metrics and slide similarity.
+                    </div>
+                )}
+
                 {/* Metrics */}
                 <div className="grid grid-cols-1 md:grid-cols-3 gap-6 mb-10 w-full">
                     <MetricCard
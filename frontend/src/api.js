@@ -15,7 +15,9 @@ function calculateAlignmentScore(alignment) {
     return Math.round((onTopicCount / totalSegments) * 100);
 }
 
-export const analyzePresentation = async (audioFile, outlineText, outlineFile) => {
+// idempotencyKey: reuse the same key when retrying one submission so the
+// backend answers the retry from the first run instead of analyzing again
+export const analyzePresentation = async (audioFile, outlineText, outlineFile, idempotencyKey = crypto.randomUUID()) => {
     console.log("Analyzing...", { audioFile, outlineText, outlineFile });
 
     const formData = new FormData();
@@ -40,6 +42,7 @@ export const analyzePresentation = async (audioFile, outlineText, outlineFile) =
     try {
         const response = await fetch(endpoint, {
             method: 'POST',
+            headers: { 'Idempotency-Key': idempotencyKey },
             body: formData,
         });
 
@@ -62,6 +65,11 @@ export const analyzePresentation = async (audioFile, outlineText, outlineFile) =
             tips: data.feedback.tips.map(t => `${t.section}: ${t.tip}`),
             // Pass through the new slide alignment data if it exists
             slide_alignment: data.slide_alignment,
+            slide_timeline: data.slide_timeline,
+            // Set when the backend answered parts of the report locally
+            degraded: data.degraded,
+            degraded_stages: data.degraded_stages,
+            session_id: data.session_id,
             // Debug info
             debug: {
                 isPptx,